@@ -0,0 +1,237 @@
+"""
+Benchmark cases
+
+Scaled cases run once per scale: libvirt cases against that many domains
+defined on the test driver, host cases against a fake sysfs tree with
+that many PCI devices. Cases whose dependencies are missing (libvirt,
+PySide6) are reported as skipped.
+"""
+
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from fake_host import FakeHost
+from harness import BenchmarkResult, CallCounter, measure
+
+
+DOMAIN_PREFIX = "bench-"
+
+DOMAIN_XML = """<domain type='test'>
+  <name>{name}</name>
+  <memory unit='MiB'>{memory}</memory>
+  <vcpu>{vcpus}</vcpu>
+  <os><type arch='x86_64'>hvm</type></os>
+  <devices/>
+</domain>"""
+
+
+@dataclass
+class Context:
+    """Shared state for one benchmark run"""
+    uri: str
+    workdir: Path
+    counter: CallCounter
+    iterations: int
+    manager: Optional[object] = None  # LibvirtManager, once connected
+    host: Optional[FakeHost] = None
+
+
+def populate_domains(conn, count: int):
+    """Replace all benchmark domains with `count` new ones, half of them running"""
+    for domain in conn.listAllDomains():
+        if domain.name().startswith(DOMAIN_PREFIX):
+            if domain.isActive():
+                domain.destroy()
+            domain.undefine()
+    for index in range(count):
+        domain = conn.defineXML(DOMAIN_XML.format(
+            name=f"{DOMAIN_PREFIX}{index:04d}",
+            memory=1024 * (1 + index % 8),
+            vcpus=1 + index % 4
+        ))
+        if index % 2 == 0:
+            domain.create()
+
+
+# ----------------------------------------------------------------------
+# libvirt
+# ----------------------------------------------------------------------
+
+def _libvirt_ready(context: Context, scale: int, cases: List[str]) -> Optional[List[BenchmarkResult]]:
+    """Connect and populate, or return skip results"""
+    try:
+        import libvirt  # noqa: F401
+    except ImportError:
+        return [BenchmarkResult.skip(case, scale, "libvirt-python not installed") for case in cases]
+
+    if context.manager is None:
+        from backend.libvirt_manager import LibvirtManager
+        context.manager = LibvirtManager(context.uri)
+    if context.manager.connection is None:
+        return [BenchmarkResult.skip(case, scale, f"cannot connect to {context.uri}") for case in cases]
+
+    populate_domains(context.manager.connection, scale)
+    return None
+
+
+def bench_libvirt(context: Context, scale: int) -> List[BenchmarkResult]:
+    cases = ["libvirt.list_all_vms", "controller.get_vm_info"]
+    skipped = _libvirt_ready(context, scale, cases)
+    if skipped:
+        return skipped
+
+    from backend.vm_controller import VMController
+    manager = context.manager
+    controller = VMController(manager)
+    domains = manager.list_all_vms()
+
+    def get_all_info():
+        for domain in domains:
+            controller.get_vm_info(domain)
+
+    return [
+        measure(cases[0], scale, manager.list_all_vms, context.counter, context.iterations),
+        measure(cases[1], scale, get_all_info, context.counter, context.iterations),
+    ]
+
+
+def bench_hosts(context: Context, scale: int) -> List[BenchmarkResult]:
+    """Fan-out listing over several named hosts (all on the test driver)"""
+    cases = ["hosts.list_vm_info"]
+    skipped = _libvirt_ready(context, scale, cases)
+    if skipped:
+        return skipped
+
+    from backend.host_manager import HostManager
+    hosts = HostManager({f"host{index}": context.uri for index in range(3)})
+    result = measure(cases[0], scale, hosts.list_vm_info, context.counter, context.iterations)
+    hosts.close()
+    return [result]
+
+
+def bench_vm_list(context: Context, scale: int) -> List[BenchmarkResult]:
+    cases = ["vm_list.refresh_cold", "vm_list.refresh_warm"]
+    try:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PySide6.QtWidgets import QApplication
+    except ImportError:
+        return [BenchmarkResult.skip(case, scale, "PySide6 not installed") for case in cases]
+    skipped = _libvirt_ready(context, scale, cases)
+    if skipped:
+        return skipped
+
+    from backend.host_manager import HostManager
+    from ui.vm_list_widget import VMListWidget
+    app = QApplication.instance() or QApplication([])
+    widget = VMListWidget()
+    widget._hosts = HostManager({"bench": context.uri})
+    widget.refresh_timer.stop()
+
+    def reset():
+        widget._vms = {}
+        widget.table.setRowCount(0)
+
+    results = [
+        measure(cases[0], scale, widget.load_vm_list, context.counter, context.iterations,
+                before_each=reset),
+        measure(cases[1], scale, widget.load_vm_list, context.counter, context.iterations),
+    ]
+    widget.hosts.close()
+    widget.deleteLater()
+    app.processEvents()
+    return results
+
+
+# ----------------------------------------------------------------------
+# Host (fake sysfs)
+# ----------------------------------------------------------------------
+
+def _fake_host(context: Context, scale: int) -> FakeHost:
+    if context.host is None or context.host.devices != scale:
+        context.host = FakeHost(context.workdir / f"host-{scale}", scale).build()
+        name, value = context.host.environment()
+        os.environ[name] = value
+    return context.host
+
+
+def bench_gpu_detector(context: Context, scale: int) -> List[BenchmarkResult]:
+    from backend.gpu_detector import GPUDetector
+    host = _fake_host(context, scale)
+
+    detector = GPUDetector(sysfs_root=host.sysfs)
+    result = measure("gpu_detector.scan", scale, lambda: GPUDetector(sysfs_root=host.sysfs),
+                     context.counter, context.iterations)
+    result.notes['gpus'] = str(len(detector.gpus))
+    result.notes['passthrough_gpus'] = str(len(detector.get_passthrough_gpus()))
+    return [result]
+
+
+def bench_vfio(context: Context, scale: int) -> List[BenchmarkResult]:
+    from backend.vfio_manager import VFIOManager
+    host = _fake_host(context, scale)
+    vfio = VFIOManager(sysfs_root=host.sysfs)
+
+    def check_all():
+        for address in host.addresses:
+            vfio.is_bound_to_vfio(address)
+
+    def check_modules():
+        VFIOManager(sysfs_root=host.sysfs)._check_vfio_available()
+
+    return [
+        measure("vfio.is_bound_to_vfio", scale, check_all, context.counter, context.iterations),
+        measure("vfio.check_available", scale, check_modules, context.counter, context.iterations),
+    ]
+
+
+# ----------------------------------------------------------------------
+# Unscaled
+# ----------------------------------------------------------------------
+
+def bench_xml_generator(context: Context) -> List[BenchmarkResult]:
+    from backend.gpu_detector import GPUDetector
+    from backend.nvram_store import NVRAMStore
+    from backend.xml_generator import XMLGenerator
+
+    firmware = context.workdir / "firmware"
+    firmware.mkdir(exist_ok=True)
+    (firmware / "OVMF_CODE.fd").write_bytes(b"\0" * 4096)
+    (firmware / "OVMF_VARS.fd").write_bytes(b"\0" * 540672)
+
+    generator = XMLGenerator()
+    generator.ovmf_code_path = str(firmware / "OVMF_CODE.fd")
+    generator.nvram_store = NVRAMStore(context.workdir / "nvram")
+    host = _fake_host(context, 16)
+    gpu = GPUDetector(sysfs_root=host.sysfs).get_passthrough_gpus()[0]
+
+    def generate(**kwargs) -> Callable[[], None]:
+        def run():
+            generator.generate_windows_vm_xml(
+                vm_name="bench",
+                memory_mb=8192,
+                vcpus=8,
+                disk_path=str(context.workdir / "bench.qcow2"),
+                iso_path="/isos/win11.iso",
+                virtio_iso_path="/isos/virtio-win.iso",
+                nvram_template=str(firmware / "OVMF_VARS.fd"),
+                **kwargs
+            )
+        return run
+
+    return [
+        measure("xml_generator.basic", None, generate(), context.counter, context.iterations),
+        measure("xml_generator.gpu_passthrough", None,
+                generate(gpu=gpu, enable_gpu_passthrough=True), context.counter, context.iterations),
+    ]
+
+
+SCALED_CASES = [bench_libvirt, bench_hosts, bench_vm_list, bench_gpu_detector, bench_vfio]
+UNSCALED_CASES = [bench_xml_generator]
+
+
+def cleanup(context: Context):
+    """Remove benchmark domains from the test driver"""
+    if context.manager is not None and context.manager.connection is not None:
+        populate_domains(context.manager.connection, 0)
@@ -0,0 +1,108 @@
+"""
+Synthetic host for benchmarks - a fake /sys tree plus lspci and lsmod
+
+The tree mimics /sys/bus/pci/devices, /sys/bus/pci/drivers and
+/sys/kernel/iommu_groups closely enough for GPUDetector and VFIOManager.
+Every fourth device is a GPU with its HDMI audio function in the same
+IOMMU group; the first GPU is the boot VGA device on its native driver,
+the others are bound to vfio-pci. lspci and lsmod are shell scripts
+printing canned output, put first on PATH.
+"""
+
+import os
+import stat
+from pathlib import Path
+from typing import List, Tuple
+
+
+GPU_LINE = "{address} VGA compatible controller [0300]: NVIDIA Corporation GA102 [GeForce RTX 3090] [10de:2204] (rev a1)"
+AUDIO_LINE = "{address} Audio device [0403]: NVIDIA Corporation GA102 High Definition Audio Controller [10de:1aef] (rev a1)"
+NIC_LINE = "{address} Ethernet controller [0200]: Intel Corporation Ethernet Controller I225-V [8086:15f3] (rev 03)"
+USB_LINE = "{address} USB controller [0c03]: Advanced Micro Devices, Inc. [AMD] Matisse USB 3.0 Host Controller [1022:149c]"
+
+LSMOD_OUTPUT = """Module                  Size  Used by
+vfio_pci               16384  0
+vfio_pci_core          94208  1 vfio_pci
+vfio_iommu_type1       45056  0
+vfio                   69632  2 vfio_pci_core,vfio_iommu_type1
+kvm_amd               200704  0
+kvm                  1404928  1 kvm_amd
+"""
+
+
+def _address(bus: int, function: int = 0) -> str:
+    return f"0000:{bus // 32:02x}:{bus % 32:02x}.{function}"
+
+
+def _executable(path: Path, body: str):
+    path.write_text("#!/bin/sh\n" + body)
+    path.chmod(path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+class FakeHost:
+    """A generated sysfs root with a given number of PCI devices"""
+
+    def __init__(self, root: Path, devices: int):
+        self.root = Path(root)
+        self.devices = devices
+        self.sysfs = self.root / "sys"
+        self.bin = self.root / "bin"
+        self.addresses: List[str] = []
+        self.gpus: List[str] = []
+
+    def build(self) -> 'FakeHost':
+        pci_devices = self.sysfs / "bus" / "pci" / "devices"
+        drivers = self.sysfs / "bus" / "pci" / "drivers"
+        groups = self.sysfs / "kernel" / "iommu_groups"
+        for directory in (pci_devices, drivers, groups, self.bin):
+            directory.mkdir(parents=True, exist_ok=True)
+
+        lines = []
+        slot = 0
+        while len(self.addresses) < self.devices:
+            group = slot
+            kind = slot % 4
+            if kind == 0:
+                # GPU + audio function sharing an IOMMU group
+                gpu = _address(slot, 0)
+                first = not self.gpus
+                self._device(gpu, group, "nvidia" if first else "vfio-pci", boot_vga=first)
+                lines.append(GPU_LINE.format(address=gpu))
+                self.gpus.append(gpu)
+                if len(self.addresses) < self.devices:
+                    audio = _address(slot, 1)
+                    self._device(audio, group, "snd_hda_intel" if first else "vfio-pci")
+                    lines.append(AUDIO_LINE.format(address=audio))
+            elif kind % 2:
+                nic = _address(slot)
+                self._device(nic, group, "igc")
+                lines.append(NIC_LINE.format(address=nic))
+            else:
+                usb = _address(slot)
+                self._device(usb, group, "xhci_hcd")
+                lines.append(USB_LINE.format(address=usb))
+            slot += 1
+
+        (self.root / "lspci.txt").write_text("\n".join(lines) + "\n")
+        _executable(self.bin / "lspci", f'cat "{self.root / "lspci.txt"}"\n')
+        (self.root / "lsmod.txt").write_text(LSMOD_OUTPUT)
+        _executable(self.bin / "lsmod", f'cat "{self.root / "lsmod.txt"}"\n')
+        return self
+
+    def _device(self, address: str, group: int, driver: str, boot_vga: bool = False):
+        device = self.sysfs / "bus" / "pci" / "devices" / address
+        device.mkdir()
+        group_dir = self.sysfs / "kernel" / "iommu_groups" / str(group)
+        (group_dir / "devices").mkdir(parents=True, exist_ok=True)
+        (group_dir / "devices" / address).symlink_to(device)
+        (device / "iommu_group").symlink_to(group_dir)
+        driver_dir = self.sysfs / "bus" / "pci" / "drivers" / driver
+        driver_dir.mkdir(exist_ok=True)
+        (device / "driver").symlink_to(driver_dir)
+        if address.endswith(".0"):
+            (device / "boot_vga").write_text("1\n" if boot_vga else "0\n")
+        self.addresses.append(address)
+
+    def environment(self) -> Tuple[str, str]:
+        """PATH with the fake tools first"""
+        return "PATH", f"{self.bin}{os.pathsep}{os.environ.get('PATH', '')}"
@@ -0,0 +1,156 @@
+"""
+Benchmark harness - timing, percentiles and call counting
+
+Every iteration records its wall time plus the number of libvirt API calls
+and subprocesses it caused. libvirt calls are counted by wrapping the
+methods of the virConnect/virDomain classes; subprocesses by wrapping
+subprocess.Popen (which subprocess.run uses as well).
+"""
+
+import functools
+import math
+import subprocess
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Dict, List, Optional
+
+
+class CallCounter:
+    """Counts libvirt API calls and spawned subprocesses while active"""
+
+    def __init__(self):
+        self.rpc = 0
+        self.subprocesses = 0
+        self._patched = []
+
+    def reset(self):
+        self.rpc = 0
+        self.subprocesses = 0
+
+    def _wrap_class(self, cls):
+        for name, attribute in list(vars(cls).items()):
+            if name.startswith('_') or not callable(attribute):
+                continue
+
+            @functools.wraps(attribute)
+            def counted(*args, __original=attribute, **kwargs):
+                self.rpc += 1
+                return __original(*args, **kwargs)
+
+            setattr(cls, name, counted)
+            self._patched.append((cls, name, attribute))
+
+    @contextmanager
+    def active(self):
+        """Install the counting wrappers for the duration of the block"""
+        try:
+            import libvirt
+            for cls in (libvirt.virConnect, libvirt.virDomain):
+                self._wrap_class(cls)
+        except ImportError:
+            pass
+
+        original_popen = subprocess.Popen
+        counter = self
+
+        class CountingPopen(original_popen):
+            def __init__(self, *args, **kwargs):
+                counter.subprocesses += 1
+                super().__init__(*args, **kwargs)
+
+        subprocess.Popen = CountingPopen
+        try:
+            yield self
+        finally:
+            subprocess.Popen = original_popen
+            for cls, name, attribute in reversed(self._patched):
+                setattr(cls, name, attribute)
+            self._patched.clear()
+
+
+def percentile(samples: List[float], p: float) -> float:
+    """Nearest-rank percentile"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+@dataclass
+class BenchmarkResult:
+    """Statistics of one case at one scale"""
+    case: str
+    scale: Optional[int]
+    iterations: int
+    p50_ms: float
+    p90_ms: float
+    p99_ms: float
+    max_ms: float
+    rpc_per_iteration: float
+    subprocesses_per_iteration: float
+    skipped: Optional[str] = None
+    notes: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def key(self) -> str:
+        return self.case if self.scale is None else f"{self.case}[{self.scale}]"
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+    @classmethod
+    def skip(cls, case: str, scale: Optional[int], reason: str) -> 'BenchmarkResult':
+        return cls(case, scale, 0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, skipped=reason)
+
+
+def measure(
+    case: str,
+    scale: Optional[int],
+    run: Callable[[], None],
+    counter: CallCounter,
+    iterations: int,
+    warmup: int = 1,
+    before_each: Optional[Callable[[], None]] = None
+) -> BenchmarkResult:
+    """
+    Time a callable
+
+    Args:
+        case: Case name
+        scale: Domain/device count, or None for unscaled cases
+        run: Code under test
+        counter: Active CallCounter
+        iterations: Measured runs
+        warmup: Unmeasured runs first
+        before_each: Untimed reset before every run (e.g. to measure a cold path)
+    """
+    for _ in range(warmup):
+        if before_each:
+            before_each()
+        run()
+
+    samples = []
+    rpc = subprocesses = 0
+    for _ in range(iterations):
+        if before_each:
+            before_each()
+        counter.reset()
+        start = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - start) * 1000)
+        rpc += counter.rpc
+        subprocesses += counter.subprocesses
+
+    return BenchmarkResult(
+        case=case,
+        scale=scale,
+        iterations=iterations,
+        p50_ms=percentile(samples, 50),
+        p90_ms=percentile(samples, 90),
+        p99_ms=percentile(samples, 99),
+        max_ms=max(samples),
+        rpc_per_iteration=rpc / iterations,
+        subprocesses_per_iteration=subprocesses / iterations,
+    )
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+VirtFlow benchmark runner
+
+Runs the backend against libvirt's in-process test driver
+(test:///default) and a generated fake sysfs tree, so it needs neither
+root, KVM nor a GPU. Reports latency percentiles with libvirt API and
+subprocess counts per iteration, and compares them with a stored
+baseline.
+
+    python benchmarks/run.py                      # compare with baseline
+    python benchmarks/run.py --save-baseline      # record a new baseline
+    python benchmarks/run.py --scales 10,100 --only gpu_detector
+
+Exits with status 1 if any case regressed.
+"""
+
+import argparse
+import fnmatch
+import json
+import logging
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+sys.path.insert(0, str(BENCH_DIR))
+
+from harness import BenchmarkResult, CallCounter  # noqa: E402
+
+
+DEFAULT_BASELINE = BENCH_DIR / "baselines" / "baseline.json"
+BASELINE_FORMAT = 1
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="VirtFlow benchmarks")
+    parser.add_argument('--scales', default="10,100,1000",
+                        help="Domain / PCI device counts (default: 10,100,1000)")
+    parser.add_argument('--iterations', type=int, default=10, help="Measured runs per case")
+    parser.add_argument('--uri', default="test:///default", help="libvirt URI to benchmark against")
+    parser.add_argument('--only', action='append', metavar='PATTERN',
+                        help="Run cases matching a glob (e.g. 'vfio.*'); repeatable")
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the baseline")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="Allowed p50 slowdown as a fraction (default: 0.25)")
+    parser.add_argument('--min-delta-ms', type=float, default=0.5,
+                        help="Ignore p50 slowdowns smaller than this (timer noise)")
+    parser.add_argument('--json', type=Path, help="Also write results to this file")
+    return parser.parse_args(argv)
+
+
+def selected(results: List[BenchmarkResult], patterns) -> List[BenchmarkResult]:
+    if not patterns:
+        return results
+    return [r for r in results if any(fnmatch.fnmatch(r.case, p) for p in patterns)]
+
+
+def run(args) -> List[BenchmarkResult]:
+    import config
+    # Code that opens its own connection (e.g. the VM list) must use the test driver too
+    config.DEFAULT_LIBVIRT_URI = args.uri
+    import cases
+
+    scales = [int(scale) for scale in args.scales.split(',') if scale]
+    counter = CallCounter()
+    results = []
+    with tempfile.TemporaryDirectory(prefix="virtflow-bench-") as workdir, counter.active():
+        context = cases.Context(args.uri, Path(workdir), counter, args.iterations)
+        try:
+            for bench in cases.UNSCALED_CASES:
+                results.extend(selected(bench(context), args.only))
+            for scale in scales:
+                for bench in cases.SCALED_CASES:
+                    results.extend(selected(bench(context, scale), args.only))
+                    print(f"  {bench.__name__} [{scale}] done", file=sys.stderr)
+        finally:
+            cases.cleanup(context)
+    return results
+
+
+def compare(results: List[BenchmarkResult], baseline: Dict, threshold: float, min_delta_ms: float) -> Dict[str, List[str]]:
+    """
+    Find regressions against a baseline
+
+    A case regresses if its median got slower by more than the threshold
+    (and more than min_delta_ms), or if it makes more libvirt calls or
+    spawns more subprocesses than before.
+    """
+    regressions = {}
+    for result in results:
+        previous = baseline.get(result.key)
+        if result.skipped or previous is None or previous.get('skipped'):
+            continue
+        problems = []
+        if (result.p50_ms > previous['p50_ms'] * (1 + threshold)
+                and result.p50_ms - previous['p50_ms'] > min_delta_ms):
+            problems.append(f"p50 {previous['p50_ms']:.2f} -> {result.p50_ms:.2f} ms")
+        if result.rpc_per_iteration > previous['rpc_per_iteration']:
+            problems.append(f"libvirt calls {previous['rpc_per_iteration']:g} -> {result.rpc_per_iteration:g}")
+        if result.subprocesses_per_iteration > previous['subprocesses_per_iteration']:
+            problems.append(
+                f"subprocesses {previous['subprocesses_per_iteration']:g} -> {result.subprocesses_per_iteration:g}"
+            )
+        if problems:
+            regressions[result.key] = problems
+    return regressions
+
+
+def print_report(results: List[BenchmarkResult], regressions: Dict[str, List[str]]):
+    print(f"{'CASE':<36} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'RPC':>8} {'PROC':>6}")
+    for result in results:
+        if result.skipped:
+            print(f"{result.key:<36} skipped: {result.skipped}")
+            continue
+        flag = "  REGRESSED" if result.key in regressions else ""
+        print(
+            f"{result.key:<36} {result.p50_ms:>9.2f} {result.p90_ms:>9.2f} {result.p99_ms:>9.2f} "
+            f"{result.rpc_per_iteration:>8g} {result.subprocesses_per_iteration:>6g}{flag}"
+        )
+    for key, problems in regressions.items():
+        print(f"REGRESSION {key}: {'; '.join(problems)}")
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    from utils.logger import set_console_stream
+    set_console_stream(sys.stderr, logging.WARNING)
+
+    results = run(args)
+
+    baseline = {}
+    if args.baseline.exists():
+        data = json.loads(args.baseline.read_text())
+        if data.get('format') == BASELINE_FORMAT:
+            baseline = data['results']
+
+    regressions = {} if args.save_baseline else compare(
+        results, baseline, args.threshold, args.min_delta_ms
+    )
+    print_report(results, regressions)
+
+    if args.json:
+        args.json.write_text(json.dumps([r.to_dict() for r in results], indent=2))
+    if args.save_baseline:
+        baseline.update({r.key: r.to_dict() for r in results if not r.skipped})
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps({'format': BASELINE_FORMAT, 'results': baseline}, indent=2))
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+    elif not baseline:
+        print(f"No baseline at {args.baseline}; run with --save-baseline to record one", file=sys.stderr)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+#!/bin/bash
+# Install a systemd unit that starts VirtFlow autostart VMs at boot
+#
+# Enable autostart per VM with: virtflow autostart enable VM --priority N --delay S
+
+set -e
+
+if [ "$EUID" -ne 0 ]; then
+    echo "Please run with sudo"
+    exit 1
+fi
+
+ACTUAL_USER="${SUDO_USER:-$USER}"
+VIRTFLOW_BIN="$(sudo -u "$ACTUAL_USER" bash -lc 'command -v virtflow' || true)"
+
+if [ -z "$VIRTFLOW_BIN" ]; then
+    echo "virtflow command not found for $ACTUAL_USER (pip install -e . first)"
+    exit 1
+fi
+
+echo "Installing virtflow-autostart.service for user: $ACTUAL_USER"
+
+cat > /etc/systemd/system/virtflow-autostart.service << EOF
+[Unit]
+Description=VirtFlow autostart VMs
+# Monolithic libvirtd or the modular virtqemud, whichever the host runs
+Wants=libvirtd.service virtqemud.service network-online.target
+After=libvirtd.service virtqemud.service network-online.target
+
+[Service]
+Type=oneshot
+User=$ACTUAL_USER
+ExecStart=$VIRTFLOW_BIN --verbose autostart run
+RemainAfterExit=yes
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+systemctl daemon-reload
+systemctl enable virtflow-autostart.service
+
+echo "✓ Installed. VMs with 'virtflow autostart enable' now start at boot."
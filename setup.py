@@ -30,12 +30,16 @@ setup(
         "PySide6>=6.5.0",
         "libvirt-python>=9.0.0",
         "psutil>=5.9.0",
+        "numpy>=1.24",
         "pyqtdarktheme>=2.1.0",
     ],
+    extras_require={
+        "yaml": ["PyYAML>=6.0"],  # YAML fleet manifests
+    },
     python_requires=">=3.11",
     entry_points={
         "console_scripts": [
-            "virtflow=main:main",
+            "virtflow=cli:main",
         ],
         "gui_scripts": [
             "virtflow-gui=main:main",
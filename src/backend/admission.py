@@ -0,0 +1,282 @@
+"""
+Admission control - Check that the host can back a guest before it starts
+
+Before domain.create() the controller compares what the guest needs with
+what the host has:
+
+- guest memory already committed: the current balloon size of every
+  running guest from one getAllDomainStats call (hugepage-backed guests
+  are excluded, their memory comes from the hugepage pools),
+- host memory and MemAvailable from /proc/meminfo (libvirt's node memory
+  stats for remote hosts), less config.ADMISSION_HOST_RESERVE_MB kept for
+  the host itself,
+- free pages in the guest's hugepage pool, if it uses hugepages.
+
+A start is refused if the guest would take committed memory past the
+host's RAM times config.ADMISSION_OVERCOMMIT, or needs more hugepages
+than the pool holds. It is queued (waits up to
+config.ADMISSION_QUEUE_TIMEOUT) if the memory exists but is not free yet,
+e.g. while another guest shuts down; this applies to hugepage and locked
+(passthrough) guests, whose memory is allocated and pinned at start. For
+other guests that case only warns, as their memory is faulted in lazily.
+
+config.ADMISSION_MODE = 'warn' turns refusals into warnings, 'off'
+disables the checks.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import libvirt
+
+from backend.domain_xml import XML_INACTIVE
+from backend.host_resources import HugepagePool, default_hugepage_size_kib, hugepage_pools, read_meminfo
+from utils.logger import logger
+from utils import metrics
+import config
+
+
+ADMIT, WARN, QUEUE, REFUSE = 'admit', 'warn', 'queue', 'refuse'
+
+ADMISSION_DECISIONS = metrics.counter(
+    'virtflow_admission_decisions_total', "Start admission decisions", ['verdict']
+)
+ADMISSION_QUEUE_SECONDS = metrics.histogram(
+    'virtflow_admission_queue_seconds', "Time starts waited for host memory", ['result']
+)
+
+
+class AdmissionError(RuntimeError):
+    """A start was refused because the host cannot back the guest"""
+
+    def __init__(self, decision: 'AdmissionDecision'):
+        super().__init__(decision.reason)
+        self.decision = decision
+
+
+@dataclass(frozen=True)
+class AdmissionDecision:
+    """Outcome of an admission check"""
+    verdict: str  # ADMIT, WARN, QUEUE or REFUSE
+    reason: str
+    needed_kib: int = 0
+    available_kib: int = 0
+    page_size_kib: int = 0  # hugepage size the memory comes from, 0 for normal memory
+
+    @property
+    def allowed(self) -> bool:
+        return self.verdict in (ADMIT, WARN)
+
+
+@dataclass(frozen=True)
+class HostMemory:
+    """Memory of a host as seen by admission control"""
+    total_kib: int  # RAM outside the hugepage pools
+    available_kib: int  # MemAvailable
+    committed_kib: int  # current memory of running, non-hugepage guests
+    pools: Dict[int, HugepagePool]  # page size (KiB) -> pool (local hosts only)
+
+    @property
+    def budget_kib(self) -> int:
+        """Guest memory the host may commit"""
+        return int(self.total_kib * config.ADMISSION_OVERCOMMIT) - config.ADMISSION_HOST_RESERVE_MB * 1024
+
+
+class AdmissionController:
+    """Admission checks for the guests of one connection"""
+
+    def __init__(self, manager):
+        """
+        Args:
+            manager: LibvirtManager whose host is checked
+        """
+        self.manager = manager
+        self._lock = threading.Lock()
+        # UUID -> (KiB, hugepage size or 0) of starts admitted but not yet running
+        self._claims: Dict[str, Tuple[int, int]] = {}
+
+    # ------------------------------------------------------------------
+    # Host state
+    # ------------------------------------------------------------------
+
+    def host_ram(self) -> Tuple[int, int]:
+        """
+        Read host RAM outside the hugepage pools
+
+        Returns:
+            (total, available) in KiB
+        """
+        if self.manager.is_local:
+            meminfo = read_meminfo()
+            # MemTotal includes every pool, not only the default-size one meminfo describes
+            hugepages_kib = sum(pool.total * pool.page_size_kib for pool in hugepage_pools().values())
+            return (meminfo.get('MemTotal', 0) - hugepages_kib,
+                    meminfo.get('MemAvailable', meminfo.get('MemFree', 0)))
+
+        conn = self.manager.connection
+        if conn is None:
+            raise ConnectionError(f"cannot connect to {self.manager.uri}")
+        stats = conn.getMemoryStats(libvirt.VIR_NODE_MEMORY_STATS_ALL_CELLS)
+        return stats.get('total', 0), stats.get('free', 0) + stats.get('buffers', 0) + stats.get('cached', 0)
+
+    def host_memory(self) -> HostMemory:
+        """Read host memory and the reservations of running guests"""
+        conn = self.manager.connection
+        if conn is None:
+            raise ConnectionError(f"cannot connect to {self.manager.uri}")
+        total, available = self.host_ram()
+        pools = hugepage_pools() if self.manager.is_local else {}
+
+        committed = 0
+        records = conn.getAllDomainStats(
+            libvirt.VIR_DOMAIN_STATS_BALLOON, libvirt.VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE
+        )
+        for domain, stats in records:
+            try:
+                if self.manager.domains.facts(domain).memory_backing.hugepages:
+                    continue
+            except libvirt.libvirtError:
+                pass  # stopped since the stats call
+            committed += stats.get('balloon.current', stats.get('balloon.maximum', 0))
+        return HostMemory(total, available, committed, pools)
+
+    # ------------------------------------------------------------------
+    # Decisions
+    # ------------------------------------------------------------------
+
+    def check(self, domain: libvirt.virDomain, claim: bool = False) -> AdmissionDecision:
+        """
+        Decide whether a guest may start now
+
+        Args:
+            domain: Stopped domain about to be started
+            claim: Claim the guest's memory if it may start, in the same
+                   step as the decision (see admit())
+        """
+        if config.ADMISSION_MODE == 'off':
+            return AdmissionDecision(ADMIT, "Admission control is off")
+
+        try:
+            facts = self.manager.domains.facts(domain, XML_INACTIVE)
+            host = self.host_memory()
+        except (libvirt.libvirtError, OSError) as e:
+            # Never block a start because the check itself failed
+            logger.warning(f"Admission check skipped: {e}")
+            return AdmissionDecision(ADMIT, f"Host memory unknown: {e}")
+        needed = facts.memory_kib
+        backing = facts.memory_backing
+        page_size = (backing.page_size_kib or default_hugepage_size_kib()) if backing.hugepages else 0
+        # Concurrent starts must see each other's claims, so the decision
+        # and the claim happen under one lock
+        with self._lock:
+            claimed = sum(
+                kib for uuid, (kib, size) in self._claims.items() if uuid != facts.uuid and size == page_size
+            )
+            if page_size:
+                decision = self._check_hugepages(facts.name, needed, page_size, host, claimed)
+            else:
+                decision = self._check_memory(
+                    facts.name, needed, backing.locked or facts.has_pci_hostdev, host, claimed
+                )
+
+            if decision.verdict == REFUSE and config.ADMISSION_MODE == 'warn':
+                decision = AdmissionDecision(
+                    WARN, decision.reason, decision.needed_kib, decision.available_kib, page_size
+                )
+            if claim and decision.allowed:
+                self._claims[facts.uuid] = (decision.needed_kib, decision.page_size_kib)
+        ADMISSION_DECISIONS.labels(decision.verdict).inc()
+        logger.debug(f"Admission of '{facts.name}': {decision.verdict}: {decision.reason}")
+        return decision
+
+    def _check_memory(self, name: str, needed: int, pinned: bool, host: HostMemory, claimed: int) -> AdmissionDecision:
+        committed = host.committed_kib + claimed
+        if committed + needed > host.budget_kib:
+            return AdmissionDecision(
+                REFUSE,
+                f"'{name}' needs {_mib(needed)}, but guests already hold {_mib(committed)} of the "
+                f"{_mib(max(host.budget_kib, 0))} this host may commit "
+                f"(overcommit {config.ADMISSION_OVERCOMMIT:g}x, {config.ADMISSION_HOST_RESERVE_MB} MiB reserved)",
+                needed, max(host.budget_kib - committed, 0)
+            )
+
+        available = host.available_kib - claimed - config.ADMISSION_HOST_RESERVE_MB * 1024
+        if needed > available:
+            reason = f"'{name}' needs {_mib(needed)}, only {_mib(max(available, 0))} is free right now"
+            if pinned:
+                return AdmissionDecision(QUEUE, reason + " (memory is locked at start)", needed, max(available, 0))
+            return AdmissionDecision(WARN, reason + "; the host may swap", needed, max(available, 0))
+        return AdmissionDecision(ADMIT, "Enough memory", needed, available)
+
+    def _check_hugepages(
+        self,
+        name: str,
+        needed: int,
+        size: int,
+        host: HostMemory,
+        claimed: int
+    ) -> AdmissionDecision:
+        if not self.manager.is_local:
+            return AdmissionDecision(ADMIT, "Hugepage pools of remote hosts are not checked", needed, 0, size)
+
+        pages = -(-needed // size)
+        pool = host.pools.get(size)
+        if pool is None or pool.total < pages:
+            return AdmissionDecision(
+                REFUSE,
+                f"'{name}' needs {pages} x {size} KiB hugepages, the pool has {pool.total if pool else 0}",
+                needed, pool.free_kib if pool else 0, size
+            )
+        free = pool.free - -(-claimed // size)
+        if free < pages:
+            return AdmissionDecision(
+                QUEUE, f"'{name}' needs {pages} x {size} KiB hugepages, {max(free, 0)} are free",
+                needed, max(free, 0) * size, size
+            )
+        return AdmissionDecision(ADMIT, "Enough hugepages", needed, free * size, size)
+
+    # ------------------------------------------------------------------
+    # Starting
+    # ------------------------------------------------------------------
+
+    def admit(self, domain: libvirt.virDomain, timeout: Optional[float] = None) -> AdmissionDecision:
+        """
+        Wait until a guest may start, and claim its memory
+
+        Queued starts are re-checked every second until the timeout. Call
+        release() once the domain runs (or failed to start).
+
+        Args:
+            domain: Stopped domain about to be started
+            timeout: Seconds a queued start may wait (default: config.ADMISSION_QUEUE_TIMEOUT)
+
+        Raises:
+            AdmissionError: If the start is refused or still queued at the timeout
+        """
+        timeout = config.ADMISSION_QUEUE_TIMEOUT if timeout is None else timeout
+        start = time.monotonic()
+        decision = self.check(domain, claim=True)
+        if decision.verdict == QUEUE:
+            logger.info(f"Start of '{domain.name()}' queued: {decision.reason}")
+            while decision.verdict == QUEUE and time.monotonic() - start < timeout:
+                time.sleep(1)
+                decision = self.check(domain, claim=True)
+            ADMISSION_QUEUE_SECONDS.labels('admitted' if decision.allowed else decision.verdict).observe(
+                time.monotonic() - start
+            )
+        if decision.verdict != ADMIT:
+            logger.warning(f"Start of '{domain.name()}': {decision.verdict}: {decision.reason}")
+        if not decision.allowed:
+            raise AdmissionError(decision)
+        return decision
+
+    def release(self, domain: libvirt.virDomain):
+        """Drop the claim of an admitted start"""
+        with self._lock:
+            self._claims.pop(domain.UUIDString(), None)
+
+
+def _mib(kib: int) -> str:
+    return f"{kib // 1024} MiB"
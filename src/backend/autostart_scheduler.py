@@ -0,0 +1,322 @@
+"""
+Autostart scheduler - Boot-storm aware start of autostarted VMs
+
+libvirt's own autostart flag makes libvirtd start every flagged guest at
+the same moment when the host boots, passthrough guests included (and so
+their VFIO binds). VirtFlow instead keeps an AutostartPolicy (priority
+and delay) in each domain's <metadata>, clears libvirt's flag, and this
+scheduler starts the guests, e.g. from a systemd unit running
+`virtflow autostart run` after libvirtd (scripts/install_autostart_service.sh):
+
+- higher priorities first; a priority starts once every VM of the
+  previous one has been launched,
+- no VM before its delay (seconds after the scheduler started),
+- at most config.AUTOSTART_JOBS starts in flight,
+- each start waits until the host is ready for it: enough free
+  hugepages, its passthrough devices not held by a running guest and no
+  other passthrough start in flight, and storage latency below
+  config.AUTOSTART_STORAGE_LATENCY_MS. A VM still blocked after
+  config.AUTOSTART_GATE_TIMEOUT seconds is started anyway if only storage
+  latency holds it (a slow boot beats no boot), and reported as failed if
+  a hard gate (hugepages, passthrough devices) does.
+
+Resource gates read /proc and /sys, so they only apply to local hosts.
+"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set
+
+import libvirt
+
+from backend.admission import AdmissionError
+from backend.bulk_lifecycle import OperationResult
+from backend.domain_registry import DomainFacts
+from backend.domain_xml import AutostartPolicy, VIRTFLOW_NS, XML_INACTIVE
+from backend.host_resources import (
+    block_device, default_hugepage_size_kib, hugepage_pools, io_latency_ms, read_diskstats
+)
+from backend.libvirt_manager import LibvirtManager
+from backend.vm_controller import VMController
+from utils.logger import logger
+from utils import metrics
+import config
+
+
+# Gates a VM is started past once AUTOSTART_GATE_TIMEOUT expires; the
+# others (hugepages, gpu, vfio) would make the start itself fail
+ADVISORY_GATES = ('storage',)
+
+AUTOSTART_SECONDS = metrics.histogram(
+    'virtflow_autostart_seconds', "Time from scheduler start until all autostart VMs were launched",
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600)
+)
+AUTOSTART_GATE_WAITS = metrics.counter(
+    'virtflow_autostart_gate_waits_total', "Scheduler polls that held a VM back", ['gate']
+)
+
+
+def set_autostart_policy(manager: LibvirtManager, domain: libvirt.virDomain, policy: Optional[AutostartPolicy]):
+    """
+    Store (or with None, remove) a domain's VirtFlow autostart policy
+
+    Also clears libvirt's own autostart flag, so libvirtd no longer starts
+    the VM by itself at boot.
+
+    Raises:
+        libvirt.libvirtError: If the domain cannot be updated
+    """
+    domain.setMetadata(
+        libvirt.VIR_DOMAIN_METADATA_ELEMENT,
+        policy.to_xml() if policy is not None else None,
+        'virtflow', VIRTFLOW_NS,
+        libvirt.VIR_DOMAIN_AFFECT_CONFIG
+    )
+    manager.domains.invalidate(domain.UUIDString())
+    if domain.autostart():
+        domain.setAutostart(0)
+
+
+@dataclass
+class _Entry:
+    domain: libvirt.virDomain
+    facts: DomainFacts
+    policy: AutostartPolicy
+    hugepages: Dict[int, int]  # page size (KiB) -> pages needed
+    devices: Set[str]  # block devices holding its disks
+    blocked_since: Optional[float] = None
+    reason: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        return self.facts.name
+
+    @property
+    def passthrough(self) -> Set[str]:
+        return {str(hostdev.address) for hostdev in self.facts.hostdevs}
+
+
+class AutostartScheduler:
+    """Starts the autostart VMs of one connection"""
+
+    def __init__(self, manager: LibvirtManager, max_jobs: Optional[int] = None):
+        """
+        Args:
+            manager: Connection whose VMs are started
+            max_jobs: Starts in flight at once (default: config.AUTOSTART_JOBS)
+        """
+        self.manager = manager
+        self.controller = VMController(manager)
+        self.max_jobs = max_jobs or config.AUTOSTART_JOBS
+        self.gated = manager.is_local
+        self._diskstats = read_diskstats() if self.gated else {}
+
+    # ------------------------------------------------------------------
+    # Planning
+    # ------------------------------------------------------------------
+
+    def plan(self) -> List[List[_Entry]]:
+        """
+        Autostart VMs that are not running, grouped by priority
+
+        Returns:
+            Groups from the highest priority down, each ordered by delay
+        """
+        entries = []
+        default_size = None
+        for domain in self.manager.list_all_vms():
+            try:
+                if domain.isActive():
+                    continue
+                facts = self.manager.domains.facts(domain, XML_INACTIVE)
+            except libvirt.libvirtError as e:
+                logger.debug(f"Skipping domain: {e}")
+                continue
+            if facts.autostart is None:
+                continue
+
+            hugepages = {}
+            if facts.memory_backing.hugepages and self.gated:
+                if facts.memory_backing.page_size_kib is None and default_size is None:
+                    default_size = default_hugepage_size_kib()
+                size = facts.memory_backing.page_size_kib or default_size
+                hugepages[size] = -(-facts.memory_kib // size)
+            devices = {block_device(path) for path in facts.disk_paths} if self.gated else set()
+            devices.discard(None)
+            entries.append(_Entry(domain, facts, facts.autostart, hugepages, devices))
+
+        groups: Dict[int, List[_Entry]] = {}
+        for entry in sorted(entries, key=lambda e: (e.policy.delay, e.name)):
+            groups.setdefault(entry.policy.priority, []).append(entry)
+        return [groups[priority] for priority in sorted(groups, reverse=True)]
+
+    # ------------------------------------------------------------------
+    # Gates
+    # ------------------------------------------------------------------
+
+    def _held_devices(self) -> Dict[str, str]:
+        """PCI addresses passed through to running VMs -> VM name"""
+        held = {}
+        for domain in self.manager.list_all_vms():
+            try:
+                if not domain.isActive():
+                    continue
+                facts = self.manager.domains.facts(domain)
+            except libvirt.libvirtError:
+                continue
+            for hostdev in facts.hostdevs:
+                held[str(hostdev.address)] = facts.name
+        return held
+
+    def _storage_latency(self, devices: Set[str]) -> Optional[float]:
+        """Worst disk latency of the devices since the previous poll"""
+        now = read_diskstats()
+        latency = io_latency_ms(self._diskstats, now, devices)
+        self._diskstats = now
+        return latency
+
+    def _blocked(
+        self,
+        entry: _Entry,
+        in_flight: List[_Entry],
+        held: Dict[str, str],
+        latency: Optional[float]
+    ) -> Optional[str]:
+        """Why the host is not ready to start a VM yet (None if it is)"""
+        if entry.facts.hostdevs:
+            if any(other.facts.hostdevs for other in in_flight):
+                return 'vfio: another passthrough VM is starting'
+            busy = entry.passthrough & set(held)
+            if busy:
+                device = sorted(busy)[0]
+                return f"gpu: {device} is passed through to '{held[device]}'"
+
+        if entry.hugepages:
+            pools = hugepage_pools()
+            for size, pages in entry.hugepages.items():
+                # Pages of starts still in flight may not be taken yet
+                claimed = sum(other.hugepages.get(size, 0) for other in in_flight)
+                pool = pools.get(size)
+                free = pool.free if pool else 0
+                if free - claimed < pages:
+                    return f"hugepages: {pages} x {size} KiB needed, {max(free - claimed, 0)} free"
+
+        if latency is not None and latency > config.AUTOSTART_STORAGE_LATENCY_MS:
+            return f"storage: {latency:.0f} ms latency"
+        return None
+
+    # ------------------------------------------------------------------
+    # Running
+    # ------------------------------------------------------------------
+
+    def run(self, on_result: Optional[Callable[[OperationResult], None]] = None) -> List[OperationResult]:
+        """
+        Start all autostart VMs that are not running
+
+        Args:
+            on_result: Called as each VM is started or given up on
+
+        Returns:
+            One OperationResult per VM, in start order
+        """
+        started = time.monotonic()
+        results: List[OperationResult] = []
+
+        def finish(result: OperationResult):
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+
+        groups = self.plan()
+        total = sum(len(group) for group in groups)
+        if not total:
+            logger.info("No autostart VMs to start")
+            return results
+        logger.info(f"Autostarting {total} VM(s) in {len(groups)} priority group(s)")
+
+        with ThreadPoolExecutor(max_workers=self.max_jobs, thread_name_prefix="autostart") as executor:
+            for group in groups:
+                self._run_group(group, executor, started, finish)
+
+        AUTOSTART_SECONDS.observe(time.monotonic() - started)
+        failed = [r.name for r in results if not r.ok]
+        logger.info(
+            f"Autostart: {len(results) - len(failed)}/{len(results)} started in {time.monotonic() - started:.1f}s"
+            + (f" (failed: {', '.join(failed)})" if failed else "")
+        )
+        return results
+
+    def _run_group(
+        self,
+        group: List[_Entry],
+        executor: ThreadPoolExecutor,
+        started: float,
+        finish: Callable[[OperationResult], None]
+    ):
+        """Start one priority group, polling the gates until all are launched"""
+        pending = list(group)
+        running: Dict[Future, _Entry] = {}
+
+        while pending or running:
+            now = time.monotonic()
+            latency, held = None, {}
+            if self.gated and any(entry.devices for entry in pending):
+                latency = self._storage_latency(set().union(*(entry.devices for entry in pending)))
+            if self.gated and any(entry.facts.hostdevs for entry in pending):
+                held = self._held_devices()
+
+            for entry in list(pending):
+                if len(running) >= self.max_jobs:
+                    break
+                if now < started + entry.policy.delay:
+                    continue
+                reason = self._blocked(entry, list(running.values()), held, latency) if self.gated else None
+                if reason is None:
+                    pending.remove(entry)
+                    running[executor.submit(self._start, entry)] = entry
+                    continue
+
+                AUTOSTART_GATE_WAITS.labels(reason.split(':')[0]).inc()
+                if entry.blocked_since is None:
+                    entry.blocked_since = now
+                    logger.info(f"Autostart of '{entry.name}' waiting ({reason})")
+                entry.reason = reason
+                if now - entry.blocked_since >= config.AUTOSTART_GATE_TIMEOUT:
+                    pending.remove(entry)
+                    if reason.split(':')[0] in ADVISORY_GATES:
+                        logger.warning(
+                            f"Autostart of '{entry.name}' starting anyway after "
+                            f"{config.AUTOSTART_GATE_TIMEOUT:g}s ({reason})"
+                        )
+                        running[executor.submit(self._start, entry)] = entry
+                        continue
+                    finish(OperationResult(
+                        entry.name, 'autostart', False,
+                        error=f"host not ready after {config.AUTOSTART_GATE_TIMEOUT:g}s ({reason})"
+                    ))
+
+            if not running:
+                if pending:
+                    time.sleep(config.AUTOSTART_POLL_INTERVAL)
+                continue
+            done, _ = wait(list(running), timeout=config.AUTOSTART_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                running.pop(future)
+                finish(future.result())
+
+    def _start(self, entry: _Entry) -> OperationResult:
+        start = time.perf_counter()
+        try:
+            ok = self.controller.start_vm(entry.domain)
+            error = None if ok else "Failed to start VM"
+        except AdmissionError as e:
+            ok, error = False, str(e)
+        result = OperationResult(
+            entry.name, 'autostart', ok,
+            error=error,
+            action=f"started after waiting for {entry.reason.split(':')[0]}" if ok and entry.reason else None
+        )
+        result.seconds = time.perf_counter() - start
+        return result
+
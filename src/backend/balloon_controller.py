@@ -0,0 +1,221 @@
+"""
+Balloon controller - Hand idle guests' memory back to a host short on it
+
+Every interval one getAllDomainStats call returns the balloon group of
+all running guests: current and maximum size, and what the guest itself
+reports as usable (free without swapping). Per guest:
+
+- when the guest runs short (usable below config.BALLOON_GROW_BELOW of
+  its current size), or the host has plenty of memory again
+  (MemAvailable above config.BALLOON_HOST_HIGH_MB), the balloon deflates
+  a step back toward the guest's maximum,
+- when the host runs short (MemAvailable below config.BALLOON_HOST_LOW_MB)
+  and the guest has been idle (usable above config.BALLOON_SHRINK_ABOVE)
+  for config.BALLOON_IDLE_SAMPLES samples in a row, it inflates a step
+  toward what the guest uses plus headroom, never below the floor
+  (config.BALLOON_FLOOR_RATIO of the maximum, at least BALLOON_MIN_MB).
+
+The gap between the low and high host marks, the idle streak and the
+minimum change (config.BALLOON_MIN_CHANGE_MB) keep guests from being
+resized back and forth. Guests with hugepages, locked memory or PCI
+passthrough are skipped: their memory is pinned and ballooning would not
+free any of it.
+
+Guests only report usable memory once a stats period is set; the
+controller sets one on guests that lack it (new VMs get it in their XML).
+"""
+
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import libvirt
+
+from backend.libvirt_manager import LibvirtManager
+from utils.logger import logger
+from utils import metrics
+import config
+
+
+BALLOON_ADJUSTMENTS = metrics.counter(
+    'virtflow_balloon_adjustments_total', "Balloon resizes of idle or pressured guests", ['direction']
+)
+BALLOON_RECLAIMED = metrics.gauge(
+    'virtflow_balloon_reclaimed_bytes', "Guest memory currently handed back to the host by ballooning"
+)
+
+_SHRINKS = BALLOON_ADJUSTMENTS.labels('shrink')
+_GROWS = BALLOON_ADJUSTMENTS.labels('grow')
+
+
+@dataclass
+class BalloonChange:
+    """One resize decided by the controller"""
+    domain: libvirt.virDomain
+    name: str
+    current_kib: int
+    target_kib: int
+    reason: str
+
+    @property
+    def direction(self) -> str:
+        return 'grow' if self.target_kib > self.current_kib else 'shrink'
+
+
+class BalloonController:
+    """Resizes the balloons of one connection's guests periodically"""
+
+    def __init__(self, manager: LibvirtManager, interval: Optional[float] = None):
+        """
+        Args:
+            manager: LibvirtManager instance
+            interval: Seconds between passes (default: config.BALLOON_INTERVAL)
+        """
+        self.manager = manager
+        self.interval = interval or config.BALLOON_INTERVAL
+        self._idle: Dict[str, int] = {}  # UUID -> consecutive idle samples
+        self._stats_period_set = set()  # UUIDs whose stats period was set
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # Decisions
+    # ------------------------------------------------------------------
+
+    def _managed(self, domain: libvirt.virDomain) -> bool:
+        """Whether ballooning can free any of the guest's memory"""
+        try:
+            facts = self.manager.domains.facts(domain)
+        except libvirt.libvirtError:
+            return False
+        backing = facts.memory_backing
+        return not (backing.hugepages or backing.locked or facts.has_pci_hostdev)
+
+    def _ensure_stats_period(self, domain: libvirt.virDomain, uuid: str):
+        """Ask the balloon driver for periodic stats (once per running guest)"""
+        if uuid in self._stats_period_set:
+            return
+        self._stats_period_set.add(uuid)
+        try:
+            domain.setMemoryStatsPeriod(config.BALLOON_STATS_PERIOD, libvirt.VIR_DOMAIN_AFFECT_LIVE)
+            logger.debug(f"Enabled balloon stats for '{domain.name()}'")
+        except libvirt.libvirtError as e:
+            logger.debug(f"Cannot enable balloon stats for '{domain.name()}': {e}")
+
+    def plan(self) -> List[BalloonChange]:
+        """
+        Sample all guests and decide which balloons to resize
+
+        Returns:
+            Resizes to apply, not yet applied
+        """
+        conn = self.manager.connection
+        if conn is None:
+            return []
+        try:
+            records = conn.getAllDomainStats(
+                libvirt.VIR_DOMAIN_STATS_BALLOON, libvirt.VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE
+            )
+            available_kib = self.manager.admission.host_ram()[1]
+        except (libvirt.libvirtError, OSError) as e:
+            logger.warning(f"Balloon pass skipped: {e}")
+            return []
+
+        host_low = available_kib < config.BALLOON_HOST_LOW_MB * 1024
+        host_high = available_kib > config.BALLOON_HOST_HIGH_MB * 1024
+        step = config.BALLOON_STEP_MB * 1024
+        min_change = config.BALLOON_MIN_CHANGE_MB * 1024
+
+        changes, reclaimed, running = [], 0, set()
+        for domain, stats in records:
+            uuid = domain.UUIDString()
+            running.add(uuid)
+            current = stats.get('balloon.current', 0)
+            maximum = stats.get('balloon.maximum', 0)
+            if not current or not maximum or not self._managed(domain):
+                continue
+            reclaimed += maximum - current
+            usable = stats.get('balloon.usable')
+            if usable is None:
+                self._ensure_stats_period(domain, uuid)
+                continue
+
+            floor = max(int(maximum * config.BALLOON_FLOOR_RATIO), config.BALLOON_MIN_MB * 1024)
+            free_ratio = usable / current
+            target, reason = current, None
+
+            if free_ratio < config.BALLOON_GROW_BELOW and current < maximum:
+                target, reason = min(maximum, current + step), f"guest has {usable // 1024} MiB usable"
+                self._idle[uuid] = 0
+            elif host_high and current < maximum:
+                target, reason = min(maximum, current + step), "host has memory to spare"
+            elif free_ratio > config.BALLOON_SHRINK_ABOVE:
+                self._idle[uuid] = self._idle.get(uuid, 0) + 1
+                if host_low and self._idle[uuid] >= config.BALLOON_IDLE_SAMPLES:
+                    used = current - usable
+                    wanted = max(floor, int(used * (1 + config.BALLOON_HEADROOM)))
+                    target, reason = min(current, max(wanted, current - step)), f"idle, host has {available_kib // 1024} MiB free"
+            else:
+                self._idle[uuid] = 0
+
+            if reason and abs(target - current) >= min_change:
+                changes.append(BalloonChange(domain, domain.name(), current, target, reason))
+
+        # Forget guests that stopped; their stats period must be set again
+        for uuid in list(self._idle):
+            if uuid not in running:
+                del self._idle[uuid]
+        self._stats_period_set &= running
+        BALLOON_RECLAIMED.set(reclaimed * 1024)
+        return changes
+
+    # ------------------------------------------------------------------
+    # Applying
+    # ------------------------------------------------------------------
+
+    def rebalance(self) -> List[BalloonChange]:
+        """
+        Run one pass: sample, decide and resize
+
+        Returns:
+            Changes that were applied
+        """
+        applied = []
+        for change in self.plan():
+            try:
+                change.domain.setMemoryFlags(change.target_kib, libvirt.VIR_DOMAIN_AFFECT_LIVE)
+            except libvirt.libvirtError as e:
+                logger.warning(f"Failed to resize balloon of '{change.name}': {e}")
+                continue
+            (_GROWS if change.direction == 'grow' else _SHRINKS).inc()
+            if change.direction == 'shrink':
+                self._idle[change.domain.UUIDString()] = 0
+            logger.info(
+                f"Balloon of '{change.name}': {change.current_kib // 1024} -> "
+                f"{change.target_kib // 1024} MiB ({change.reason})"
+            )
+            applied.append(change)
+        return applied
+
+    # ------------------------------------------------------------------
+    # Background rebalancing
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Rebalance every interval on a background thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="balloon-controller")
+        self._thread.start()
+
+    def stop(self):
+        """Stop rebalancing; balloons keep their current size"""
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.rebalance()
+            except Exception:
+                logger.exception("Balloon rebalancing failed")
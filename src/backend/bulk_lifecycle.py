@@ -0,0 +1,323 @@
+"""
+Bulk lifecycle operations - Start, stop, pause, resume and reboot many VMs
+
+Operations run through VMController on a bounded thread pool and report
+one OperationResult per VM, in input order. Starts can be staggered so a
+group of guests does not hit storage at the same moment, and ordered by
+dependencies (e.g. a router VM before the VMs behind it): a VM starts
+only once everything it depends on has started, and is skipped if a
+dependency failed.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+
+import libvirt
+
+from backend.vm_controller import VMController
+from utils.logger import logger
+import config
+
+
+OPERATIONS = ('start', 'stop', 'shutdown', 'pause', 'resume', 'reboot')
+
+
+@dataclass
+class OperationResult:
+    """Outcome of one operation on one VM"""
+    name: str
+    operation: str
+    ok: bool
+    error: Optional[str] = None
+    action: Optional[str] = None  # what was done, if not just the operation
+    seconds: float = 0.0
+
+    def to_dict(self) -> Dict:
+        result = {'name': self.name, 'ok': self.ok, 'operation': self.operation,
+                  'seconds': round(self.seconds, 3)}
+        if self.error:
+            result['error'] = self.error
+        if self.action:
+            result['action'] = self.action
+        return result
+
+
+class _Stagger:
+    """Hands out start slots at least `interval` seconds apart"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if self.interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def start_order(names: Iterable[str], depends: Optional[Dict[str, Iterable[str]]] = None) -> List[List[str]]:
+    """
+    Group VMs into waves that can start together
+
+    Args:
+        names: VMs to start
+        depends: VM name -> names it needs started first; dependencies
+                 outside `names` are ignored
+
+    Returns:
+        Waves of names, each depending only on earlier waves
+
+    Raises:
+        ValueError: If the dependencies form a cycle
+    """
+    names = list(dict.fromkeys(names))
+    selected = set(names)
+    pending = {
+        name: {dep for dep in (depends or {}).get(name, ()) if dep in selected and dep != name}
+        for name in names
+    }
+    waves = []
+    while pending:
+        wave = [name for name in names if name in pending and not pending[name]]
+        if not wave:
+            raise ValueError(f"Start dependencies form a cycle: {', '.join(sorted(pending))}")
+        waves.append(wave)
+        for name in wave:
+            del pending[name]
+        for deps in pending.values():
+            deps.difference_update(wave)
+    return waves
+
+
+class BulkLifecycle:
+    """Runs lifecycle operations on many VMs of one connection"""
+
+    def __init__(self, controller: VMController, max_workers: Optional[int] = None):
+        """
+        Args:
+            controller: VMController of the VMs' connection
+            max_workers: Operations in flight at once
+        """
+        self.controller = controller
+        self.max_workers = max_workers or config.BULK_JOBS
+
+    # ------------------------------------------------------------------
+    # Plumbing
+    # ------------------------------------------------------------------
+
+    def _run(
+        self,
+        operation: str,
+        domains: List[libvirt.virDomain],
+        action: Callable[[libvirt.virDomain], Optional[str]],
+        on_result: Optional[Callable[[OperationResult], None]] = None
+    ) -> List[OperationResult]:
+        """
+        Run an action per domain on the pool
+
+        The action raises (or returns normally with an optional
+        description of what it did) and never sees more than
+        max_workers siblings at a time.
+        """
+        def run(domain) -> OperationResult:
+            name = domain.name()
+            start = time.perf_counter()
+            try:
+                done = action(domain)
+                result = OperationResult(name, operation, True, action=done)
+            except Exception as e:
+                result = OperationResult(name, operation, False, error=str(e) or type(e).__name__)
+            result.seconds = time.perf_counter() - start
+            if on_result is not None:
+                on_result(result)
+            return result
+
+        if not domains:
+            return []
+        workers = max(1, min(self.max_workers, len(domains)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"bulk-{operation}") as executor:
+            results = list(executor.map(run, domains))
+
+        failed = [r.name for r in results if not r.ok]
+        logger.info(
+            f"Bulk {operation}: {len(results) - len(failed)}/{len(results)} succeeded"
+            + (f" (failed: {', '.join(failed)})" if failed else "")
+        )
+        return results
+
+    @staticmethod
+    def _check(ok: bool, message: str):
+        if not ok:
+            raise RuntimeError(message)
+
+    # ------------------------------------------------------------------
+    # Operations
+    # ------------------------------------------------------------------
+
+    def start(
+        self,
+        domains: List[libvirt.virDomain],
+        stagger: Optional[float] = None,
+        depends: Optional[Dict[str, Iterable[str]]] = None,
+        on_result: Optional[Callable[[OperationResult], None]] = None
+    ) -> List[OperationResult]:
+        """
+        Start VMs, wave by wave in dependency order
+
+        Args:
+            domains: VMs to start (running ones are reported as ok)
+            stagger: Seconds between consecutive starts (default: config.START_STAGGER)
+            depends: VM name -> names to start first (default: config.VM_START_DEPENDENCIES)
+            on_result: Called from a worker thread as each VM finishes
+
+        Raises:
+            ValueError: If the dependencies form a cycle
+        """
+        dependencies = config.VM_START_DEPENDENCIES if depends is None else depends
+        by_name = {domain.name(): domain for domain in domains}
+        waves = start_order(by_name, dependencies)
+        slots = _Stagger(config.START_STAGGER if stagger is None else stagger)
+
+        def start(domain) -> Optional[str]:
+            if domain.isActive():
+                return "already running"
+            slots.wait()
+            self._check(self.controller.start_vm(domain), "Failed to start VM")
+            return None
+
+        results: Dict[str, OperationResult] = {}
+        for wave in waves:
+            ready = []
+            for name in wave:
+                failed = [dep for dep in dependencies.get(name, ()) if dep in results and not results[dep].ok]
+                if failed:
+                    result = OperationResult(name, 'start', False, error=f"dependency '{failed[0]}' did not start")
+                    results[name] = result
+                    if on_result is not None:
+                        on_result(result)
+                else:
+                    ready.append(by_name[name])
+            for result in self._run('start', ready, start, on_result):
+                results[result.name] = result
+        return [results[domain.name()] for domain in domains if domain.name() in results]
+
+    def stop(
+        self,
+        domains: List[libvirt.virDomain],
+        force: bool = False,
+        on_result: Optional[Callable[[OperationResult], None]] = None
+    ) -> List[OperationResult]:
+        """Request shutdown (or power off) without waiting for the guests"""
+        def stop(domain) -> Optional[str]:
+            if not domain.isActive():
+                return "already off"
+            self._check(self.controller.stop_vm(domain, force=force), "Failed to stop VM")
+            return "powered off" if force else "shutdown requested"
+
+        return self._run('stop', domains, stop, on_result)
+
+    def shutdown(
+        self,
+        domains: List[libvirt.virDomain],
+        timeout: Optional[float] = None,
+        force_after: bool = False,
+        on_result: Optional[Callable[[OperationResult], None]] = None
+    ) -> List[OperationResult]:
+        """
+        Shut VMs down and wait until they are off
+
+        Shutdown requests go out on the pool; one loop then waits for all
+        guests, so slow guests do not hold up pool workers.
+
+        Args:
+            domains: VMs to shut down (stopped ones are reported as ok)
+            timeout: Seconds to wait (default: config.SHUTDOWN_TIMEOUT)
+            force_after: Power off guests still running after the timeout
+            on_result: Called as each VM finishes
+        """
+        timeout = config.SHUTDOWN_TIMEOUT if timeout is None else timeout
+        start = time.perf_counter()
+        requested = self.stop(domains)
+        results = {result.name: result for result in requested}
+        for result in requested:
+            result.operation = 'shutdown'
+
+        waiting = {
+            domain.name(): domain for domain in domains
+            if results[domain.name()].ok and results[domain.name()].action != "already off"
+        }
+        deadline = time.monotonic() + timeout
+        while waiting:
+            for name, domain in list(waiting.items()):
+                try:
+                    active = domain.isActive()
+                except libvirt.libvirtError:
+                    active = False  # transient domain gone
+                if not active:
+                    del waiting[name]
+                    results[name].action = "shut down"
+                    results[name].seconds = time.perf_counter() - start
+                    if on_result is not None:
+                        on_result(results[name])
+            if not waiting or time.monotonic() >= deadline:
+                break
+            time.sleep(0.5)
+
+        if waiting and force_after:
+            for result in self.stop(list(waiting.values()), force=True):
+                forced = results[result.name]
+                forced.ok, forced.error = result.ok, result.error
+                forced.action = f"powered off after {timeout:g}s" if result.ok else None
+                forced.seconds = time.perf_counter() - start
+                if on_result is not None:
+                    on_result(forced)
+        else:
+            for name in waiting:
+                results[name].ok = False
+                results[name].action = None
+                results[name].error = f"still running after {timeout:g}s"
+                results[name].seconds = time.perf_counter() - start
+                if on_result is not None:
+                    on_result(results[name])
+
+        for result in requested:
+            settled = not result.ok or result.action == "already off"
+            if settled and result.name not in waiting and on_result is not None:
+                on_result(result)
+        return [results[domain.name()] for domain in domains]
+
+    def pause(self, domains, on_result=None) -> List[OperationResult]:
+        return self._run(
+            'pause', domains,
+            lambda domain: self._check(self.controller.pause_vm(domain), "Failed to pause VM"),
+            on_result
+        )
+
+    def resume(self, domains, on_result=None) -> List[OperationResult]:
+        return self._run(
+            'resume', domains,
+            lambda domain: self._check(self.controller.resume_vm(domain), "Failed to resume VM"),
+            on_result
+        )
+
+    def reboot(self, domains, on_result=None) -> List[OperationResult]:
+        return self._run(
+            'reboot', domains,
+            lambda domain: self._check(self.controller.reboot_vm(domain), "Failed to reboot VM"),
+            on_result
+        )
+
+    def run(self, operation: str, domains: List[libvirt.virDomain], **kwargs) -> List[OperationResult]:
+        """Run an operation by name (one of OPERATIONS)"""
+        if operation not in OPERATIONS:
+            raise ValueError(f"Unknown operation '{operation}'")
+        return getattr(self, operation)(domains, **kwargs)
@@ -0,0 +1,273 @@
+"""
+Connection manager - Shared libvirt connections with keepalive and reconnect
+
+Every LibvirtManager for the same URI shares one ConnectionManager, and
+with it one libvirt connection. Each manager holds a reference; the
+connection is closed when the last one is released.
+
+Drops are detected by libvirt itself: connections are opened with the
+default event loop running on a daemon thread, keepalive enabled and a
+close callback registered, so callers no longer pay an isAlive() round
+trip on every access. After a drop, the next caller reconnects once; if
+that fails, further attempts wait out an exponential backoff and callers
+get None immediately instead of each hammering a restarting libvirtd.
+
+Dedicated (unshared) connections are for worker threads that make long
+blocking calls and should not queue behind the rest of the app.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import libvirt
+
+from utils.logger import logger
+from utils import metrics
+import config
+
+
+LIBVIRT_CONNECTS = metrics.counter(
+    'virtflow_libvirt_connects_total', "Attempts to open a libvirt connection", ['result']
+)
+LIBVIRT_DROPS = metrics.counter(
+    'virtflow_libvirt_connection_drops_total', "libvirt connections closed by the daemon or keepalive",
+    ['reason']
+)
+
+CLOSE_REASONS = {
+    libvirt.VIR_CONNECT_CLOSE_REASON_ERROR: "error",
+    libvirt.VIR_CONNECT_CLOSE_REASON_EOF: "eof",
+    libvirt.VIR_CONNECT_CLOSE_REASON_KEEPALIVE: "keepalive",
+    libvirt.VIR_CONNECT_CLOSE_REASON_CLIENT: "client",
+}
+
+
+# ----------------------------------------------------------------------
+# Event loop
+# ----------------------------------------------------------------------
+
+_event_loop_lock = threading.Lock()
+_event_loop_started = False
+
+
+def start_event_loop():
+    """
+    Run libvirt's default event loop on a daemon thread
+
+    Keepalive, close callbacks and domain events are only delivered while
+    an event loop runs, and it must be registered before connections are
+    opened. Safe to call more than once.
+    """
+    global _event_loop_started
+    with _event_loop_lock:
+        if _event_loop_started:
+            return
+        libvirt.virEventRegisterDefaultImpl()
+        threading.Thread(target=_run_event_loop, daemon=True, name="libvirt-events").start()
+        _event_loop_started = True
+
+
+def _run_event_loop():
+    while True:
+        try:
+            libvirt.virEventRunDefaultImpl()
+        except libvirt.libvirtError as e:
+            logger.error(f"libvirt event loop error: {e}")
+            time.sleep(1)
+
+
+# ----------------------------------------------------------------------
+# Connections
+# ----------------------------------------------------------------------
+
+class ConnectionManager:
+    """One libvirt connection, reopened with backoff after drops"""
+
+    def __init__(self, uri: str):
+        """
+        Args:
+            uri: libvirt connection URI
+        """
+        self.uri = uri
+        self._conn: Optional[libvirt.virConnect] = None
+        self._watched = False  # close callback registered
+        self._stale: List[libvirt.virConnect] = []  # dropped, closed on next connect
+        self._lock = threading.Lock()
+        self._refs = 0
+        self._delay = 0.0
+        self._next_attempt = 0.0
+        self._connect_callbacks: List[Callable[[libvirt.virConnect], None]] = []
+
+    @property
+    def references(self) -> int:
+        return self._refs
+
+    def add_connect_callback(self, callback: Callable[[libvirt.virConnect], None]):
+        """
+        Call back with every newly opened connection
+
+        Use it for per-connection setup such as event registrations, which
+        are lost when the connection drops. Called right away if connected.
+        """
+        self._connect_callbacks.append(callback)
+        if self._conn is not None:
+            callback(self._conn)
+
+    def remove_connect_callback(self, callback: Callable[[libvirt.virConnect], None]):
+        if callback in self._connect_callbacks:
+            self._connect_callbacks.remove(callback)
+
+    def connection(self) -> Optional[libvirt.virConnect]:
+        """
+        Get the connection, reconnecting if it dropped
+
+        Returns:
+            Open connection, or None while libvirt is unreachable
+        """
+        conn = self._conn
+        if conn is not None and (self._watched or self._is_alive(conn)):
+            return conn
+
+        with self._lock:
+            # Another thread may have reconnected while we waited
+            if self._conn is not None and (self._watched or self._is_alive(self._conn)):
+                return self._conn
+            if time.monotonic() < self._next_attempt:
+                return None
+            return self._open()
+
+    @staticmethod
+    def _is_alive(conn: libvirt.virConnect) -> bool:
+        try:
+            return conn.isAlive() == 1
+        except libvirt.libvirtError:
+            return False
+
+    def _open(self) -> Optional[libvirt.virConnect]:
+        """Open a new connection (caller holds the lock)"""
+        self._discard_stale()
+        if self._conn is not None:
+            self._stale.append(self._conn)
+            self._conn = None
+            self._discard_stale()
+
+        start_event_loop()
+        logger.info(f"Connecting to libvirt at {self.uri}")
+        try:
+            conn = libvirt.open(self.uri)
+        except libvirt.libvirtError as e:
+            conn = None
+            logger.error(f"Libvirt connection error: {e}")
+
+        if conn is None:
+            LIBVIRT_CONNECTS.labels('error').inc()
+            self._delay = min(max(self._delay * 2, config.LIBVIRT_RECONNECT_DELAY), config.LIBVIRT_RECONNECT_MAX_DELAY)
+            self._next_attempt = time.monotonic() + self._delay
+            logger.warning(f"Cannot reach libvirt at {self.uri}, retrying in {self._delay:.1f}s")
+            return None
+
+        LIBVIRT_CONNECTS.labels('ok').inc()
+        self._delay = 0.0
+        self._next_attempt = 0.0
+        self._watch(conn)
+        self._conn = conn
+        logger.info(f"Connected to hypervisor: {conn.getType()}")
+        logger.info(f"Hypervisor version: {conn.getVersion()}")
+
+        for callback in list(self._connect_callbacks):
+            try:
+                callback(conn)
+            except Exception:
+                logger.exception("Connection callback failed")
+        return conn
+
+    def _watch(self, conn: libvirt.virConnect):
+        """Enable keepalive and drop notification where the driver supports them"""
+        try:
+            conn.setKeepAlive(config.LIBVIRT_KEEPALIVE_INTERVAL, config.LIBVIRT_KEEPALIVE_COUNT)
+        except libvirt.libvirtError as e:
+            logger.debug(f"Keepalive not available for {self.uri}: {e}")
+        try:
+            conn.registerCloseCallback(self._on_close, None)
+            self._watched = True
+        except libvirt.libvirtError as e:
+            # Without a close callback fall back to checking isAlive() on access
+            self._watched = False
+            logger.debug(f"Close callback not available for {self.uri}: {e}")
+
+    def _on_close(self, conn: libvirt.virConnect, reason: int, opaque):
+        """Close callback, runs on the event loop thread"""
+        label = CLOSE_REASONS.get(reason, str(reason))
+        if reason == libvirt.VIR_CONNECT_CLOSE_REASON_CLIENT:
+            return
+        LIBVIRT_DROPS.labels(label).inc()
+        logger.warning(f"Connection to {self.uri} lost ({label})")
+        # No lock: a connect in progress may hold it. Closing from inside
+        # the callback is not allowed, so that happens on reconnect.
+        if self._conn is conn:
+            self._stale.append(conn)
+            self._conn = None
+
+    def _discard_stale(self):
+        while self._stale:
+            conn = self._stale.pop()
+            try:
+                conn.unregisterCloseCallback()
+            except libvirt.libvirtError:
+                pass
+            try:
+                conn.close()
+            except libvirt.libvirtError:
+                pass
+
+    def close(self):
+        """Close the connection; the next connection() call reopens it"""
+        with self._lock:
+            if self._conn is not None:
+                self._stale.append(self._conn)
+                self._conn = None
+            self._discard_stale()
+            self._delay = 0.0
+            self._next_attempt = 0.0
+        logger.info(f"Disconnected from libvirt at {self.uri}")
+
+
+# ----------------------------------------------------------------------
+# Sharing and reference counting
+# ----------------------------------------------------------------------
+
+_shared: Dict[str, ConnectionManager] = {}
+_shared_lock = threading.Lock()
+
+
+def acquire(uri: str, dedicated: bool = False) -> ConnectionManager:
+    """
+    Take a reference to the connection manager for a URI
+
+    Args:
+        uri: libvirt connection URI
+        dedicated: Get a private connection instead of the shared one
+
+    Returns:
+        ConnectionManager; give it back with release()
+    """
+    with _shared_lock:
+        manager = None if dedicated else _shared.get(uri)
+        if manager is None:
+            manager = ConnectionManager(uri)
+            if not dedicated:
+                _shared[uri] = manager
+        manager._refs += 1
+        return manager
+
+
+def release(manager: ConnectionManager):
+    """Drop a reference; the last one closes the connection"""
+    with _shared_lock:
+        manager._refs -= 1
+        if manager._refs > 0:
+            return
+        if _shared.get(manager.uri) is manager:
+            del _shared[manager.uri]
+    manager.close()
@@ -4,8 +4,8 @@ Dependency Checker - Verifies all required system packages are installed
 
 import subprocess
 import shutil
-from pathlib import Path
 from typing import Dict, List, Tuple
+from backend.host_capabilities import find_ovmf_code_path, find_ovmf_vars_template
 from utils.logger import logger
 
 
@@ -67,13 +67,21 @@ class DependencyChecker:
         """Check if user is in required groups"""
         import os
         import grp
+        import pwd
         
         required_groups = ['libvirt', 'kvm']
-        user = os.getenv('USER')
+        user = os.getenv('USER') or pwd.getpwuid(os.getuid()).pw_name
         missing_groups = []
         
         try:
-            user_groups = [g.gr_name for g in grp.getgrall() if user in g.gr_mem]
+            # Resolve only this user's groups instead of walking every group
+            gid = pwd.getpwnam(user).pw_gid
+            user_groups = set()
+            for group_id in os.getgrouplist(user, gid):
+                try:
+                    user_groups.add(grp.getgrgid(group_id).gr_name)
+                except KeyError:
+                    continue
             
             for group in required_groups:
                 if group not in user_groups:
@@ -86,18 +94,7 @@ class DependencyChecker:
 
     def check_ovmf_installed(self) -> bool:
         """Check if OVMF firmware is installed"""
-        templates = [
-            "/usr/share/OVMF/OVMF_CODE_4M.ms.fd",
-            "/usr/share/OVMF/OVMF_CODE_4M.fd",
-            "/usr/share/OVMF/OVMF_CODE.fd",
-            "/usr/share/OVMF/OVMF_VARS_4M.ms.fd",
-            "/usr/share/OVMF/OVMF_VARS_4M.fd",
-            "/usr/share/OVMF/OVMF_VARS.fd",
-        ]
-        for f in templates:
-            if Path(f).exists():
-                return True
-        return False
+        return find_ovmf_code_path() is not None or find_ovmf_vars_template() is not None
 
     def check_viewer_available(self) -> bool:
         """Check if SPICE/VNC viewer is available"""
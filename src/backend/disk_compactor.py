@@ -0,0 +1,300 @@
+"""
+Disk Compactor - Offline qcow2/raw compaction of stopped VMs
+
+`qemu-img convert` rewrites an image without its zeroed and discarded
+clusters. The copy is written next to the original (throttled with -r so
+shared storage stays usable) and swapped in with an atomic rename only if
+the VM stayed off and the source did not change meanwhile. Overlays keep
+their backing file (-B).
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import libvirt
+
+from backend.disk_jobs import DiskJob, disk_jobs
+from backend.disk_metadata import DiskMetadata, disk_metadata
+from backend.domain_xml import XML_INACTIVE
+from backend.libvirt_manager import LibvirtManager
+from backend.storage_reclaimer import StorageReclaimer, allocated_bytes
+from utils.logger import logger
+import config
+
+
+COMPACT_SUFFIX = ".compact"
+
+
+@dataclass
+class CompactionResult:
+    """Before/after allocation of a compacted image"""
+    path: str
+    size_before: int
+    size_after: int
+
+    @property
+    def reclaimed(self) -> int:
+        return max(0, self.size_before - self.size_after)
+
+
+def _creation_options(metadata: DiskMetadata) -> List[str]:
+    """Keep the source image's qcow2 layout in the rewritten copy"""
+    if metadata.format != 'qcow2':
+        return []
+
+    options = []
+    cluster_size = metadata.raw.get('cluster-size')
+    if cluster_size:
+        options.append(f"cluster_size={cluster_size}")
+    specific = metadata.raw.get('format-specific', {}).get('data', {})
+    if specific.get('lazy-refcounts'):
+        options.append("lazy_refcounts=on")
+    if specific.get('extended-l2'):
+        options.append("extended_l2=on")
+    return options
+
+
+class DiskCompactor:
+    """Compacts the disks of stopped VMs"""
+
+    def __init__(
+        self,
+        manager: LibvirtManager,
+        rate_limit: Optional[int] = None,
+        state_file: Optional[Path] = None
+    ):
+        """
+        Args:
+            manager: LibvirtManager instance
+            rate_limit: Default throttle in bytes/s (0 for unlimited)
+            state_file: Where last-compaction stamps are kept
+        """
+        self.manager = manager
+        self.rate_limit = config.COMPACTION_RATE_LIMIT if rate_limit is None else rate_limit
+        self.state_file = Path(state_file or config.DATA_DIR / "compaction.json")
+        self._state_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Last-compaction bookkeeping (path -> mtime_ns right after compaction)
+
+    def _load_state(self) -> Dict[str, int]:
+        try:
+            return json.loads(self.state_file.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _record(self, path: str):
+        with self._state_lock:
+            state = self._load_state()
+            state[path] = os.stat(path).st_mtime_ns
+            try:
+                self.state_file.write_text(json.dumps(state, indent=2))
+            except OSError as e:
+                logger.debug(f"Could not save compaction state: {e}")
+
+    # ------------------------------------------------------------------
+
+    def vm_images(self, domain: libvirt.virDomain) -> List[str]:
+        """
+        Get the images of a VM that are safe to compact
+
+        Skips CD-ROMs, block devices, template base images and images
+        another domain uses.
+        """
+        document = self.manager.domains.document(domain, XML_INACTIVE)
+        in_use = StorageReclaimer(self.manager.connection, self.manager.domains).paths_in_use(document.uuid)
+        templates_dir = os.path.realpath(config.TEMPLATES_DIR)
+
+        images = []
+        for disk in document.disks():
+            if disk.device != 'disk' or not disk.source:
+                continue
+            path = os.path.realpath(disk.source)
+            if not os.path.isfile(path) or path in in_use:
+                continue
+            if os.path.dirname(path) == templates_dir:
+                continue
+            images.append(path)
+        return images
+
+    def compact_image(
+        self,
+        path: str,
+        domain: libvirt.virDomain,
+        rate_limit: Optional[int] = None
+    ) -> Optional[DiskJob]:
+        """
+        Compact one image of a stopped VM in the background
+
+        Args:
+            path: Image path
+            domain: VM owning the image (must stay shut off)
+            rate_limit: Throttle in bytes/s (default: compactor's)
+
+        Returns:
+            DiskJob whose result is a CompactionResult, or None
+        """
+        if domain.isActive():
+            logger.error(f"VM '{domain.name()}' must be shut off to compact its disks")
+            return None
+
+        metadata = disk_metadata.get(path)
+        if metadata is None or metadata.format not in ('qcow2', 'raw'):
+            logger.warning(f"Not compacting {path}: unsupported or unreadable image")
+            return None
+
+        if metadata.raw.get('snapshots'):
+            # qemu-img convert copies the active layer only
+            logger.warning(f"Not compacting {path}: it has internal snapshots")
+            return None
+
+        # Keep the backing reference as written (often relative), not resolved
+        backing, backing_format = None, None
+        if metadata.backing_file:
+            backing = metadata.raw.get('backing-filename') or metadata.backing_file
+            backing_format = metadata.raw.get('backing-filename-format')
+
+        source_stat = os.stat(path)
+        size_before = source_stat.st_blocks * 512
+        destination = path + COMPACT_SUFFIX
+
+        def swap(job: DiskJob) -> CompactionResult:
+            # The copy is only valid if nobody touched the source meanwhile
+            current = os.stat(path)
+            if domain.isActive():
+                raise RuntimeError(f"VM '{domain.name()}' was started during compaction")
+            if (current.st_mtime_ns, current.st_size) != (source_stat.st_mtime_ns, source_stat.st_size):
+                raise RuntimeError(f"{path} changed during compaction")
+
+            size_after = allocated_bytes(Path(destination))
+            if size_after >= size_before:
+                os.unlink(destination)
+                logger.info(f"{path} is already compact")
+                self._record(path)
+                return CompactionResult(path, size_before, size_before)
+
+            shutil.copymode(path, destination)
+            try:
+                os.chown(destination, current.st_uid, current.st_gid)
+            except PermissionError:
+                pass
+            with open(destination, 'rb') as f:
+                os.fsync(f.fileno())
+            os.replace(destination, path)
+
+            directory = os.open(os.path.dirname(path), os.O_RDONLY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+
+            disk_metadata.invalidate(path)
+            self._record(path)
+            result = CompactionResult(path, size_before, size_after)
+            logger.info(f"Compacted {path}: {size_before} -> {size_after} bytes")
+            return result
+
+        limit = self.rate_limit if rate_limit is None else rate_limit
+        return disk_jobs.submit_convert(
+            path,
+            destination,
+            out_format=metadata.format,
+            source_format=metadata.format,
+            options=_creation_options(metadata),
+            backing=backing,
+            backing_format=backing_format,
+            rate_limit=limit or None,
+            on_success=swap,
+            kind='compact',
+            description=f"Compacting {Path(path).name}"
+        )
+
+    def compact_vm(self, vm_name: str, rate_limit: Optional[int] = None) -> List[DiskJob]:
+        """
+        Compact all disks of a stopped VM
+
+        Returns:
+            List of started jobs
+        """
+        domain = self.manager.get_vm_by_name(vm_name)
+        if domain is None:
+            return []
+
+        jobs = []
+        for path in self.vm_images(domain):
+            job = self.compact_image(path, domain, rate_limit)
+            if job:
+                jobs.append(job)
+        return jobs
+
+    def compact_idle(self, idle_hours: Optional[float] = None) -> List[DiskJob]:
+        """
+        Compact disks of stopped VMs that changed since their last
+        compaction but have not been written for a while
+
+        Args:
+            idle_hours: Minimum time since the image was last written
+
+        Returns:
+            List of started jobs
+        """
+        idle_hours = config.COMPACTION_IDLE_HOURS if idle_hours is None else idle_hours
+        cutoff = time.time() - idle_hours * 3600
+        state = self._load_state()
+
+        jobs = []
+        for domain in self.manager.list_all_vms():
+            try:
+                if domain.isActive():
+                    continue
+                for path in self.vm_images(domain):
+                    stat = os.stat(path)
+                    if stat.st_mtime > cutoff or state.get(path) == stat.st_mtime_ns:
+                        continue
+                    job = self.compact_image(path, domain)
+                    if job:
+                        jobs.append(job)
+            except (libvirt.libvirtError, OSError) as e:
+                logger.warning(f"Skipping compaction check: {e}")
+        return jobs
+
+
+class CompactionScheduler:
+    """Periodically compacts idle VMs on a background thread"""
+
+    def __init__(self, compactor: DiskCompactor, interval_hours: Optional[float] = None):
+        """
+        Args:
+            compactor: DiskCompactor to run
+            interval_hours: Time between idle checks
+        """
+        self.compactor = compactor
+        self.interval = (interval_hours or config.COMPACTION_INTERVAL_HOURS) * 3600
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start checking (first check after one interval)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._loop, daemon=True, name="compaction-scheduler"
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop checking; running jobs continue"""
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            jobs = self.compactor.compact_idle()
+            if jobs:
+                logger.info(f"Scheduled compaction started for {len(jobs)} image(s)")
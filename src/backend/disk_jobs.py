@@ -0,0 +1,504 @@
+"""
+Disk Job Engine - Background qemu-img create/convert/resize/rebase jobs
+
+Jobs run on worker threads, report progress, throughput and ETA to
+listeners, can be cancelled, and are limited per storage device so bulk
+provisioning does not saturate a single SSD. Listeners are called from
+worker threads; UI code should forward them through Qt signals.
+"""
+
+import itertools
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from backend.disk_metadata import disk_metadata
+from backend.disk_profiles import DiskProfile, get_disk_profile
+from utils.logger import logger
+import config
+
+
+class JobState:
+    """Disk job state constants"""
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+    FINAL = {SUCCEEDED, FAILED, CANCELLED}
+
+
+# qemu-img -p prints "    (12.34/100%)" and rewrites the line with \r
+PROGRESS_PATTERN = re.compile(r'\((\d+(?:\.\d+)?)/100%\)')
+
+# Smoothing factor for the throughput estimate
+RATE_SMOOTHING = 0.3
+
+
+class DiskJob:
+    """A single background disk operation"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, kind: str, path: str, description: str, bytes_total: int = 0):
+        self.job_id = next(self._ids)
+        self.kind = kind
+        self.path = path
+        self.description = description
+        self.state = JobState.QUEUED
+        self.progress = 0.0  # percent
+        self.bytes_total = bytes_total
+        self.bytes_done = 0
+        self.rate = 0.0  # bytes/s
+        self.eta: Optional[float] = None  # seconds
+        self.error: Optional[str] = None
+        self.result = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+
+        self._process: Optional[subprocess.Popen] = None
+        self._cancel_event = threading.Event()
+        self._done_event = threading.Event()
+        self._last_sample = None
+
+    @property
+    def is_done(self) -> bool:
+        return self.state in JobState.FINAL
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        """Request cancellation; a running qemu-img process is terminated"""
+        self._cancel_event.set()
+        process = self._process
+        if process and process.poll() is None:
+            process.terminate()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the job to finish
+
+        Returns:
+            bool: True if the job succeeded
+        """
+        self._done_event.wait(timeout)
+        return self.state == JobState.SUCCEEDED
+
+    def update_progress(self, percent: Optional[float] = None, bytes_done: Optional[int] = None):
+        """Update progress and derive throughput and ETA"""
+        if bytes_done is None and percent is not None and self.bytes_total:
+            bytes_done = int(self.bytes_total * percent / 100)
+        if percent is None and bytes_done is not None and self.bytes_total:
+            percent = min(100.0, bytes_done * 100 / self.bytes_total)
+
+        if percent is not None:
+            self.progress = percent
+        if bytes_done is None:
+            return
+
+        now = time.monotonic()
+        if self._last_sample is not None:
+            last_time, last_bytes = self._last_sample
+            elapsed = now - last_time
+            if elapsed > 0:
+                instant = max(0.0, (bytes_done - last_bytes) / elapsed)
+                self.rate = instant if self.rate == 0 else (
+                    RATE_SMOOTHING * instant + (1 - RATE_SMOOTHING) * self.rate
+                )
+        self._last_sample = (now, bytes_done)
+        self.bytes_done = bytes_done
+
+        if self.rate > 0 and self.bytes_total:
+            self.eta = max(0.0, (self.bytes_total - bytes_done) / self.rate)
+
+    def to_dict(self) -> Dict:
+        """Get a JSON-serializable summary"""
+        return {
+            'id': self.job_id,
+            'kind': self.kind,
+            'path': self.path,
+            'state': self.state,
+            'progress': round(self.progress, 2),
+            'bytes_total': self.bytes_total,
+            'bytes_done': self.bytes_done,
+            'rate': self.rate,
+            'eta': self.eta,
+            'error': self.error
+        }
+
+
+def _device_of(path: str) -> int:
+    """Get the st_dev of a path or its nearest existing parent"""
+    current = Path(path).resolve()
+    while not current.exists() and current != current.parent:
+        current = current.parent
+    return os.stat(current).st_dev
+
+
+def _virtual_size(path: str) -> int:
+    """Get an image's virtual size in bytes (0 if unknown)"""
+    metadata = disk_metadata.get(path)
+    return metadata.virtual_size if metadata else 0
+
+
+class DiskJobEngine:
+    """Runs disk jobs in the background with a per-device concurrency cap"""
+
+    def __init__(self, max_jobs_per_device: int = None):
+        """
+        Args:
+            max_jobs_per_device: Concurrent jobs allowed per storage device
+        """
+        self.max_jobs_per_device = max_jobs_per_device or config.DISK_JOBS_PER_DEVICE
+        self._lock = threading.Lock()
+        self._device_slots: Dict[int, threading.Semaphore] = {}
+        self._jobs: Dict[int, DiskJob] = {}
+        self._listeners: List[Callable[[DiskJob], None]] = []
+
+    # ------------------------------------------------------------------
+    # Listeners and bookkeeping
+    # ------------------------------------------------------------------
+
+    def add_listener(self, callback: Callable[[DiskJob], None]):
+        """Register a callback invoked on every job state/progress change"""
+        with self._lock:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[DiskJob], None]):
+        with self._lock:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def _notify(self, job: DiskJob):
+        with self._lock:
+            listeners = list(self._listeners)
+        for callback in listeners:
+            try:
+                callback(job)
+            except Exception as e:
+                logger.debug(f"Disk job listener failed: {e}")
+
+    def jobs(self) -> List[DiskJob]:
+        """Get running and recently finished jobs, oldest first"""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def get(self, job_id: int) -> Optional[DiskJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _slot_for(self, path: str) -> threading.Semaphore:
+        device = _device_of(path)
+        with self._lock:
+            if device not in self._device_slots:
+                self._device_slots[device] = threading.Semaphore(self.max_jobs_per_device)
+            return self._device_slots[device]
+
+    # ------------------------------------------------------------------
+    # Submission
+    # ------------------------------------------------------------------
+
+    def submit_task(
+        self,
+        kind: str,
+        path: str,
+        task: Callable[[DiskJob], object],
+        description: str = None,
+        bytes_total: int = 0,
+        cleanup: Optional[Callable[[], None]] = None
+    ) -> DiskJob:
+        """
+        Run a Python callable as a disk job
+
+        Args:
+            kind: Job type label
+            path: Path whose storage device the job occupies
+            task: Callable receiving the job; its return value becomes job.result.
+                  It should call job.update_progress() and honour job.cancelled.
+            description: Human readable description
+            bytes_total: Expected amount of data for rate/ETA reporting
+            cleanup: Called if the job fails or is cancelled
+
+        Returns:
+            DiskJob handle
+        """
+        job = DiskJob(kind, path, description or f"{kind} {path}", bytes_total)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            # Forget the oldest finished jobs; running ones are always kept
+            finished = [job_id for job_id, other in self._jobs.items() if other.is_done]
+            for job_id in finished[:max(0, len(finished) - config.DISK_JOB_HISTORY)]:
+                del self._jobs[job_id]
+
+        thread = threading.Thread(
+            target=self._run, args=(job, task, cleanup), daemon=True,
+            name=f"disk-job-{job.job_id}"
+        )
+        thread.start()
+        self._notify(job)
+        return job
+
+    def _run(self, job: DiskJob, task, cleanup):
+        try:
+            slot = self._slot_for(job.path)
+        except OSError as e:
+            # e.g. a directory on the way cannot be stat'ed
+            job.error = f"Cannot access {job.path}: {e}"
+            job.state = JobState.FAILED
+            slot = None
+
+        if slot is not None:
+            with slot:
+                if job.cancelled:
+                    job.state = JobState.CANCELLED
+                else:
+                    job.state = JobState.RUNNING
+                    job.started = time.time()
+                    self._notify(job)
+                    logger.info(f"Disk job {job.job_id} started: {job.description}")
+                    try:
+                        job.result = task(job)
+                        if job.cancelled:
+                            job.state = JobState.CANCELLED
+                        else:
+                            if job.progress < 100:
+                                job.update_progress(100.0, job.bytes_total or None)
+                            job.state = JobState.SUCCEEDED
+                    except Exception as e:
+                        job.error = str(e)
+                        job.state = JobState.CANCELLED if job.cancelled else JobState.FAILED
+
+        if job.state != JobState.SUCCEEDED and cleanup:
+            try:
+                cleanup()
+            except Exception as e:
+                logger.debug(f"Disk job cleanup failed: {e}")
+
+        job.finished = time.time()
+        job.eta = 0.0 if job.state == JobState.SUCCEEDED else None
+        if job.state == JobState.FAILED:
+            logger.error(f"Disk job {job.job_id} failed: {job.error}")
+        else:
+            logger.info(f"Disk job {job.job_id} {job.state}: {job.description}")
+        job._done_event.set()
+        self._notify(job)
+
+    def _run_qemu_img(self, job: DiskJob, cmd: List[str], poll_path: Optional[str] = None):
+        """
+        Run a qemu-img command for a job, tracking progress
+
+        Progress comes from `-p` output when present, otherwise from the
+        allocated size of poll_path (for preallocating creates).
+        """
+        if job.cancelled:
+            return None
+
+        logger.debug(f"Running: {' '.join(cmd)}")
+        # stderr goes to a file: a pipe nobody reads until stdout closes
+        # would block qemu-img once it filled up
+        stderr_file = tempfile.TemporaryFile()
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=stderr_file
+        )
+        job._process = process
+
+        poller = None
+        if poll_path:
+            def poll_allocation():
+                while process.poll() is None:
+                    try:
+                        allocated = os.stat(poll_path).st_blocks * 512
+                        job.update_progress(bytes_done=min(allocated, job.bytes_total))
+                        self._notify(job)
+                    except FileNotFoundError:
+                        pass
+                    time.sleep(0.5)
+
+            poller = threading.Thread(target=poll_allocation, daemon=True)
+            poller.start()
+
+        buffer = ''
+        while True:
+            # os.read returns as soon as qemu-img flushes a progress update
+            chunk = os.read(process.stdout.fileno(), 256)
+            if not chunk:
+                break
+            buffer += chunk.decode(errors='replace')
+            *lines, buffer = re.split(r'[\r\n]', buffer)
+            for line in lines:
+                match = PROGRESS_PATTERN.search(line)
+                if match:
+                    job.update_progress(float(match.group(1)))
+                    self._notify(job)
+
+        process.wait()
+        stderr_file.seek(0)
+        stderr = stderr_file.read().decode(errors='replace')
+        stderr_file.close()
+        if poller:
+            poller.join()
+        job._process = None
+
+        if job.cancelled:
+            return None
+        if process.returncode != 0:
+            raise RuntimeError(stderr.strip() or f"qemu-img exited with {process.returncode}")
+        return True
+
+    def submit_create(
+        self,
+        path: str,
+        size_gb: int,
+        format: str = 'qcow2',
+        profile: Optional[DiskProfile] = None
+    ) -> DiskJob:
+        """Create a disk image in the background"""
+        profile = profile or get_disk_profile(None)
+        cmd = ['qemu-img', 'create', '-f', format]
+        options = profile.create_options(format)
+        if options:
+            cmd += ['-o', ','.join(options)]
+        cmd += [path, f'{size_gb}G']
+
+        size_bytes = size_gb * 1024 ** 3
+        preallocates = profile.preallocation in ('falloc', 'full')
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        return self.submit_task(
+            'create', path,
+            lambda job: self._run_qemu_img(job, cmd, poll_path=path if preallocates else None),
+            description=f"Create {Path(path).name} ({size_gb}GB, {profile.name})",
+            bytes_total=size_bytes,
+            cleanup=lambda: Path(path).unlink(missing_ok=True)
+        )
+
+    def submit_convert(
+        self,
+        source: str,
+        destination: str,
+        out_format: str = 'qcow2',
+        source_format: Optional[str] = None,
+        options: Optional[List[str]] = None,
+        backing: Optional[str] = None,
+        backing_format: Optional[str] = None,
+        rate_limit: Optional[int] = None,
+        extra_args: Optional[List[str]] = None,
+        on_success: Optional[Callable[[DiskJob], object]] = None,
+        kind: str = 'convert',
+        description: Optional[str] = None
+    ) -> DiskJob:
+        """
+        Convert/copy an image in the background
+
+        Args:
+            source: Source image
+            destination: Output image (removed if the job fails)
+            out_format: Output format
+            source_format: Source format (probed if omitted)
+            options: `-o` creation options
+            backing: Keep this backing file for the output (`-B`)
+            backing_format: Format of the backing file
+            rate_limit: Throttle in bytes/s (`-r`)
+            extra_args: Additional qemu-img convert arguments
+            on_success: Called with the job after qemu-img succeeds; its
+                        return value becomes job.result
+            kind: Job type label
+            description: Human readable description
+        """
+        cmd = ['qemu-img', 'convert', '-p', '-U', '-O', out_format]
+        if source_format:
+            cmd += ['-f', source_format]
+        if options:
+            cmd += ['-o', ','.join(options)]
+        if backing:
+            cmd += ['-B', backing]
+            if backing_format:
+                cmd += ['-F', backing_format]
+        if rate_limit:
+            cmd += ['-r', str(rate_limit)]
+        cmd += (extra_args or []) + [source, destination]
+
+        def task(job: DiskJob):
+            job.bytes_total = _virtual_size(source)
+            if not self._run_qemu_img(job, cmd):
+                return None
+            return on_success(job) if on_success else True
+
+        return self.submit_task(
+            kind, destination, task,
+            description=description or f"Convert {Path(source).name} -> {Path(destination).name}",
+            cleanup=lambda: Path(destination).unlink(missing_ok=True)
+        )
+
+    def submit_resize(self, path: str, new_size_gb: int) -> DiskJob:
+        """Resize an image in the background"""
+        cmd = ['qemu-img', 'resize', path, f'{new_size_gb}G']
+        return self.submit_task(
+            'resize', path, lambda job: self._run_qemu_img(job, cmd),
+            description=f"Resize {Path(path).name} to {new_size_gb}GB"
+        )
+
+    def submit_rebase(
+        self,
+        path: str,
+        backing: str = '',
+        backing_format: Optional[str] = None
+    ) -> DiskJob:
+        """
+        Rebase an overlay in the background
+
+        An empty backing path flattens the overlay (copies in all data
+        from its backing chain).
+        """
+        cmd = ['qemu-img', 'rebase', '-p', '-f', 'qcow2', '-b', backing]
+        if backing and backing_format:
+            cmd += ['-F', backing_format]
+        cmd.append(path)
+
+        def task(job: DiskJob):
+            job.bytes_total = _virtual_size(path)
+            return self._run_qemu_img(job, cmd)
+
+        target = Path(backing).name if backing else "no backing file"
+        return self.submit_task(
+            'rebase', path, task,
+            description=f"Rebase {Path(path).name} onto {target}"
+        )
+
+    def submit_commit(
+        self,
+        path: str,
+        on_success: Optional[Callable[[DiskJob], object]] = None
+    ) -> DiskJob:
+        """
+        Merge an overlay into its backing file in the background
+
+        The backing file is modified in place; the overlay is left empty.
+        Nothing may be using either image.
+        """
+        cmd = ['qemu-img', 'commit', '-p', path]
+
+        def task(job: DiskJob):
+            job.bytes_total = _virtual_size(path)
+            if not self._run_qemu_img(job, cmd):
+                return None
+            return on_success(job) if on_success else True
+
+        return self.submit_task(
+            'commit', path, task,
+            description=f"Commit {Path(path).name} into its backing file"
+        )
+
+
+# Shared engine
+disk_jobs = DiskJobEngine()
@@ -5,7 +5,11 @@ Disk Manager - Handles VM disk creation with proper permissions
 import os
 import subprocess
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional
+
+from backend.disk_jobs import DiskJob, disk_jobs
+from backend.disk_metadata import DiskMetadata, disk_metadata
+from backend.disk_profiles import DiskProfile, get_disk_profile
 from utils.logger import logger
 
 
@@ -53,7 +57,8 @@ class DiskManager:
         self,
         path: str,
         size_gb: int,
-        format: str = 'qcow2'
+        format: str = 'qcow2',
+        profile: Optional[DiskProfile] = None
     ) -> bool:
         """
         Create a disk image
@@ -62,6 +67,7 @@ class DiskManager:
             path: Full path to disk image
             size_gb: Size in GB
             format: Disk format (qcow2, raw, etc.)
+            profile: Performance profile (preallocation, cluster size, ...)
             
         Returns:
             bool: Success status
@@ -79,21 +85,23 @@ class DiskManager:
             logger.warning(f"Disk already exists: {path}")
             return False
         
-        logger.info(f"Creating {format} disk: {path} ({size_gb}GB)")
+        profile = profile or get_disk_profile(None)
+        logger.info(f"Creating {format} disk: {path} ({size_gb}GB, profile '{profile.name}')")
         
         try:
-            cmd = [
-                'qemu-img', 'create',
-                '-f', format,
-                path,
-                f'{size_gb}G'
-            ]
+            cmd = ['qemu-img', 'create', '-f', format]
+            options = profile.create_options(format)
+            if options:
+                cmd += ['-o', ','.join(options)]
+            cmd += [path, f'{size_gb}G']
             
+            # Writing every block of a large image takes far longer than 30s
+            timeout = None if profile.preallocation == 'full' else 30
             result = subprocess.run(
                 cmd,
                 capture_output=True,
                 text=True,
-                timeout=30
+                timeout=timeout
             )
             
             if result.returncode == 0:
@@ -110,31 +118,125 @@ class DiskManager:
             logger.error(f"Failed to create disk: {e}")
             return False
     
-    def get_disk_info(self, path: str) -> Optional[dict]:
+    def create_overlay(
+        self,
+        path: str,
+        backing_path: str,
+        backing_format: str = 'qcow2'
+    ) -> bool:
         """
-        Get disk image information
+        Create a qcow2 overlay (linked clone) on top of a backing image
+        
+        Only metadata is written, so this completes in milliseconds
+        regardless of the backing image size.
         
         Args:
-            path: Path to disk image
+            path: Full path to the new overlay image
+            backing_path: Read-only base image
+            backing_format: Format of the base image
             
         Returns:
-            Dictionary with disk info or None
+            bool: Success status
         """
+        disk_path = Path(path)
+        disk_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        if disk_path.exists():
+            logger.warning(f"Disk already exists: {path}")
+            return False
+        
         try:
             result = subprocess.run(
-                ['qemu-img', 'info', '--output=json', path],
+                [
+                    'qemu-img', 'create',
+                    '-f', 'qcow2',
+                    '-b', str(Path(backing_path).resolve()),
+                    '-F', backing_format,
+                    path
+                ],
                 capture_output=True,
                 text=True,
-                timeout=10
+                timeout=30
             )
             
             if result.returncode == 0:
-                import json
-                return json.loads(result.stdout)
+                logger.info(f"Overlay created: {path} -> {backing_path}")
+                return True
+            logger.error(f"qemu-img failed: {result.stderr}")
         except Exception as e:
-            logger.error(f"Failed to get disk info: {e}")
+            logger.error(f"Failed to create overlay: {e}")
+        
+        return False
+    
+    def create_disk_image_async(
+        self,
+        path: str,
+        size_gb: int,
+        format: str = 'qcow2',
+        profile: Optional[DiskProfile] = None
+    ) -> Optional[DiskJob]:
+        """
+        Create a disk image as a background job
         
-        return None
+        Use this for preallocated or very large images, which can take
+        minutes to write.
+        
+        Returns:
+            DiskJob handle, or None if the image already exists
+        """
+        if Path(path).exists():
+            logger.warning(f"Disk already exists: {path}")
+            return None
+        return disk_jobs.submit_create(path, size_gb, format, profile)
+    
+    def resize_disk_async(self, path: str, new_size_gb: int) -> DiskJob:
+        """Resize an existing disk image as a background job"""
+        return disk_jobs.submit_resize(path, new_size_gb)
+    
+    def flatten_disk(self, path: str) -> DiskJob:
+        """
+        Detach an overlay from its backing image in the background
+        
+        Copies all data the overlay reads from its backing chain into the
+        overlay itself ("qemu-img rebase -b ''"), after which the base
+        image is no longer needed. The VM must not be running.
+        
+        Args:
+            path: Overlay image path
+            
+        Returns:
+            DiskJob handle
+        """
+        return disk_jobs.submit_rebase(path, '')
+    
+    def get_disk_info(self, path: str) -> Optional[dict]:
+        """
+        Get disk image information
+        
+        Args:
+            path: Path to disk image
+            
+        Returns:
+            Dictionary with disk info (qemu-img info JSON) or None
+        """
+        metadata = disk_metadata.get(path)
+        return dict(metadata.raw) if metadata else None
+    
+    def get_disk_metadata(self, path: str) -> Optional[DiskMetadata]:
+        """Get parsed size, format and backing chain for a disk image"""
+        return disk_metadata.get(path)
+    
+    def scan_storage(self, directory: Optional[str] = None) -> Dict[str, DiskMetadata]:
+        """
+        Get metadata for every image in a storage directory
+        
+        Args:
+            directory: Directory to scan (default: VM disk directory)
+            
+        Returns:
+            Map of image path to metadata
+        """
+        return disk_metadata.scan_directory(directory or self.default_disk_dir)
     
     def resize_disk(self, path: str, new_size_gb: int) -> bool:
         """Resize an existing disk image"""
@@ -157,6 +259,7 @@ class DiskManager:
             disk_path = Path(path)
             if disk_path.exists():
                 disk_path.unlink()
+                disk_metadata.invalidate(path)
                 logger.info(f"Deleted disk: {path}")
                 return True
         except Exception as e:
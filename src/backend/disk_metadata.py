@@ -0,0 +1,178 @@
+"""
+Disk image metadata cache - parsed `qemu-img info` keyed by file identity
+
+Entries are keyed by path and validated against the inode, mtime and size
+of every image in the backing chain, so repeated lookups cost a few stat()
+calls instead of a qemu-img subprocess. Probes use -U (force-share) so
+images held open by a running QEMU can still be inspected.
+"""
+
+import json
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.logger import logger
+
+
+IMAGE_PATTERNS = ("*.qcow2", "*.img", "*.raw")
+
+# File identity: (st_ino, st_mtime_ns, st_size)
+FileKey = Tuple[int, int, int]
+
+
+@dataclass(frozen=True)
+class DiskMetadata:
+    """Parsed image information"""
+    path: str
+    format: str
+    virtual_size: int  # bytes
+    actual_size: int  # bytes allocated on the host
+    backing_chain: Tuple[str, ...]  # backing files, nearest first
+    raw: dict  # top image's qemu-img info JSON
+
+    @property
+    def backing_file(self) -> Optional[str]:
+        return self.backing_chain[0] if self.backing_chain else None
+
+
+def _file_key(path: str) -> Optional[FileKey]:
+    try:
+        st = os.stat(path)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+class DiskMetadataCache:
+    """Thread-safe cache of qemu-img info results"""
+
+    def __init__(self, max_workers: int = 8):
+        """
+        Args:
+            max_workers: Parallel qemu-img probes when scanning directories
+        """
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        # realpath -> (keys of every image in the chain, metadata)
+        self._entries: Dict[str, Tuple[Tuple[Tuple[str, FileKey], ...], DiskMetadata]] = {}
+
+    def get(self, path: str) -> Optional[DiskMetadata]:
+        """
+        Get metadata for an image, probing only if it changed
+
+        Args:
+            path: Image path
+
+        Returns:
+            DiskMetadata or None if the image cannot be read
+        """
+        real = os.path.realpath(path)
+        with self._lock:
+            entry = self._entries.get(real)
+        if entry is not None:
+            keys, metadata = entry
+            if all(_file_key(p) == key for p, key in keys):
+                return metadata
+
+        return self._probe(real)
+
+    def invalidate(self, path: Optional[str] = None):
+        """Drop one cached entry, or all of them"""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.realpath(path), None)
+
+    def _probe(self, path: str) -> Optional[DiskMetadata]:
+        """Run qemu-img info on an image and its backing chain"""
+        key = _file_key(path)
+        if key is None:
+            return None
+
+        try:
+            result = subprocess.run(
+                ['qemu-img', 'info', '-U', '--backing-chain', '--output=json', path],
+                capture_output=True,
+                text=True,
+                timeout=10
+            )
+            if result.returncode != 0:
+                logger.warning(f"qemu-img info failed for {path}: {result.stderr.strip()}")
+                return None
+            chain = json.loads(result.stdout)
+        except Exception as e:
+            logger.error(f"Failed to get disk info: {e}")
+            return None
+
+        # --backing-chain returns a list (top image first)
+        if isinstance(chain, dict):
+            chain = [chain]
+        top = chain[0]
+
+        backing = []
+        for info in chain[1:]:
+            filename = info.get('filename')
+            if filename:
+                backing.append(os.path.realpath(filename))
+
+        metadata = DiskMetadata(
+            path=path,
+            format=top.get('format', 'raw'),
+            virtual_size=int(top.get('virtual-size', 0)),
+            actual_size=int(top.get('actual-size', 0)),
+            backing_chain=tuple(backing),
+            raw=top
+        )
+
+        keys = [(path, key)]
+        for backing_path in backing:
+            backing_key = _file_key(backing_path)
+            if backing_key is not None:
+                keys.append((backing_path, backing_key))
+
+        with self._lock:
+            self._entries[path] = (tuple(keys), metadata)
+        return metadata
+
+    def get_many(self, paths: Iterable[str]) -> Dict[str, DiskMetadata]:
+        """
+        Get metadata for many images, probing changed ones in parallel
+
+        Returns:
+            Map of path to metadata (unreadable images are omitted)
+        """
+        paths = list(paths)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = executor.map(self.get, paths)
+        return {path: metadata for path, metadata in zip(paths, results) if metadata}
+
+    def scan_directory(
+        self,
+        directory,
+        patterns: Iterable[str] = IMAGE_PATTERNS
+    ) -> Dict[str, DiskMetadata]:
+        """
+        Enumerate all images in a storage directory
+
+        Args:
+            directory: Directory to scan (not recursive)
+            patterns: Glob patterns for image files
+
+        Returns:
+            Map of path to metadata
+        """
+        directory = Path(directory)
+        paths: List[str] = []
+        for pattern in patterns:
+            paths.extend(str(p) for p in directory.glob(pattern) if p.is_file())
+        return self.get_many(sorted(set(paths)))
+
+
+# Shared cache
+disk_metadata = DiskMetadataCache()
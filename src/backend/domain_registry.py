@@ -0,0 +1,285 @@
+"""
+Domain registry - Cached domain handles, parsed XML and derived facts
+
+Looking a domain up, fetching its XML description and parsing it costs
+an RPC plus a parse of a multi-KB document, and UI actions used to do all
+of it on every click. The registry keeps, per domain UUID:
+
+- the virDomain handle (and a name -> UUID index),
+- the parsed DomainDocument of the live and the persistent definition,
+- DomainFacts derived from each (hostdevs, graphics, disk paths, NVRAM).
+
+Entries are dropped when libvirt reports a lifecycle event (define,
+undefine, start, stop, ...) or a device hot(un)plug for the domain, and
+all of them when the connection is reopened, since events may have been
+missed meanwhile. Where domain events are not available the registry
+caches nothing and every call goes to libvirt, so it is never stale.
+
+Cached documents are shared and must not be patched; use edit() instead.
+"""
+
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import libvirt
+
+from backend.domain_xml import AutostartPolicy, DomainDocument, Hostdev, MemoryBacking, XML_INACTIVE, edit_domain
+from utils.logger import logger
+from utils import metrics
+
+
+DOMAIN_CACHE = metrics.counter(
+    'virtflow_domain_cache_total', "Domain registry lookups", ['kind', 'result']
+)
+_DOCUMENT_HITS = DOMAIN_CACHE.labels('document', 'hit')
+_DOCUMENT_MISSES = DOMAIN_CACHE.labels('document', 'miss')
+_HANDLE_HITS = DOMAIN_CACHE.labels('handle', 'hit')
+_HANDLE_MISSES = DOMAIN_CACHE.labels('handle', 'miss')
+
+# Events after which a domain's cached XML no longer matches libvirt
+INVALIDATING_EVENTS = (
+    libvirt.VIR_DOMAIN_EVENT_ID_LIFECYCLE,
+    libvirt.VIR_DOMAIN_EVENT_ID_DEVICE_ADDED,
+    libvirt.VIR_DOMAIN_EVENT_ID_DEVICE_REMOVED,
+    libvirt.VIR_DOMAIN_EVENT_ID_METADATA_CHANGE,
+)
+
+
+@dataclass(frozen=True)
+class DomainFacts:
+    """What VirtFlow needs to know about a definition, without its XML"""
+    uuid: str
+    name: str
+    hostdevs: Tuple[Hostdev, ...]
+    graphics_types: Tuple[str, ...]
+    disk_paths: Tuple[str, ...]  # sources of disk (not CD-ROM) devices
+    source_paths: Tuple[str, ...]  # sources of all disk and CD-ROM devices
+    nvram_path: Optional[str]
+    memory_kib: int
+    memory_backing: MemoryBacking
+    autostart: Optional[AutostartPolicy]
+
+    @property
+    def has_pci_hostdev(self) -> bool:
+        return bool(self.hostdevs)
+
+    @property
+    def graphics_type(self) -> Optional[str]:
+        """Type of the first display ('spice', 'vnc'), None if headless"""
+        return self.graphics_types[0] if self.graphics_types else None
+
+    @classmethod
+    def from_document(cls, document: DomainDocument) -> 'DomainFacts':
+        disks = document.disks()
+        return cls(
+            uuid=document.uuid,
+            name=document.name,
+            hostdevs=tuple(document.hostdevs()),
+            graphics_types=tuple(graphics.type for graphics in document.graphics()),
+            disk_paths=tuple(d.source for d in disks if d.device == 'disk' and d.source),
+            source_paths=tuple(d.source for d in disks if d.source),
+            nvram_path=document.nvram_path(),
+            memory_kib=document.memory_kib(),
+            memory_backing=document.memory_backing(),
+            autostart=document.autostart_policy(),
+        )
+
+
+class _Entry:
+    __slots__ = ('domain', 'documents', 'facts')
+
+    def __init__(self, domain: Optional[libvirt.virDomain] = None):
+        self.domain = domain
+        self.documents: Dict[int, DomainDocument] = {}  # XMLDesc flags -> document
+        self.facts: Dict[int, DomainFacts] = {}
+
+
+class DomainRegistry:
+    """Per-connection cache of domain handles and parsed definitions"""
+
+    def __init__(self, manager):
+        """
+        Args:
+            manager: LibvirtManager whose connection is cached
+        """
+        self.manager = manager
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _Entry] = {}
+        self._names: Dict[str, str] = {}  # name -> UUID
+        self._epoch = 0  # bumped by every invalidation
+        self._events_conn: Optional[libvirt.virConnect] = None
+        self._callback_ids: List[int] = []
+        manager.connections.add_connect_callback(self._on_connect)
+
+    @property
+    def watching(self) -> bool:
+        """True if domain events keep the cache up to date"""
+        return bool(self._callback_ids)
+
+    # ------------------------------------------------------------------
+    # Events
+    # ------------------------------------------------------------------
+
+    def _on_connect(self, conn: libvirt.virConnect):
+        """Register for domain events on a (re)opened connection"""
+        self.invalidate()
+        callback_ids = []
+        try:
+            for event in INVALIDATING_EVENTS:
+                callback_ids.append(conn.domainEventRegisterAny(None, event, self._on_event, None))
+        except libvirt.libvirtError as e:
+            logger.debug(f"Domain events not available, XML will not be cached: {e}")
+            self._deregister(conn, callback_ids)
+            callback_ids = []
+        with self._lock:
+            self._events_conn = conn
+            self._callback_ids = callback_ids
+
+    def _on_event(self, conn, domain, *args):
+        """Any invalidating event; runs on the libvirt event loop thread"""
+        self.invalidate(domain.UUIDString())
+
+    @staticmethod
+    def _deregister(conn: libvirt.virConnect, callback_ids: List[int]):
+        for callback_id in callback_ids:
+            try:
+                conn.domainEventDeregisterAny(callback_id)
+            except libvirt.libvirtError:
+                pass
+
+    def close(self):
+        """Stop listening for events and drop the cache"""
+        self.manager.connections.remove_connect_callback(self._on_connect)
+        with self._lock:
+            conn, callback_ids = self._events_conn, self._callback_ids
+            self._events_conn, self._callback_ids = None, []
+        if conn is not None:
+            self._deregister(conn, callback_ids)
+        self.invalidate()
+
+    def invalidate(self, uuid: Optional[str] = None):
+        """Forget one domain, or everything"""
+        with self._lock:
+            self._epoch += 1
+            if uuid is None:
+                self._entries.clear()
+                self._names.clear()
+                return
+            self._entries.pop(uuid, None)
+            for name, cached in list(self._names.items()):
+                if cached == uuid:
+                    del self._names[name]
+
+    # ------------------------------------------------------------------
+    # Handles
+    # ------------------------------------------------------------------
+
+    def _remember(self, domain: libvirt.virDomain, epoch: int) -> Optional[_Entry]:
+        """Cache a handle unless an event invalidated things since epoch"""
+        if not self.watching:
+            return None
+        uuid = domain.UUIDString()
+        with self._lock:
+            if epoch != self._epoch:
+                return None
+            entry = self._entries.get(uuid)
+            if entry is None:
+                self._entries[uuid] = entry = _Entry()
+            entry.domain = domain
+            self._names[domain.name()] = uuid
+        return entry
+
+    def domain(self, uuid: str) -> Optional[libvirt.virDomain]:
+        """Get a domain by UUID (None if it does not exist)"""
+        entry = self._entries.get(uuid)
+        if entry is not None and entry.domain is not None:
+            _HANDLE_HITS.inc()
+            return entry.domain
+        _HANDLE_MISSES.inc()
+        epoch = self._epoch
+        domain = self.manager.get_vm_by_uuid(uuid)
+        if domain is not None:
+            self._remember(domain, epoch)
+        return domain
+
+    def domain_by_name(self, name: str) -> Optional[libvirt.virDomain]:
+        """Get a domain by name (None if it does not exist)"""
+        uuid = self._names.get(name)
+        if uuid is not None:
+            return self.domain(uuid)
+        _HANDLE_MISSES.inc()
+        epoch = self._epoch
+        domain = self.manager.get_vm_by_name(name)
+        if domain is not None:
+            self._remember(domain, epoch)
+        return domain
+
+    # ------------------------------------------------------------------
+    # Definitions
+    # ------------------------------------------------------------------
+
+    def document(self, domain: libvirt.virDomain, flags: int = 0) -> DomainDocument:
+        """
+        Get the parsed XML of a domain (read-only)
+
+        Args:
+            domain: libvirt domain object
+            flags: XMLDesc flags (0 = live definition, XML_INACTIVE = persistent)
+        """
+        uuid = domain.UUIDString()
+        entry = self._entries.get(uuid)
+        document = entry.documents.get(flags) if entry is not None else None
+        if document is not None:
+            _DOCUMENT_HITS.inc()
+            return document
+
+        _DOCUMENT_MISSES.inc()
+        epoch = self._epoch
+        document = DomainDocument.from_domain(domain, flags)
+        entry = self._remember(domain, epoch)
+        if entry is not None:
+            entry.documents[flags] = document
+        return document
+
+    def facts(self, domain: libvirt.virDomain, flags: int = 0) -> DomainFacts:
+        """Get derived facts of a domain's live or persistent definition"""
+        uuid = domain.UUIDString()
+        entry = self._entries.get(uuid)
+        facts = entry.facts.get(flags) if entry is not None else None
+        if facts is not None:
+            return facts
+
+        document = self.document(domain, flags)
+        facts = DomainFacts.from_document(document)
+        with self._lock:
+            entry = self._entries.get(uuid)
+            if entry is not None and entry.documents.get(flags) is document:
+                entry.facts[flags] = facts
+        return facts
+
+    def all_facts(self, flags: int = XML_INACTIVE) -> Dict[str, DomainFacts]:
+        """Facts of every defined domain, by UUID"""
+        result = {}
+        for domain in self.manager.list_all_vms():
+            try:
+                result[domain.UUIDString()] = self.facts(domain, flags)
+            except libvirt.libvirtError as e:
+                # Undefined between listing and fetching
+                logger.debug(f"Skipping domain: {e}")
+        return result
+
+    @contextmanager
+    def edit(self, domain: libvirt.virDomain, flags: int = XML_INACTIVE) -> Iterator[DomainDocument]:
+        """
+        Patch a domain definition (see domain_xml.edit_domain)
+
+        Always starts from freshly fetched XML, and drops the domain's
+        cache entry right away rather than waiting for the define event.
+        """
+        try:
+            with edit_domain(self.manager.connection, domain, flags) as document:
+                yield document
+        finally:
+            self.invalidate(domain.UUIDString())
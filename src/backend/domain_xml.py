@@ -0,0 +1,604 @@
+"""
+Typed libvirt domain XML document model with a minimal-diff patch API
+
+A DomainDocument parses a domain definition once, exposes typed views of the
+parts VirtFlow cares about (devices, hostdevs, graphics, video, audio, CPU
+tuning, memory backing) and applies edits in place so untouched elements are
+serialized back exactly as libvirt produced them.
+"""
+
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from xml.sax.saxutils import escape
+
+from utils.logger import logger
+
+
+# libvirt.VIR_DOMAIN_XML_INACTIVE - edits always target the persistent config
+XML_INACTIVE = 2
+
+# Keep well-known metadata prefixes stable across parse/serialize round trips
+ET.register_namespace('libosinfo', 'http://libosinfo.org/xmlns/libvirt/domain/1.0')
+ET.register_namespace('qemu', 'http://libvirt.org/schemas/domain/qemu/1.0')
+
+# Namespace of VirtFlow's own <metadata> elements
+VIRTFLOW_NS = 'urn:virtflow:domain:1.0'
+ET.register_namespace('virtflow', VIRTFLOW_NS)
+
+
+def xml_text(value) -> str:
+    """Escape a value for use as XML element text"""
+    return escape(str(value))
+
+
+def xml_attr(value) -> str:
+    """Escape a value for use inside a double-quoted XML attribute"""
+    return escape(str(value), {'"': '&quot;'})
+
+
+@dataclass(frozen=True)
+class PCIAddress:
+    """PCI address in domain:bus:slot.function form"""
+    domain: int
+    bus: int
+    slot: int
+    function: int
+
+    @classmethod
+    def parse(cls, address: str) -> 'PCIAddress':
+        """
+        Parse a sysfs style PCI address
+
+        Args:
+            address: Address such as "0000:01:00.0"
+
+        Returns:
+            PCIAddress instance
+        """
+        domain, bus, slot_func = address.split(':')
+        slot, function = slot_func.split('.')
+        return cls(int(domain, 16), int(bus, 16), int(slot, 16), int(function, 16))
+
+    @classmethod
+    def from_element(cls, element: Optional[ET.Element]) -> Optional['PCIAddress']:
+        """Build from a libvirt <address domain=".." bus=".." .../> element"""
+        if element is None:
+            return None
+        try:
+            return cls(
+                int(element.get('domain', '0x0000'), 16),
+                int(element.get('bus', '0x00'), 16),
+                int(element.get('slot', '0x00'), 16),
+                int(element.get('function', '0x0'), 16)
+            )
+        except ValueError:
+            return None
+
+    def to_attributes(self) -> Dict[str, str]:
+        """Get libvirt <address/> attributes"""
+        return {
+            'domain': f"0x{self.domain:04x}",
+            'bus': f"0x{self.bus:02x}",
+            'slot': f"0x{self.slot:02x}",
+            'function': f"0x{self.function:x}"
+        }
+
+    def __str__(self) -> str:
+        return f"{self.domain:04x}:{self.bus:02x}:{self.slot:02x}.{self.function:x}"
+
+
+@dataclass(frozen=True)
+class Hostdev:
+    """PCI hostdev (passthrough) device"""
+    address: PCIAddress
+    managed: bool = True
+
+
+@dataclass(frozen=True)
+class Graphics:
+    """Graphics (display server) device"""
+    type: str
+    port: Optional[str] = None
+    autoport: bool = False
+    listen: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Video:
+    """Video adapter"""
+    model: str
+    primary: bool = False
+
+
+@dataclass(frozen=True)
+class Audio:
+    """Audio backend"""
+    id: Optional[str]
+    type: Optional[str]
+
+
+@dataclass(frozen=True)
+class Disk:
+    """Disk or CD-ROM device"""
+    device: str
+    target: Optional[str]
+    source: Optional[str]
+    driver_type: Optional[str] = None
+    bus: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class AutostartPolicy:
+    """When VirtFlow's autostart scheduler launches a VM"""
+    priority: int = 0  # higher priorities start first
+    delay: float = 0.0  # seconds after the scheduler starts, at the earliest
+
+    def to_xml(self) -> str:
+        """<metadata> element for virDomain.setMetadata()"""
+        return f'<autostart priority="{int(self.priority)}" delay="{float(self.delay):g}"/>'
+
+
+@dataclass
+class CPUTuning:
+    """vCPU and emulator thread pinning"""
+    vcpupin: Dict[int, str] = field(default_factory=dict)
+    emulatorpin: Optional[str] = None
+
+
+@dataclass
+class MemoryBacking:
+    """Guest memory backing options"""
+    hugepages: bool = False
+    page_size_kib: Optional[int] = None
+    locked: bool = False
+    nosharepages: bool = False
+
+
+class DomainDocument:
+    """Parsed libvirt domain definition with typed accessors and patch methods"""
+
+    def __init__(self, xml: str):
+        """
+        Parse domain XML
+
+        Args:
+            xml: libvirt domain XML string
+        """
+        self.root = ET.fromstring(xml)
+        self._dirty = False
+
+    @classmethod
+    def from_domain(cls, domain, flags: int = 0) -> 'DomainDocument':
+        """Fetch and parse a libvirt domain's XML description"""
+        return cls(domain.XMLDesc(flags))
+
+    @property
+    def dirty(self) -> bool:
+        """True if any patch method changed the document"""
+        return self._dirty
+
+    @property
+    def name(self) -> Optional[str]:
+        return self.root.findtext('name')
+
+    @property
+    def uuid(self) -> Optional[str]:
+        return self.root.findtext('uuid')
+
+    @property
+    def devices(self) -> ET.Element:
+        """Get the <devices> element, creating it if missing"""
+        devices = self.root.find('devices')
+        if devices is None:
+            devices = ET.SubElement(self.root, 'devices')
+            self._dirty = True
+        return devices
+
+    def _find_devices(self, tag: str) -> List[ET.Element]:
+        """Find device elements without creating <devices>"""
+        devices = self.root.find('devices')
+        return devices.findall(tag) if devices is not None else []
+
+    def to_xml(self) -> str:
+        """Serialize the document"""
+        return ET.tostring(self.root, encoding='unicode')
+
+    # ------------------------------------------------------------------
+    # Typed views
+    # ------------------------------------------------------------------
+
+    def hostdevs(self) -> List[Hostdev]:
+        """Get PCI hostdev devices"""
+        result = []
+        for hostdev in self._find_devices('hostdev'):
+            if hostdev.get('type') != 'pci':
+                continue
+            address = PCIAddress.from_element(hostdev.find('source/address'))
+            if address is not None:
+                result.append(Hostdev(address, hostdev.get('managed') == 'yes'))
+        return result
+
+    def has_pci_hostdev(self) -> bool:
+        """Check if any PCI device is passed through"""
+        return any(h.get('type') == 'pci' for h in self._find_devices('hostdev'))
+
+    def graphics(self) -> List[Graphics]:
+        """Get graphics devices"""
+        result = []
+        for graphics in self._find_devices('graphics'):
+            listen = graphics.get('listen')
+            if listen is None:
+                listen_el = graphics.find('listen')
+                if listen_el is not None:
+                    listen = listen_el.get('address')
+            result.append(Graphics(
+                type=graphics.get('type'),
+                port=graphics.get('port'),
+                autoport=graphics.get('autoport') == 'yes',
+                listen=listen
+            ))
+        return result
+
+    def video(self) -> List[Video]:
+        """Get video adapters"""
+        result = []
+        for video in self._find_devices('video'):
+            model = video.find('model')
+            if model is not None:
+                result.append(Video(model.get('type'), model.get('primary') == 'yes'))
+        return result
+
+    def audio(self) -> List[Audio]:
+        """Get audio backends"""
+        return [Audio(a.get('id'), a.get('type')) for a in self._find_devices('audio')]
+
+    def disks(self) -> List[Disk]:
+        """Get disk and CD-ROM devices"""
+        result = []
+        for disk in self._find_devices('disk'):
+            source = disk.find('source')
+            target = disk.find('target')
+            driver = disk.find('driver')
+            source_path = None
+            if source is not None:
+                source_path = source.get('file') or source.get('dev') or source.get('volume')
+            result.append(Disk(
+                device=disk.get('device', 'disk'),
+                target=target.get('dev') if target is not None else None,
+                source=source_path,
+                driver_type=driver.get('type') if driver is not None else None,
+                bus=target.get('bus') if target is not None else None
+            ))
+        return result
+
+    def memory_kib(self) -> int:
+        """Get the maximum guest memory (<memory>) in KiB"""
+        return self._memory_element('memory')
+
+    def current_memory_kib(self) -> int:
+        """Get the boot-time guest memory (<currentMemory>) in KiB"""
+        return self._memory_element('currentMemory') or self.memory_kib()
+
+    def _memory_element(self, tag: str) -> int:
+        element = self.root.find(tag)
+        if element is None or not (element.text or '').strip():
+            return 0
+        return _to_kib(int(element.text.strip()), element.get('unit', 'KiB'))
+
+    def autostart_policy(self) -> Optional[AutostartPolicy]:
+        """Get VirtFlow's autostart policy, None if the VM is not autostarted"""
+        element = self.root.find(f'metadata/{{{VIRTFLOW_NS}}}autostart')
+        if element is None:
+            return None
+        try:
+            return AutostartPolicy(int(element.get('priority', 0)), float(element.get('delay', 0)))
+        except ValueError:
+            logger.warning(f"Ignoring malformed autostart policy of '{self.name}'")
+            return AutostartPolicy()
+
+    def nvram_path(self) -> Optional[str]:
+        """Get the NVRAM vars file path, if any"""
+        nvram = self.root.find('os/nvram')
+        return nvram.text.strip() if nvram is not None and nvram.text else None
+
+    def has_emulated_tpm(self) -> bool:
+        """Check for a swtpm-backed TPM"""
+        return any(
+            backend.get('type') == 'emulator'
+            for backend in self.root.findall('devices/tpm/backend')
+        )
+
+    def tpm_state_path(self) -> Optional[str]:
+        """Get an explicitly configured swtpm state location, if any"""
+        source = self.root.find('devices/tpm/backend/source')
+        return source.get('path') if source is not None else None
+
+    def cpu_tuning(self) -> CPUTuning:
+        """Get vCPU pinning"""
+        tuning = CPUTuning()
+        cputune = self.root.find('cputune')
+        if cputune is None:
+            return tuning
+        for pin in cputune.findall('vcpupin'):
+            tuning.vcpupin[int(pin.get('vcpu'))] = pin.get('cpuset')
+        emulator = cputune.find('emulatorpin')
+        if emulator is not None:
+            tuning.emulatorpin = emulator.get('cpuset')
+        return tuning
+
+    def memory_backing(self) -> MemoryBacking:
+        """Get memory backing options"""
+        backing = MemoryBacking()
+        element = self.root.find('memoryBacking')
+        if element is None:
+            return backing
+        hugepages = element.find('hugepages')
+        if hugepages is not None:
+            backing.hugepages = True
+            page = hugepages.find('page')
+            if page is not None and page.get('size'):
+                backing.page_size_kib = _to_kib(int(page.get('size')), page.get('unit', 'KiB'))
+        backing.locked = element.find('locked') is not None
+        backing.nosharepages = element.find('nosharepages') is not None
+        return backing
+
+    # ------------------------------------------------------------------
+    # Patch API
+    # ------------------------------------------------------------------
+
+    def remove_devices(
+        self,
+        tag: str,
+        predicate: Optional[Callable[[ET.Element], bool]] = None
+    ) -> int:
+        """
+        Remove device elements by tag
+
+        Args:
+            tag: Device element name (graphics, video, channel, ...)
+            predicate: Optional filter; only matching elements are removed
+
+        Returns:
+            Number of removed elements
+        """
+        devices = self.devices
+        removed = 0
+        for element in list(devices.findall(tag)):
+            if predicate is None or predicate(element):
+                devices.remove(element)
+                removed += 1
+        if removed:
+            self._dirty = True
+            logger.debug(f"Removed {removed} <{tag}> device(s)")
+        return removed
+
+    def add_hostdev(self, address, managed: bool = True) -> bool:
+        """
+        Add a PCI hostdev unless the address is already passed through
+
+        Args:
+            address: PCIAddress or "0000:01:00.0" string
+            managed: Let libvirt handle driver detach/reattach
+
+        Returns:
+            bool: True if a device was added
+        """
+        if isinstance(address, str):
+            address = PCIAddress.parse(address)
+        if any(h.address == address for h in self.hostdevs()):
+            return False
+
+        hostdev = ET.SubElement(self.devices, 'hostdev', {
+            'mode': 'subsystem',
+            'type': 'pci',
+            'managed': 'yes' if managed else 'no'
+        })
+        source = ET.SubElement(hostdev, 'source')
+        ET.SubElement(source, 'address', address.to_attributes())
+        self._dirty = True
+        return True
+
+    def remove_hostdevs(self, addresses: Optional[Iterable] = None) -> int:
+        """
+        Remove PCI hostdevs
+
+        Args:
+            addresses: PCIAddress objects or address strings; None removes all
+
+        Returns:
+            Number of removed hostdevs
+        """
+        wanted = None
+        if addresses is not None:
+            wanted = {a if isinstance(a, PCIAddress) else PCIAddress.parse(a) for a in addresses}
+
+        def matches(hostdev: ET.Element) -> bool:
+            if hostdev.get('type') != 'pci':
+                return False
+            if wanted is None:
+                return True
+            return PCIAddress.from_element(hostdev.find('source/address')) in wanted
+
+        return self.remove_devices('hostdev', matches)
+
+    def remove_graphics(self, types: Optional[Iterable[str]] = None) -> int:
+        """Remove graphics devices, optionally only of the given types"""
+        types = set(types) if types is not None else None
+        return self.remove_devices(
+            'graphics', lambda g: types is None or g.get('type') in types
+        )
+
+    def add_graphics(self, type: str = 'vnc', autoport: bool = True) -> None:
+        """Add a graphics device"""
+        attrs = {'type': type}
+        if autoport:
+            attrs.update({'port': '-1', 'autoport': 'yes'})
+        ET.SubElement(self.devices, 'graphics', attrs)
+        self._dirty = True
+
+    def remove_video(self) -> int:
+        """Remove all video adapters"""
+        return self.remove_devices('video')
+
+    def add_video(
+        self,
+        model: str = 'qxl',
+        ram: int = 65536,
+        vram: int = 65536,
+        vgamem: int = 16384,
+        heads: int = 1
+    ) -> None:
+        """Add a video adapter"""
+        video = ET.SubElement(self.devices, 'video')
+        attrs = {'type': model, 'heads': str(heads)}
+        if model == 'qxl':
+            attrs.update({'ram': str(ram), 'vram': str(vram), 'vgamem': str(vgamem)})
+        ET.SubElement(video, 'model', attrs)
+        self._dirty = True
+
+    def remove_audio(self) -> int:
+        """Remove audio backends and sound cards"""
+        return self.remove_devices('audio') + self.remove_devices('sound')
+
+    def set_vcpu_pinning(
+        self,
+        pinning: Dict[int, str],
+        emulatorpin: Optional[str] = None
+    ) -> None:
+        """
+        Replace vCPU pinning
+
+        Args:
+            pinning: Map of vCPU index to host cpuset (e.g. {0: "2", 1: "3"})
+            emulatorpin: Optional host cpuset for emulator threads
+        """
+        current = self.cpu_tuning()
+        if current.vcpupin == pinning and current.emulatorpin == emulatorpin:
+            return
+
+        cputune = self.root.find('cputune')
+        if cputune is None:
+            cputune = ET.Element('cputune')
+            _insert_after(self.root, cputune, ('cpu', 'vcpu'))
+        for tag in ('vcpupin', 'emulatorpin'):
+            for element in list(cputune.findall(tag)):
+                cputune.remove(element)
+
+        for index, (vcpu, cpuset) in enumerate(sorted(pinning.items())):
+            cputune.insert(index, ET.Element('vcpupin', {'vcpu': str(vcpu), 'cpuset': str(cpuset)}))
+        if emulatorpin:
+            cputune.insert(len(pinning), ET.Element('emulatorpin', {'cpuset': emulatorpin}))
+        if len(cputune) == 0:
+            self.root.remove(cputune)
+        self._dirty = True
+
+    def set_memory_backing(
+        self,
+        hugepages: bool = False,
+        page_size_kib: Optional[int] = None,
+        locked: bool = False,
+        nosharepages: bool = False
+    ) -> None:
+        """Replace memory backing options"""
+        wanted = MemoryBacking(hugepages, page_size_kib if hugepages else None, locked, nosharepages)
+        if self.memory_backing() == wanted:
+            return
+
+        element = self.root.find('memoryBacking')
+        if element is not None:
+            self.root.remove(element)
+        if hugepages or locked or nosharepages:
+            element = ET.Element('memoryBacking')
+            if hugepages:
+                pages = ET.SubElement(element, 'hugepages')
+                if page_size_kib:
+                    ET.SubElement(pages, 'page', {'size': str(page_size_kib), 'unit': 'KiB'})
+            if nosharepages:
+                ET.SubElement(element, 'nosharepages')
+            if locked:
+                ET.SubElement(element, 'locked')
+            _insert_after(self.root, element, ('currentMemory', 'memory'))
+        self._dirty = True
+
+    def set_disk_source(self, target: str, path: str, driver_type: Optional[str] = None) -> bool:
+        """
+        Point a disk at a different image file
+
+        Any <backingStore> libvirt recorded is dropped; it is re-probed
+        from the new image on the next start.
+
+        Args:
+            target: Disk target device (vda, sda, ...)
+            path: New image path
+            driver_type: New image format (unchanged if omitted)
+
+        Returns:
+            bool: True if the disk was found
+        """
+        for disk in self._find_devices('disk'):
+            target_element = disk.find('target')
+            if target_element is None or target_element.get('dev') != target:
+                continue
+
+            source = disk.find('source')
+            if source is None:
+                source = ET.SubElement(disk, 'source')
+            if source.get('file') != path:
+                source.attrib.clear()
+                source.set('file', path)
+                disk.set('type', 'file')
+                self._dirty = True
+            backing_store = disk.find('backingStore')
+            if backing_store is not None:
+                disk.remove(backing_store)
+                self._dirty = True
+            driver = disk.find('driver')
+            if driver_type and driver is not None and driver.get('type') != driver_type:
+                driver.set('type', driver_type)
+                self._dirty = True
+            return True
+        return False
+
+
+def _to_kib(value: int, unit: str) -> int:
+    """Convert a libvirt memory size to KiB"""
+    factors = {'b': 1 / 1024, 'bytes': 1 / 1024, 'k': 1, 'kib': 1, 'kb': 1000 / 1024,
+               'm': 1024, 'mib': 1024, 'mb': 1000 ** 2 / 1024,
+               'g': 1024 ** 2, 'gib': 1024 ** 2, 'gb': 1000 ** 3 / 1024}
+    return int(value * factors.get(unit.lower(), 1))
+
+
+def _insert_after(root: ET.Element, element: ET.Element, anchors) -> None:
+    """Insert element after the first existing anchor tag, else append"""
+    children = list(root)
+    for anchor in anchors:
+        for index, child in enumerate(children):
+            if child.tag == anchor:
+                root.insert(index + 1, element)
+                return
+    root.append(element)
+
+
+@contextmanager
+def edit_domain(conn, domain, flags: int = XML_INACTIVE) -> Iterator[DomainDocument]:
+    """
+    Batch edits to a domain definition
+
+    Fetches and parses the XML once, yields the document for patching and,
+    if anything changed, serializes and calls defineXML exactly once.
+
+    Args:
+        conn: libvirt connection
+        domain: libvirt domain object
+        flags: XMLDesc flags (persistent config by default)
+
+    Yields:
+        DomainDocument to patch
+    """
+    document = DomainDocument.from_domain(domain, flags)
+    yield document
+    if document.dirty:
+        conn.defineXML(document.to_xml())
+        logger.debug(f"Redefined domain '{document.name}'")
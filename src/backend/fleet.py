@@ -0,0 +1,335 @@
+"""
+Fleet - Declarative multi-VM manifests
+
+A manifest lists the VMs of a lab in JSON (or YAML, if PyYAML is
+installed). The whole manifest is validated against the host before
+anything is created; VMs are then provisioned concurrently. Applying a
+manifest is idempotent: VMs that already exist are left alone, so
+re-applying only creates what is missing.
+
+    {
+      "defaults": {"iso_path": "/isos/win11.iso", "memory_mb": 8192},
+      "vms": [
+        {"name": "lab-{index:02d}", "count": 40, "vcpus": 4},
+        {"name": "render", "gpu": "0000:01:00.0", "hugepages": true,
+         "cpu_pinning": {"0": "4", "1": "5"}, "emulatorpin": "0-1"}
+      ]
+    }
+"""
+
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+
+import libvirt
+
+from backend.domain_xml import DomainDocument, XML_INACTIVE
+from backend.host_resources import default_hugepage_size_kib, host_cpus, hugepage_pools, parse_cpuset
+from backend.libvirt_manager import LibvirtManager
+from backend.vm_provisioner import VMProvisioner, VMSpec
+from utils.logger import logger
+import config
+
+
+def _cpus_of(cpusets) -> Set[int]:
+    cpus: Set[int] = set()
+    for cpuset in cpusets:
+        cpus |= parse_cpuset(cpuset)
+    return cpus
+
+
+@dataclass
+class FleetManifest:
+    """VMs declared by a manifest"""
+    vms: List[VMSpec]
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'FleetManifest':
+        """
+        Expand a parsed manifest
+
+        Entries with a "count" are repeated; their name is a format string
+        receiving "index" (starting at "first_index", default 1).
+
+        Raises:
+            ValueError: Malformed manifest
+        """
+        if not isinstance(data, dict) or not isinstance(data.get('vms'), list):
+            raise ValueError("Manifest must be an object with a 'vms' list")
+        defaults = data.get('defaults') or {}
+
+        vms = []
+        for position, entry in enumerate(data['vms'], 1):
+            if not isinstance(entry, dict):
+                raise ValueError(f"VM entry {position} must be an object")
+            entry = {**defaults, **entry}
+            count = entry.pop('count', None)
+            first_index = entry.pop('first_index', 1)
+            if count is None:
+                vms.append(VMSpec.from_dict(entry))
+                continue
+            for index in range(first_index, first_index + int(count)):
+                vms.append(VMSpec.from_dict({**entry, 'name': entry['name'].format(index=index)}))
+        return cls(vms)
+
+    @classmethod
+    def load(cls, path) -> 'FleetManifest':
+        """
+        Read a manifest file (.yaml/.yml need PyYAML)
+
+        Raises:
+            ValueError: Malformed manifest or PyYAML missing
+            OSError: File not readable
+        """
+        path = Path(path)
+        text = path.read_text()
+        if path.suffix.lower() in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError("YAML manifests need PyYAML (pip install pyyaml); use JSON instead")
+            data = yaml.safe_load(text)
+        else:
+            data = json.loads(text)
+        return cls.from_dict(data)
+
+
+@dataclass
+class FleetPlan:
+    """What applying a manifest would do"""
+    create: List[VMSpec] = field(default_factory=list)
+    existing: List[str] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+    warnings: List[str] = field(default_factory=list)
+    overwrite: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+@dataclass
+class FleetResult:
+    """Outcome for one VM"""
+    name: str
+    action: str  # "created", "exists" or "failed"
+    error: Optional[str] = None
+    uuid: Optional[str] = None
+
+
+class FleetExecutor:
+    """Validates manifests against the host and provisions them concurrently"""
+
+    def __init__(
+        self,
+        manager: LibvirtManager,
+        provisioner: Optional[VMProvisioner] = None,
+        max_workers: int = config.FLEET_JOBS,
+        cpu_overcommit: float = config.FLEET_CPU_OVERCOMMIT
+    ):
+        """
+        Args:
+            manager: LibvirtManager instance
+            provisioner: VMProvisioner instance (created if omitted)
+            max_workers: VMs provisioned at once (disk jobs are additionally
+                         limited per storage device)
+            cpu_overcommit: Allowed defined vCPUs per host CPU
+        """
+        self.manager = manager
+        self.provisioner = provisioner or VMProvisioner(manager)
+        self.max_workers = max_workers
+        self.cpu_overcommit = cpu_overcommit
+
+    # ------------------------------------------------------------------
+    # Validation
+    # ------------------------------------------------------------------
+
+    def plan(self, manifest: FleetManifest, overwrite: bool = False) -> FleetPlan:
+        """
+        Validate a manifest and work out which VMs are missing
+
+        Args:
+            manifest: Manifest to apply
+            overwrite: Replace disk images left behind without a VM
+
+        Returns:
+            FleetPlan; nothing should be applied unless plan.ok
+        """
+        plan = FleetPlan(overwrite=overwrite)
+
+        seen: Set[str] = set()
+        for spec in manifest.vms:
+            if spec.name in seen:
+                plan.errors.append(f"Duplicate VM name in manifest: {spec.name}")
+                continue
+            seen.add(spec.name)
+            plan.errors.extend(f"{spec.name}: {error}" for error in spec.validate())
+
+        existing = self._existing_domains()
+        for spec in manifest.vms:
+            if spec.name in existing:
+                if spec.name not in plan.existing:
+                    plan.existing.append(spec.name)
+            elif spec.name not in {s.name for s in plan.create}:
+                plan.create.append(spec)
+
+        for spec in plan.create:
+            disk_path = self.provisioner.disk_manager.get_disk_path(spec.name)
+            if Path(disk_path).exists() and not overwrite:
+                plan.errors.append(f"{spec.name}: disk {disk_path} exists without a VM (use overwrite)")
+
+        self._check_cpus(plan, existing)
+        self._check_hugepages(plan)
+        self._check_gpus(plan, existing)
+        return plan
+
+    def _existing_domains(self) -> Dict[str, Dict]:
+        """Name -> vCPU count, pinned host CPUs and hostdev addresses of defined VMs"""
+        result = {}
+        for domain in self.manager.list_all_vms():
+            try:
+                document = DomainDocument.from_domain(domain, XML_INACTIVE)
+                result[domain.name()] = {
+                    'vcpus': domain.info()[3],
+                    'pinned': _cpus_of(document.cpu_tuning().vcpupin.values()),
+                    'hostdevs': {str(h.address) for h in document.hostdevs()},
+                }
+            except (libvirt.libvirtError, ValueError) as e:
+                logger.warning(f"Could not inspect existing VM: {e}")
+        return result
+
+    def _check_cpus(self, plan: FleetPlan, existing: Dict[str, Dict]):
+        cpus = host_cpus()
+        defined = sum(facts['vcpus'] for facts in existing.values())
+        requested = sum(spec.vcpus for spec in plan.create)
+        limit = int(len(cpus) * self.cpu_overcommit)
+        if defined + requested > limit:
+            plan.errors.append(
+                f"CPU overcommit: {defined} defined + {requested} new vCPUs exceed "
+                f"{limit} ({len(cpus)} host CPUs x {self.cpu_overcommit})"
+            )
+
+        owners: Dict[int, str] = {}
+        for name, facts in existing.items():
+            for cpu in facts['pinned']:
+                owners.setdefault(cpu, name)
+        for spec in plan.create:
+            try:
+                pinned = _cpus_of(spec.cpu_pinning.values())
+                emulator = _cpus_of([spec.emulatorpin] if spec.emulatorpin else [])
+            except ValueError as e:
+                plan.errors.append(f"{spec.name}: invalid cpuset: {e}")
+                continue
+            missing = (pinned | emulator) - cpus
+            if missing:
+                plan.errors.append(f"{spec.name}: pinned to unavailable host CPUs {sorted(missing)}")
+            for cpu in sorted(pinned):
+                if cpu in owners:
+                    plan.warnings.append(f"{spec.name}: host CPU {cpu} is also pinned by {owners[cpu]}")
+                else:
+                    owners[cpu] = spec.name
+
+    def _check_hugepages(self, plan: FleetPlan):
+        wanted = [spec for spec in plan.create if spec.hugepages]
+        if not wanted:
+            return
+        pools = hugepage_pools()
+        default_size = default_hugepage_size_kib()
+
+        needed: Dict[int, int] = {}
+        for spec in wanted:
+            size = spec.hugepage_size_kib or default_size
+            needed[size] = needed.get(size, 0) + math.ceil(spec.memory_mb * 1024 / size)
+
+        for size, pages in sorted(needed.items()):
+            pool = pools.get(size)
+            if pool is None:
+                plan.errors.append(f"No {size} KiB hugepage pool is configured on the host")
+            elif pages > pool.free:
+                plan.errors.append(
+                    f"Hugepages: {pages} x {size} KiB needed, only {pool.free} of {pool.total} free"
+                )
+
+    def _check_gpus(self, plan: FleetPlan, existing: Dict[str, Dict]):
+        wanted = [spec for spec in plan.create if spec.gpu]
+        if not wanted:
+            return
+        from backend.gpu_detector import GPUDetector
+        detector = GPUDetector()
+
+        in_use = {address: name for name, facts in existing.items() for address in facts['hostdevs']}
+        claimed: Dict[str, str] = {}
+        for spec in wanted:
+            gpu = detector.get_gpu_by_address(spec.gpu)
+            if gpu is None:
+                plan.errors.append(f"{spec.name}: no GPU at {spec.gpu}")
+                continue
+            if not gpu.can_passthrough:
+                plan.errors.append(f"{spec.name}: {gpu.full_name} cannot be passed through")
+            if spec.gpu in claimed:
+                plan.errors.append(f"{spec.name}: GPU {spec.gpu} is also assigned to {claimed[spec.gpu]}")
+                continue
+            claimed[spec.gpu] = spec.name
+            for device in gpu.all_devices:
+                if device.address in in_use:
+                    plan.errors.append(
+                        f"{spec.name}: {device.address} is already passed through to {in_use[device.address]}"
+                    )
+
+    # ------------------------------------------------------------------
+    # Execution
+    # ------------------------------------------------------------------
+
+    def apply(
+        self,
+        plan: FleetPlan,
+        on_result: Optional[Callable[[FleetResult], None]] = None
+    ) -> List[FleetResult]:
+        """
+        Create the missing VMs of a validated plan concurrently
+
+        Disk creation, NVRAM cloning and defineXML of different VMs overlap;
+        one VM failing does not stop the others.
+
+        Args:
+            plan: Plan from plan()
+            on_result: Called (from a worker thread) as each VM finishes
+
+        Returns:
+            One FleetResult per manifest VM, existing ones first
+
+        Raises:
+            ValueError: The plan has validation errors
+        """
+        if not plan.ok:
+            raise ValueError("Manifest has errors:\n" + "\n".join(plan.errors))
+
+        results = [FleetResult(name, "exists") for name in plan.existing]
+        for result in results:
+            if on_result:
+                on_result(result)
+
+        def create(spec: VMSpec) -> FleetResult:
+            try:
+                domain = self.provisioner.provision(spec, overwrite=plan.overwrite)
+                if domain is None:
+                    result = FleetResult(spec.name, "failed", "Disk creation cancelled")
+                else:
+                    result = FleetResult(spec.name, "created", uuid=domain.UUIDString())
+            except Exception as e:
+                logger.error(f"Fleet: failed to create '{spec.name}': {e}")
+                result = FleetResult(spec.name, "failed", str(e))
+            if on_result:
+                on_result(result)
+            return result
+
+        if plan.create:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="fleet") as executor:
+                results.extend(executor.map(create, plan.create))
+
+        created = sum(1 for r in results if r.action == "created")
+        logger.info(f"Fleet applied: {created} created, {len(plan.existing)} already existed")
+        return results
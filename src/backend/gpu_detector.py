@@ -7,8 +7,10 @@ import re
 import subprocess
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
-from dataclasses import dataclass
+from dataclasses import dataclass, field, replace
+from models.snapshot import compute_fingerprint
 from utils.logger import logger
+import config
 
 
 # PCI Vendor IDs for GPU manufacturers
@@ -26,9 +28,9 @@ DISPLAY_CLASS_CODE = '0380'  # Display controller
 AUDIO_CLASS_CODE = '0403'  # Audio device (often paired with GPU)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class PCIDevice:
-    """Represents a PCI device"""
+    """Represents a PCI device (immutable, keyed by PCI address)"""
     address: str  # e.g., "0000:01:00.0"
     vendor_id: str  # e.g., "10de"
     device_id: str  # e.g., "1c03"
@@ -37,6 +39,18 @@ class PCIDevice:
     device_name: str
     iommu_group: Optional[int] = None
     driver: Optional[str] = None
+    fingerprint: int = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        object.__setattr__(self, 'fingerprint', compute_fingerprint(self))
+    
+    def __hash__(self) -> int:
+        return self.fingerprint
+    
+    @property
+    def key(self) -> str:
+        """Stable identity"""
+        return self.address
     
     @property
     def is_gpu(self) -> bool:
@@ -55,16 +69,28 @@ class PCIDevice:
         return 'pci_' + self.address.replace(':', '_').replace('.', '_')
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class GPU:
-    """Represents a detected GPU with metadata"""
+    """Represents a detected GPU with metadata (immutable, keyed by PCI address)"""
     pci_device: PCIDevice
     vendor: str  # NVIDIA, AMD, Intel
     model: str
     iommu_group: int
-    related_devices: List[PCIDevice]  # Audio, USB controllers, etc.
+    related_devices: Tuple[PCIDevice, ...]  # Audio, USB controllers, etc.
     is_primary: bool = False  # Connected to display output
     can_passthrough: bool = True
+    fingerprint: int = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        object.__setattr__(self, 'fingerprint', compute_fingerprint(self))
+    
+    def __hash__(self) -> int:
+        return self.fingerprint
+    
+    @property
+    def key(self) -> str:
+        """Stable identity"""
+        return self.pci_device.address
     
     @property
     def full_name(self) -> str:
@@ -77,15 +103,20 @@ class GPU:
         return self.pci_device.address
     
     @property
-    def all_devices(self) -> List[PCIDevice]:
+    def all_devices(self) -> Tuple[PCIDevice, ...]:
         """Get GPU + all related devices"""
-        return [self.pci_device] + self.related_devices
+        return (self.pci_device,) + self.related_devices
 
 
 class GPUDetector:
     """Detects and analyzes GPUs for passthrough"""
     
-    def __init__(self):
+    def __init__(self, sysfs_root: Optional[Path] = None):
+        """
+        Args:
+            sysfs_root: sysfs mount point (default: config.SYSFS_ROOT)
+        """
+        self.sysfs_root = Path(sysfs_root or config.SYSFS_ROOT)
         self.gpus: List[GPU] = []
         self.all_pci_devices: List[PCIDevice] = []
         self.iommu_enabled = False
@@ -111,7 +142,7 @@ class GPUDetector:
     
     def _check_iommu(self) -> bool:
         """Check if IOMMU is enabled"""
-        iommu_path = Path('/sys/kernel/iommu_groups')
+        iommu_path = self.sysfs_root / 'kernel' / 'iommu_groups'
         
         if not iommu_path.exists():
             logger.warning("IOMMU not enabled - GPU passthrough unavailable")
@@ -141,10 +172,12 @@ class GPUDetector:
             for line in result.stdout.strip().split('\n'):
                 device = self._parse_lspci_line(line)
                 if device:
-                    # Add IOMMU group info
-                    device.iommu_group = self._get_iommu_group(device.address)
-                    # Add driver info
-                    device.driver = self._get_device_driver(device.address)
+                    # Add IOMMU group and driver info
+                    device = replace(
+                        device,
+                        iommu_group=self._get_iommu_group(device.address),
+                        driver=self._get_device_driver(device.address)
+                    )
                     self.all_pci_devices.append(device)
             
             logger.debug(f"Scanned {len(self.all_pci_devices)} PCI devices")
@@ -199,7 +232,7 @@ class GPUDetector:
         """Get IOMMU group number for a PCI device"""
         try:
             # /sys/bus/pci/devices/0000:01:00.0/iommu_group -> ../../kernel/iommu_groups/1
-            device_path = Path(f'/sys/bus/pci/devices/{pci_address}/iommu_group')
+            device_path = self.sysfs_root / 'bus' / 'pci' / 'devices' / pci_address / 'iommu_group'
             
             if device_path.exists() and device_path.is_symlink():
                 # Read symlink and extract group number
@@ -214,7 +247,7 @@ class GPUDetector:
     def _get_device_driver(self, pci_address: str) -> Optional[str]:
         """Get current driver for a PCI device"""
         try:
-            driver_path = Path(f'/sys/bus/pci/devices/{pci_address}/driver')
+            driver_path = self.sysfs_root / 'bus' / 'pci' / 'devices' / pci_address / 'driver'
             
             if driver_path.exists() and driver_path.is_symlink():
                 # Read symlink to get driver name
@@ -252,10 +285,10 @@ class GPUDetector:
             logger.info(f"Detected GPU: {gpu.full_name} at {gpu.pci_address} "
                        f"(IOMMU Group {gpu.iommu_group}, Primary: {is_primary})")
     
-    def _find_related_devices(self, gpu_device: PCIDevice) -> List[PCIDevice]:
+    def _find_related_devices(self, gpu_device: PCIDevice) -> Tuple[PCIDevice, ...]:
         """Find devices related to GPU (audio, USB) in same IOMMU group"""
         if gpu_device.iommu_group is None:
-            return []
+            return ()
         
         related = []
         for dev in self.all_pci_devices:
@@ -272,7 +305,7 @@ class GPUDetector:
                     related.append(dev)
                     logger.debug(f"Found related device: {dev.device_name} at {dev.address}")
         
-        return related
+        return tuple(related)
     
     def _is_primary_gpu(self, gpu_device: PCIDevice) -> bool:
         """
@@ -283,7 +316,7 @@ class GPUDetector:
         """
         # Check boot_vga flag
         try:
-            boot_vga_path = Path(f'/sys/bus/pci/devices/{gpu_device.address}/boot_vga')
+            boot_vga_path = self.sysfs_root / 'bus' / 'pci' / 'devices' / gpu_device.address / 'boot_vga'
             if boot_vga_path.exists():
                 boot_vga = boot_vga_path.read_text().strip()
                 if boot_vga == '1':
@@ -300,8 +333,7 @@ class GPUDetector:
     def _analyze_passthrough_capability(self):
         """Analyze which GPUs can be safely passed through"""
         if not self.iommu_enabled:
-            for gpu in self.gpus:
-                gpu.can_passthrough = False
+            self.gpus = [replace(gpu, can_passthrough=False) for gpu in self.gpus]
             logger.warning("No GPU can be passed through - IOMMU disabled")
             return
         
@@ -310,15 +342,18 @@ class GPUDetector:
         
         if len(self.gpus) == 1:
             # Only one GPU - cannot passthrough (would lose host display)
-            self.gpus[0].can_passthrough = False
+            self.gpus = [replace(self.gpus[0], can_passthrough=False)]
             logger.warning("Only 1 GPU detected - passthrough disabled to protect host display")
         elif len(secondary_gpus) == 0:
             # All GPUs marked primary (shouldn't happen, but safe fallback)
             logger.warning("All GPUs detected as primary - passthrough risky")
         else:
             # Mark non-primary GPUs as passthrough-capable
+            self.gpus = [
+                gpu if gpu.is_primary else replace(gpu, can_passthrough=True)
+                for gpu in self.gpus
+            ]
             for gpu in secondary_gpus:
-                gpu.can_passthrough = True
                 logger.info(f"GPU {gpu.full_name} marked for passthrough")
     
     def get_passthrough_gpus(self) -> List[GPU]:
@@ -6,13 +6,21 @@ Uses QEMU Guest Agent to communicate with guest OS and install drivers
 import json
 import time
 import subprocess
-import requests
 from typing import Optional, Dict, Tuple
 from pathlib import Path
 
 from backend.gpu_detector import GPU
 from backend.libvirt_manager import LibvirtManager
 from utils.logger import logger
+from utils import metrics
+
+
+GUEST_AGENT_TIMEOUTS = metrics.counter(
+    'virtflow_guest_agent_timeouts_total', "Guest agent waits and commands that timed out", ['operation']
+)
+GUEST_AGENT_READY_SECONDS = metrics.histogram(
+    'virtflow_guest_agent_ready_seconds', "Time until the guest agent answered a ping"
+)
 
 
 class GuestDriverHelper:
@@ -59,6 +67,7 @@ class GuestDriverHelper:
                 )
                 
                 if result.returncode == 0:
+                    GUEST_AGENT_READY_SECONDS.observe(time.time() - start_time)
                     logger.info(f"Guest agent ready in '{vm_name}'")
                     return True
                     
@@ -69,6 +78,7 @@ class GuestDriverHelper:
             
             time.sleep(2)
         
+        GUEST_AGENT_TIMEOUTS.labels('ping').inc()
         logger.warning(f"Guest agent not ready after {timeout}s")
         return False
     
@@ -194,9 +204,14 @@ class GuestDriverHelper:
                 
                 time.sleep(2)
             
+            GUEST_AGENT_TIMEOUTS.labels('exec').inc()
             logger.warning(f"Guest command timed out after {timeout}s")
             return False, None
             
+        except subprocess.TimeoutExpired:
+            GUEST_AGENT_TIMEOUTS.labels('exec').inc()
+            logger.error(f"Guest agent did not answer for '{vm_name}'")
+            return False, None
         except Exception as e:
             logger.error(f"Failed to execute guest command: {e}")
             return False, None
@@ -304,6 +319,8 @@ class GuestDriverHelper:
         logger.info(f"Downloading {gpu.vendor} driver from {url}...")
         
         try:
+            import requests  # only needed for driver downloads
+            
             response = requests.get(url, stream=True, timeout=300)
             response.raise_for_status()
             
@@ -0,0 +1,250 @@
+"""
+Host capabilities cache - firmware, machine types, Hyper-V and hostdev support
+
+Capabilities are read once per libvirt connection with
+getDomainCapabilities()/getCapabilities(), kept in memory for the life of
+the process and persisted to disk keyed by libvirt and QEMU version, so VM
+creation never has to spawn `virsh domcapabilities`.
+"""
+
+import json
+import threading
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from utils.logger import logger
+import config
+
+
+CACHE_FILE = config.CACHE_DIR / "host_capabilities.json"
+
+# Bump when the cached structure changes
+CACHE_FORMAT = 1
+
+
+@dataclass
+class HostCapabilities:
+    """Subset of libvirt domain/host capabilities used by VirtFlow"""
+    uri: str
+    libvirt_version: int
+    qemu_version: int
+    emulator: Optional[str] = None
+    firmware: List[str] = field(default_factory=list)
+    machine_types: List[str] = field(default_factory=list)
+    hyperv_features: List[str] = field(default_factory=list)
+    hostdev_supported: bool = False
+    hostdev_subsys_types: List[str] = field(default_factory=list)
+
+    def find_ovmf_code(self) -> Optional[str]:
+        """Get the first advertised OVMF CODE image that exists on disk"""
+        for path in self.firmware:
+            if 'OVMF_CODE' in path and Path(path).exists():
+                return path
+        return None
+
+    @property
+    def supports_pci_passthrough(self) -> bool:
+        return self.hostdev_supported and 'pci' in self.hostdev_subsys_types
+
+
+def parse_domain_capabilities(domcaps_xml: str, caps_xml: Optional[str] = None) -> Dict:
+    """
+    Parse domain capabilities (and optionally host capabilities) XML
+
+    Args:
+        domcaps_xml: Output of getDomainCapabilities()
+        caps_xml: Output of getCapabilities()
+
+    Returns:
+        Dictionary of HostCapabilities fields
+    """
+    root = ET.fromstring(domcaps_xml)
+    result = {
+        'emulator': root.findtext('path'),
+        'firmware': [v.text for v in root.findall('os/loader/value') if v.text],
+        'hyperv_features': [
+            v.text for v in root.findall("features/hyperv/enum[@name='features']/value") if v.text
+        ],
+        'hostdev_supported': False,
+        'hostdev_subsys_types': [],
+        'machine_types': []
+    }
+
+    hostdev = root.find('devices/hostdev')
+    if hostdev is not None:
+        result['hostdev_supported'] = hostdev.get('supported') == 'yes'
+        result['hostdev_subsys_types'] = [
+            v.text for v in hostdev.findall("enum[@name='subsysType']/value") if v.text
+        ]
+
+    machine = root.findtext('machine')
+    machines = [machine] if machine else []
+    if caps_xml:
+        caps = ET.fromstring(caps_xml)
+        for arch in caps.findall("guest/arch[@name='x86_64']"):
+            for element in arch.findall('machine'):
+                if element.text and element.text not in machines:
+                    machines.append(element.text)
+    result['machine_types'] = machines
+    return result
+
+
+class HostCapabilitiesCache:
+    """Process-wide, disk-backed cache of host capabilities per libvirt URI"""
+
+    def __init__(self, cache_file: Path = CACHE_FILE):
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._entries: Dict[str, HostCapabilities] = {}
+        self._disk_loaded = False
+
+    def get(self, conn=None) -> Optional[HostCapabilities]:
+        """
+        Get capabilities for a connection
+
+        With a connection the cached entry is validated against the
+        connection's libvirt/QEMU versions and refreshed if they changed.
+        Without one, the last known entry is returned unvalidated.
+
+        Args:
+            conn: libvirt connection (optional)
+
+        Returns:
+            HostCapabilities or None if nothing is known yet
+        """
+        with self._lock:
+            self._load_disk_cache()
+
+            if conn is None:
+                uri = config.DEFAULT_LIBVIRT_URI
+                return self._entries.get(uri) or next(iter(self._entries.values()), None)
+
+            try:
+                uri = conn.getURI()
+                libvirt_version = conn.getLibVersion()
+                qemu_version = conn.getVersion()
+            except Exception as e:
+                logger.debug(f"Could not query connection versions: {e}")
+                return self._entries.get(config.DEFAULT_LIBVIRT_URI)
+
+            cached = self._entries.get(uri)
+            if (cached is not None and cached.libvirt_version == libvirt_version
+                    and cached.qemu_version == qemu_version):
+                return cached
+
+            if cached is not None:
+                logger.info("libvirt/QEMU version changed; refreshing host capabilities")
+
+            caps = self._probe(conn, uri, libvirt_version, qemu_version)
+            if caps is not None:
+                self._entries[uri] = caps
+                self._save_disk_cache()
+            return caps or cached
+
+    def invalidate(self, uri: Optional[str] = None):
+        """Drop cached capabilities for one URI, or all of them"""
+        with self._lock:
+            self._load_disk_cache()
+            if uri is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(uri, None)
+            self._save_disk_cache()
+
+    def _probe(
+        self,
+        conn,
+        uri: str,
+        libvirt_version: int,
+        qemu_version: int
+    ) -> Optional[HostCapabilities]:
+        """Read capabilities over the existing connection"""
+        try:
+            domcaps_xml = conn.getDomainCapabilities(None, 'x86_64', 'q35', 'kvm', 0)
+            try:
+                caps_xml = conn.getCapabilities()
+            except Exception:
+                caps_xml = None
+
+            caps = HostCapabilities(
+                uri=uri,
+                libvirt_version=libvirt_version,
+                qemu_version=qemu_version,
+                **parse_domain_capabilities(domcaps_xml, caps_xml)
+            )
+            logger.info(
+                f"Host capabilities: {len(caps.firmware)} firmware image(s), "
+                f"{len(caps.machine_types)} machine type(s), "
+                f"PCI passthrough {'supported' if caps.supports_pci_passthrough else 'unsupported'}"
+            )
+            return caps
+        except Exception as e:
+            logger.warning(f"Failed to read domain capabilities: {e}")
+            return None
+
+    def _load_disk_cache(self):
+        """Load persisted entries once per process"""
+        if self._disk_loaded:
+            return
+        self._disk_loaded = True
+        try:
+            data = json.loads(self.cache_file.read_text())
+            if data.get('format') != CACHE_FORMAT:
+                return
+            for uri, entry in data.get('hosts', {}).items():
+                self._entries[uri] = HostCapabilities(**entry)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.debug(f"Ignoring unreadable capabilities cache: {e}")
+
+    def _save_disk_cache(self):
+        """Persist entries atomically"""
+        try:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            data = {
+                'format': CACHE_FORMAT,
+                'hosts': {uri: asdict(caps) for uri, caps in self._entries.items()}
+            }
+            tmp = self.cache_file.with_suffix('.tmp')
+            tmp.write_text(json.dumps(data, indent=2))
+            tmp.replace(self.cache_file)
+        except Exception as e:
+            logger.debug(f"Could not write capabilities cache: {e}")
+
+
+# Shared instance
+host_capabilities = HostCapabilitiesCache()
+
+
+def find_ovmf_code_path(conn=None) -> Optional[str]:
+    """
+    Locate the OVMF CODE firmware image
+
+    Checks well-known paths first, then firmware advertised by libvirt
+    (from the capabilities cache, probing over `conn` if needed).
+
+    Args:
+        conn: libvirt connection (optional)
+
+    Returns:
+        Path string or None if not found
+    """
+    for path in config.OVMF_CODE_PATHS:
+        if Path(path).exists():
+            return path
+
+    caps = host_capabilities.get(conn)
+    if caps is not None:
+        return caps.find_ovmf_code()
+    return None
+
+
+def find_ovmf_vars_template() -> Optional[str]:
+    """Locate the OVMF VARS template matching the known CODE images"""
+    for path in config.OVMF_VARS_TEMPLATES:
+        if Path(path).exists():
+            return path
+    return None
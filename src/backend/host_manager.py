@@ -0,0 +1,211 @@
+"""
+Host manager - Named libvirt connections queried in parallel
+
+Each host is a name and a libvirt URI (qemu:///system,
+qemu+ssh://rig2/system, test:///default, ...) with its own LibvirtManager.
+Queries fan out to all hosts on a thread pool and are collected with a
+per-host timeout: a host that does not answer in time is reported as an
+error for that round while the others' results are used. A host whose
+previous call is still running is skipped rather than queued again, so a
+dead host ties up at most one worker.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Generic, List, Optional, TypeVar
+from urllib.parse import urlparse
+
+from backend.libvirt_manager import LibvirtManager
+from utils.logger import logger
+from utils import metrics
+import config
+
+
+T = TypeVar('T')
+
+HOST_QUERY_SECONDS = metrics.histogram(
+    'virtflow_host_query_seconds', "Duration of per-host fan-out queries", ['host', 'result']
+)
+
+
+@dataclass
+class FanOutResult(Generic[T]):
+    """Per-host results of one fan-out query"""
+    values: Dict[str, T] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+
+class HostManager:
+    """Named libvirt connections, one LibvirtManager per host"""
+
+    def __init__(self, hosts: Optional[Dict[str, str]] = None, timeout: Optional[float] = None):
+        """
+        Args:
+            hosts: Host name -> libvirt URI (default: configured_hosts())
+            timeout: Seconds to wait for each host per query
+        """
+        self.hosts = dict(hosts or configured_hosts())
+        if not self.hosts:
+            raise ValueError("At least one libvirt host is required")
+        self.timeout = timeout or config.HOST_TIMEOUT
+        self._managers: Dict[str, LibvirtManager] = {}
+        self._controllers: Dict[str, object] = {}  # host -> VMController
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2 * len(self.hosts), thread_name_prefix="hosts")
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.hosts)
+
+    @property
+    def default_host(self) -> str:
+        """First configured host"""
+        return next(iter(self.hosts))
+
+    def uri(self, host: str) -> str:
+        return self.hosts[host]
+
+    def manager(self, host: Optional[str] = None) -> LibvirtManager:
+        """
+        Get the LibvirtManager of a host, connecting on first use
+
+        Connecting can block on an unreachable host; prefer fan_out() from
+        the UI thread.
+        """
+        host = host or self.default_host
+        manager = self._managers.get(host)
+        if manager is not None:
+            return manager
+        # Connect without the lock so one slow host does not hold up the others
+        manager = LibvirtManager(self.hosts[host])
+        with self._lock:
+            existing = self._managers.setdefault(host, manager)
+        if existing is not manager:
+            manager.disconnect()
+        return existing
+
+    def controller(self, host: Optional[str] = None):
+        """VMController of a host, created on first use"""
+        host = host or self.default_host
+        controller = self._controllers.get(host)
+        if controller is None:
+            from backend.vm_controller import VMController
+            controller = self._controllers.setdefault(host, VMController(self.manager(host)))
+        return controller
+
+    def fan_out(self, query: Callable[[str, LibvirtManager], T], timeout: Optional[float] = None) -> FanOutResult[T]:
+        """
+        Run a query against every host in parallel
+
+        Args:
+            query: Called with (host name, LibvirtManager) on a worker thread
+            timeout: Seconds to wait for the hosts (default: self.timeout)
+
+        Returns:
+            FanOutResult with the values of hosts that answered in time and
+            an error message for the others
+        """
+        result: FanOutResult[T] = FanOutResult()
+        futures: Dict[Future, str] = {}
+        with self._lock:
+            for host in self.hosts:
+                pending = self._pending.get(host)
+                if pending is not None and not pending.done():
+                    result.errors[host] = "still busy with a previous request"
+                    continue
+                future = self._executor.submit(self._run, host, query)
+                self._pending[host] = future
+                futures[future] = host
+
+        done, not_done = wait(futures, timeout=timeout or self.timeout)
+        for future in done:
+            host = futures[future]
+            try:
+                result.values[host] = future.result()
+            except Exception as e:
+                result.errors[host] = str(e) or type(e).__name__
+        for future in not_done:
+            result.errors[futures[future]] = f"timed out after {timeout or self.timeout:g}s"
+
+        for host, error in result.errors.items():
+            logger.warning(f"Host '{host}': {error}")
+        return result
+
+    def _run(self, host: str, query: Callable[[str, LibvirtManager], T]) -> T:
+        start = time.perf_counter()
+        try:
+            manager = self.manager(host)
+            if manager.connection is None:
+                raise ConnectionError(f"cannot connect to {self.hosts[host]}")
+            value = query(host, manager)
+        except Exception:
+            HOST_QUERY_SECONDS.labels(host, 'error').observe(time.perf_counter() - start)
+            raise
+        HOST_QUERY_SECONDS.labels(host, 'ok').observe(time.perf_counter() - start)
+        return value
+
+    def list_vm_info(self, timeout: Optional[float] = None) -> FanOutResult[List[Dict]]:
+        """
+        Get VMController.get_vm_info() of every VM on every host
+
+        Each info dict gets a 'host' entry.
+        """
+        def query(host: str, manager: LibvirtManager) -> List[Dict]:
+            controller = self.controller(host)
+            infos = []
+            for domain in manager.list_all_vms():
+                info = controller.get_vm_info(domain)
+                if info:
+                    info['host'] = host
+                    infos.append(info)
+            return infos
+
+        return self.fan_out(query, timeout)
+
+    def find_vm(self, host: str, uuid: str):
+        """Look up a domain on a host by UUID"""
+        return self.manager(host).domains.domain(uuid)
+
+    def close(self):
+        """Release all connections"""
+        with self._lock:
+            managers, self._managers = list(self._managers.values()), {}
+            self._controllers = {}
+        for manager in managers:
+            manager.disconnect()
+        self._executor.shutdown(wait=False)
+
+
+def parse_hosts(value: str) -> Dict[str, str]:
+    """
+    Parse a host list such as "local=qemu:///system,rig2=qemu+ssh://rig2/system"
+
+    A bare URI is named after its host part (or "local").
+    """
+    hosts = {}
+    for entry in value.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, separator, uri = entry.partition('=')
+        if not separator or '://' in name:
+            uri = entry
+            name = host_name(uri)
+        hosts[name.strip()] = uri.strip()
+    return hosts
+
+
+def host_name(uri: str) -> str:
+    """Default display name for a URI"""
+    return urlparse(uri).hostname or "local"
+
+
+def configured_hosts() -> Dict[str, str]:
+    """Hosts from VIRTFLOW_HOSTS, config.LIBVIRT_HOSTS or the default URI"""
+    if os.environ.get("VIRTFLOW_HOSTS"):
+        return parse_hosts(os.environ["VIRTFLOW_HOSTS"])
+    return dict(config.LIBVIRT_HOSTS or {"local": config.DEFAULT_LIBVIRT_URI})
@@ -0,0 +1,178 @@
+"""
+Host resources - CPUs, memory, hugepage pools and disk latency read from /proc and /sys
+"""
+
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from utils.logger import logger
+
+
+MEMINFO_PATH = Path('/proc/meminfo')
+HUGEPAGES_PATH = Path('/sys/kernel/mm/hugepages')
+DISKSTATS_PATH = Path('/proc/diskstats')
+SYS_DEV_BLOCK_PATH = Path('/sys/dev/block')
+
+
+@dataclass(frozen=True)
+class HugepagePool:
+    """Hugepages of one size"""
+    page_size_kib: int
+    total: int
+    free: int
+
+    @property
+    def free_kib(self) -> int:
+        return self.free * self.page_size_kib
+
+
+def read_meminfo(path: Path = MEMINFO_PATH) -> Dict[str, int]:
+    """
+    Parse /proc/meminfo
+
+    Returns:
+        Map of field name to value (KiB for sizes, plain counts otherwise)
+    """
+    result = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                parts = value.split()
+                if parts:
+                    result[key] = int(parts[0])
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to read {path}: {e}")
+    return result
+
+
+def default_hugepage_size_kib(meminfo: Optional[Dict[str, int]] = None) -> int:
+    """Default hugepage size of the host (2 MiB on x86 if unknown)"""
+    meminfo = read_meminfo() if meminfo is None else meminfo
+    return meminfo.get('Hugepagesize', 2048)
+
+
+def hugepage_pools(path: Path = HUGEPAGES_PATH) -> Dict[int, HugepagePool]:
+    """
+    Get the hugepage pools the kernel has reserved
+
+    Returns:
+        Map of page size (KiB) to HugepagePool
+    """
+    pools = {}
+    try:
+        entries = list(path.iterdir())
+    except OSError:
+        return pools
+
+    for entry in entries:
+        # hugepages-2048kB, hugepages-1048576kB
+        if not entry.name.startswith('hugepages-') or not entry.name.endswith('kB'):
+            continue
+        try:
+            size = int(entry.name[len('hugepages-'):-len('kB')])
+            total = int((entry / 'nr_hugepages').read_text())
+            free = int((entry / 'free_hugepages').read_text())
+        except (OSError, ValueError) as e:
+            logger.debug(f"Skipping hugepage pool {entry}: {e}")
+            continue
+        pools[size] = HugepagePool(size, total, free)
+    return pools
+
+
+def host_cpus() -> Set[int]:
+    """Host CPUs this process may schedule on"""
+    try:
+        return set(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return set(range(os.cpu_count() or 1))
+
+
+def parse_cpuset(cpuset: str) -> Set[int]:
+    """
+    Parse a libvirt cpuset such as "0-3,8,^2"
+
+    Raises:
+        ValueError: Malformed cpuset
+    """
+    included: Set[int] = set()
+    excluded: Set[int] = set()
+    for part in cpuset.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        target = included
+        if part.startswith('^'):
+            target = excluded
+            part = part[1:]
+        if '-' in part:
+            start, end = (int(value) for value in part.split('-', 1))
+            if start > end:
+                raise ValueError(f"Invalid CPU range: {part}")
+            target.update(range(start, end + 1))
+        else:
+            target.add(int(part))
+    return included - excluded
+
+
+def read_diskstats(path: Path = DISKSTATS_PATH) -> Dict[str, Tuple[int, int]]:
+    """
+    Parse /proc/diskstats
+
+    Returns:
+        Map of block device name to (completed I/Os, milliseconds spent on them)
+    """
+    result = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 11:
+                    continue
+                # reads, ms reading = fields 3, 6; writes, ms writing = fields 7, 10
+                ios = int(fields[3]) + int(fields[7])
+                ms = int(fields[6]) + int(fields[10])
+                result[fields[2]] = (ios, ms)
+    except (OSError, ValueError) as e:
+        logger.debug(f"Failed to read {path}: {e}")
+    return result
+
+
+def block_device(path: str) -> Optional[str]:
+    """
+    Name of the block device holding a file (e.g. "nvme0n1p2")
+
+    Returns None for files on virtual filesystems (tmpfs, some btrfs and
+    network mounts) whose device does not appear in /proc/diskstats.
+    """
+    try:
+        st_dev = os.stat(path).st_dev
+        link = SYS_DEV_BLOCK_PATH / f"{os.major(st_dev)}:{os.minor(st_dev)}"
+        return link.resolve().name if link.exists() else None
+    except OSError:
+        return None
+
+
+def io_latency_ms(
+    before: Dict[str, Tuple[int, int]],
+    after: Dict[str, Tuple[int, int]],
+    devices: Iterable[str]
+) -> Optional[float]:
+    """
+    Average I/O completion time between two read_diskstats() samples
+
+    Returns:
+        Worst average over the devices in milliseconds, 0.0 if they were
+        idle, None if none of them is in both samples
+    """
+    worst = None
+    for device in devices:
+        if device not in before or device not in after:
+            continue
+        ios = after[device][0] - before[device][0]
+        ms = after[device][1] - before[device][1]
+        latency = ms / ios if ios > 0 else 0.0
+        worst = latency if worst is None else max(worst, latency)
+    return worst
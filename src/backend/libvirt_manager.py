@@ -3,23 +3,50 @@ Core libvirt connection and VM management
 """
 
 import libvirt
-from typing import List, Optional, Dict
+import xml.etree.ElementTree as ET
+from typing import TYPE_CHECKING, List, Optional, Dict, Tuple
+from urllib.parse import urlparse
+from backend import connection_manager
+from backend.connection_manager import ConnectionManager
+from backend.domain_xml import DomainDocument, XML_INACTIVE
+from backend.storage_reclaimer import StorageReclaimer, snapshot_files
 from utils.logger import logger
+from utils import metrics
 import config
 
+if TYPE_CHECKING:
+    # Imported on first use at runtime, see the properties below
+    from backend.admission import AdmissionController
+    from backend.domain_registry import DomainRegistry
+
+
+LIBVIRT_CALLS = metrics.counter(
+    'virtflow_libvirt_calls_total', "libvirt calls made through LibvirtManager", ['call']
+)
+DOMAINS = metrics.gauge('virtflow_domains', "Domains defined on the host at the last listing")
+
+_LIST_CALLS = LIBVIRT_CALLS.labels('listAllDomains')
+
 
 class LibvirtManager:
     """Manages libvirt connection and basic operations"""
     
-    def __init__(self, uri: str = None):
+    def __init__(self, uri: str = None, dedicated: bool = False):
         """
         Initialize libvirt connection
         
+        Managers for the same URI share one connection unless dedicated;
+        call disconnect() when done to release it.
+        
         Args:
             uri: libvirt connection URI (default: qemu:///system)
+            dedicated: Use a private connection (for long-running workers)
         """
         self.uri = uri or config.DEFAULT_LIBVIRT_URI
-        self._conn: Optional[libvirt.virConnect] = None
+        self._dedicated = dedicated
+        self._domains = None
+        self._admission = None
+        self._connections: Optional[ConnectionManager] = connection_manager.acquire(self.uri, dedicated)
         self.connect()
     
     def __del__(self):
@@ -33,42 +60,49 @@ class LibvirtManager:
         Returns:
             bool: True if successful, False otherwise
         """
-        try:
-            if self._conn and self._conn.isAlive():
-                return True
-            
-            logger.info(f"Connecting to libvirt at {self.uri}")
-            self._conn = libvirt.open(self.uri)
-            
-            if self._conn is None:
-                logger.error("Failed to open connection to libvirt")
-                return False
-            
-            logger.info(f"Connected to hypervisor: {self._conn.getType()}")
-            logger.info(f"Hypervisor version: {self._conn.getVersion()}")
-            return True
-            
-        except libvirt.libvirtError as e:
-            logger.error(f"Libvirt connection error: {e}")
-            return False
+        return self.connection is not None
     
     def disconnect(self):
-        """Close libvirt connection"""
-        if self._conn:
-            try:
-                self._conn.close()
-                logger.info("Disconnected from libvirt")
-            except Exception as e:
-                logger.error(f"Error disconnecting: {e}")
-            finally:
-                self._conn = None
+        """Release this manager's reference to the connection"""
+        domains, self._domains = getattr(self, '_domains', None), None
+        if domains is not None:
+            domains.close()
+        connections, self._connections = getattr(self, '_connections', None), None
+        if connections is not None:
+            connection_manager.release(connections)
+    
+    @property
+    def is_local(self) -> bool:
+        """Whether the hypervisor runs on this machine (no remote host in the URI)"""
+        return not urlparse(self.uri).hostname
+    
+    @property
+    def connections(self) -> ConnectionManager:
+        """Connection manager, re-acquired if this manager was disconnected"""
+        if self._connections is None:
+            self._connections = connection_manager.acquire(self.uri, self._dedicated)
+        return self._connections
+    
+    @property
+    def domains(self) -> 'DomainRegistry':
+        """Cache of domain handles and parsed XML, created on first use"""
+        if self._domains is None:
+            from backend.domain_registry import DomainRegistry
+            self._domains = DomainRegistry(self)
+        return self._domains
+    
+    @property
+    def admission(self) -> 'AdmissionController':
+        """Memory admission checks for starts on this host, created on first use"""
+        if self._admission is None:
+            from backend.admission import AdmissionController
+            self._admission = AdmissionController(self)
+        return self._admission
     
     @property
     def connection(self) -> Optional[libvirt.virConnect]:
-        """Get active libvirt connection"""
-        if not self._conn or not self._conn.isAlive():
-            self.connect()
-        return self._conn
+        """Get active libvirt connection (None while libvirt is unreachable)"""
+        return self.connections.connection()
     
     def list_all_vms(self) -> List[libvirt.virDomain]:
         """
@@ -81,7 +115,9 @@ class LibvirtManager:
             if not self.connection:
                 return []
             
+            _LIST_CALLS.inc()
             domains = self.connection.listAllDomains()
+            DOMAINS.set(len(domains))
             logger.debug(f"Found {len(domains)} VMs")
             return domains
             
@@ -100,6 +136,7 @@ class LibvirtManager:
             libvirt domain object or None
         """
         try:
+            LIBVIRT_CALLS.labels('lookupByName').inc()
             return self.connection.lookupByName(name)
         except libvirt.libvirtError:
             logger.warning(f"VM '{name}' not found")
@@ -116,6 +153,7 @@ class LibvirtManager:
             libvirt domain object or None
         """
         try:
+            LIBVIRT_CALLS.labels('lookupByUUIDString').inc()
             return self.connection.lookupByUUIDString(uuid)
         except libvirt.libvirtError:
             logger.warning(f"VM with UUID '{uuid}' not found")
@@ -132,6 +170,7 @@ class LibvirtManager:
             libvirt domain object or None
         """
         try:
+            LIBVIRT_CALLS.labels('defineXML').inc()
             domain = self.connection.defineXML(xml)
             logger.info(f"VM '{domain.name()}' created successfully")
             return domain
@@ -143,6 +182,9 @@ class LibvirtManager:
         """
         Delete a VM
         
+        Storage is removed by a background disk job (kind "reclaim") whose
+        result is the number of bytes reclaimed, so this returns immediately.
+        
         Args:
             domain: libvirt domain object
             remove_storage: Also remove associated storage
@@ -158,28 +200,39 @@ class LibvirtManager:
                 logger.info(f"Stopping VM '{vm_name}' before deletion")
                 domain.destroy()
             
-            # Remove storage volumes if requested
-            if remove_storage:
-                self._remove_vm_storage(domain)
+            # Storage is removed from the local filesystem, so only for local VMs
+            if remove_storage and not self.is_local:
+                logger.warning(f"Keeping storage of '{vm_name}': it is on remote host {self.uri}")
+                remove_storage = False
+            
+            # The definition and snapshot metadata are gone after the
+            # undefine; the reclaim job plans from what is read here
+            document, snapshots = self._read_definition(domain) if remove_storage else (None, [])
             
-            # Undefine VM
-            domain.undefine()
+            # Undefine VM with its snapshot/checkpoint metadata (libvirt refuses
+            # otherwise). NVRAM lives in our store, so keep libvirt's hands off it.
+            domain.undefineFlags(
+                libvirt.VIR_DOMAIN_UNDEFINE_KEEP_NVRAM
+                | libvirt.VIR_DOMAIN_UNDEFINE_SNAPSHOTS_METADATA
+                | getattr(libvirt, 'VIR_DOMAIN_UNDEFINE_CHECKPOINTS_METADATA', 0)
+            )
             logger.info(f"VM '{vm_name}' deleted successfully")
+            
+            if document is not None:
+                StorageReclaimer(self.connection, self.domains).submit(document, snapshots)
             return True
             
         except libvirt.libvirtError as e:
             logger.error(f"Failed to delete VM: {e}")
             return False
     
-    def _remove_vm_storage(self, domain: libvirt.virDomain):
-        """Remove storage volumes associated with VM"""
+    def _read_definition(self, domain: libvirt.virDomain) -> Tuple[Optional[DomainDocument], List[str]]:
+        """Read the persistent XML and snapshot files of a VM whose storage is about to be removed"""
         try:
-            xml_desc = domain.XMLDesc(0)
-            # Parse XML and find disk paths
-            # This is a simplified version - full implementation would parse XML
-            logger.debug(f"Storage cleanup for {domain.name()}")
-        except Exception as e:
+            return self.domains.document(domain, XML_INACTIVE), snapshot_files(domain)
+        except (libvirt.libvirtError, ET.ParseError) as e:
             logger.warning(f"Could not remove storage: {e}")
+            return None, []
     
     def get_storage_pool(self, pool_name: str = "default"):
         """Get storage pool by name"""
@@ -188,7 +241,3 @@ class LibvirtManager:
         except libvirt.libvirtError:
             logger.warning(f"Storage pool '{pool_name}' not found")
             return None
-    
-    def __del__(self):
-        """Cleanup on deletion"""
-        self.disconnect()
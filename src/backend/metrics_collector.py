@@ -0,0 +1,252 @@
+"""
+Metrics collector - Per-VM time series from getAllDomainStats
+
+One getAllDomainStats call per tick returns the counters of every running
+domain, so sampling costs a single RPC however many VMs there are. Raw
+counters are kept only for the previous tick; derived series (CPU %,
+balloon size, disk and network rates) go into fixed-size NumPy ring
+buffers of shape (metrics, domains, capacity). Rates for all domains are
+computed with one vectorized operation per tick, and memory stays bounded
+by the number of domains times the history length, regardless of uptime.
+
+Samples a domain was not running for are NaN.
+"""
+
+import threading
+import time
+from typing import Dict, List, Optional
+
+import libvirt
+import numpy as np
+
+from backend.libvirt_manager import LibvirtManager
+from utils.logger import logger
+import config
+
+
+# Derived series, in buffer order
+METRICS = (
+    'cpu_percent',      # of the domain's vCPUs
+    'balloon_mib',      # current balloon size
+    'disk_read_bps',
+    'disk_write_bps',
+    'net_rx_bps',
+    'net_tx_bps',
+)
+
+# Raw counters read from each stats record, in matrix column order
+_CPU_TIME, _VCPUS, _BALLOON, _RD, _WR, _RX, _TX = range(7)
+
+STATS = (
+    libvirt.VIR_DOMAIN_STATS_CPU_TOTAL
+    | libvirt.VIR_DOMAIN_STATS_BALLOON
+    | libvirt.VIR_DOMAIN_STATS_VCPU
+    | libvirt.VIR_DOMAIN_STATS_BLOCK
+    | libvirt.VIR_DOMAIN_STATS_INTERFACE
+)
+
+
+def _device_sum(stats: Dict, group: str, field: str) -> int:
+    """Sum a per-device counter (block.N.rd.bytes, net.N.rx.bytes, ...)"""
+    return sum(stats.get(f'{group}.{index}.{field}', 0) for index in range(stats.get(f'{group}.count', 0)))
+
+
+def _raw_counters(stats: Dict) -> List[float]:
+    return [
+        stats.get('cpu.time', 0),
+        stats.get('vcpu.current', 1),
+        stats.get('balloon.current', 0),
+        _device_sum(stats, 'block', 'rd.bytes'),
+        _device_sum(stats, 'block', 'wr.bytes'),
+        _device_sum(stats, 'net', 'rx.bytes'),
+        _device_sum(stats, 'net', 'tx.bytes'),
+    ]
+
+
+class MetricsCollector:
+    """Samples all domains periodically into per-domain ring buffers"""
+
+    def __init__(
+        self,
+        manager: LibvirtManager,
+        interval: Optional[float] = None,
+        capacity: Optional[int] = None
+    ):
+        """
+        Args:
+            manager: LibvirtManager instance
+            interval: Seconds between samples
+            capacity: Samples kept per domain and metric
+        """
+        self.manager = manager
+        self.interval = interval or config.METRICS_INTERVAL
+        self.capacity = capacity or config.METRICS_HISTORY
+
+        self._lock = threading.Lock()
+        self._rows: Dict[str, int] = {}  # domain UUID -> buffer row
+        self._free_rows: List[int] = []
+        self._last_seen = np.zeros(0, dtype=np.int64)  # tick a row was last sampled
+        self._series = np.full((len(METRICS), 0, self.capacity), np.nan, dtype=np.float32)
+        self._previous = np.full((0, _TX + 1), np.nan)  # raw counters of the last tick
+        self._previous_time = np.full(0, np.nan)
+        self._times = np.full(self.capacity, np.nan)  # wall clock per slot
+        self._head = 0  # next slot to write
+        self._ticks = 0
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------------------------------------------------------
+    # Buffers
+    # ------------------------------------------------------------------
+
+    def _grow(self, rows: int):
+        """Add rows (caller holds the lock)"""
+        old = self._previous.shape[0]
+        self._series = np.concatenate(
+            [self._series, np.full((len(METRICS), rows, self.capacity), np.nan, dtype=np.float32)], axis=1
+        )
+        self._previous = np.concatenate([self._previous, np.full((rows, _TX + 1), np.nan)])
+        self._previous_time = np.concatenate([self._previous_time, np.full(rows, np.nan)])
+        self._last_seen = np.concatenate([self._last_seen, np.zeros(rows, dtype=np.int64)])
+        self._free_rows.extend(range(old + rows - 1, old - 1, -1))
+
+    def _row_for(self, uuid: str) -> int:
+        row = self._rows.get(uuid)
+        if row is None:
+            if not self._free_rows:
+                self._grow(max(8, self._previous.shape[0]))
+            row = self._free_rows.pop()
+            self._rows[uuid] = row
+            self._series[:, row, :] = np.nan
+            self._previous[row] = np.nan
+            self._previous_time[row] = np.nan
+        return row
+
+    def _release_stale_rows(self):
+        """Recycle rows of domains whose whole history has aged out"""
+        for uuid, row in list(self._rows.items()):
+            if self._ticks - self._last_seen[row] > self.capacity:
+                del self._rows[uuid]
+                self._free_rows.append(row)
+
+    @property
+    def memory_bytes(self) -> int:
+        """Size of all buffers"""
+        return self._series.nbytes + self._previous.nbytes + self._previous_time.nbytes + self._times.nbytes
+
+    # ------------------------------------------------------------------
+    # Sampling
+    # ------------------------------------------------------------------
+
+    def sample(self) -> int:
+        """
+        Take one sample of all running domains
+
+        Returns:
+            Number of domains sampled
+        """
+        conn = self.manager.connection
+        if conn is None:
+            return 0
+        try:
+            records = conn.getAllDomainStats(STATS, libvirt.VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE)
+        except libvirt.libvirtError as e:
+            logger.warning(f"Failed to sample domain stats: {e}")
+            return 0
+        now = time.monotonic()
+        raw = np.array([_raw_counters(stats) for _, stats in records], dtype=np.float64).reshape(-1, _TX + 1)
+
+        with self._lock:
+            rows = np.array([self._row_for(domain.UUIDString()) for domain, _ in records], dtype=np.intp)
+            column = np.full((len(METRICS), self._previous.shape[0]), np.nan, dtype=np.float32)
+
+            if len(rows):
+                elapsed = now - self._previous_time[rows]
+                delta = raw - self._previous[rows]
+                # Counters restart from zero when a domain reboots its QEMU process
+                delta[delta < 0] = np.nan
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    column[0, rows] = delta[:, _CPU_TIME] / (elapsed * 1e9 * np.maximum(raw[:, _VCPUS], 1)) * 100
+                    column[1, rows] = raw[:, _BALLOON] / 1024
+                    column[2:, rows] = (delta[:, _RD:] / elapsed[:, None]).T
+
+                self._previous[rows] = raw
+                self._previous_time[rows] = now
+                self._last_seen[rows] = self._ticks
+
+            # Domains missing this tick start over when they come back
+            absent = np.ones(self._previous.shape[0], dtype=bool)
+            absent[rows] = False
+            self._previous_time[absent] = np.nan
+
+            self._series[:, :, self._head] = column
+            self._times[self._head] = time.time()
+            self._head = (self._head + 1) % self.capacity
+            self._ticks += 1
+            if self._ticks % self.capacity == 0:
+                self._release_stale_rows()
+
+        return len(records)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _ordered(self, values: np.ndarray) -> np.ndarray:
+        """Ring contents from oldest to newest sample"""
+        count = min(self._ticks, self.capacity)
+        return np.roll(values, -self._head, axis=-1)[..., self.capacity - count:]
+
+    def history(self, uuid: str) -> Dict[str, np.ndarray]:
+        """
+        Get all series of a domain, oldest sample first
+
+        Returns:
+            Map of metric name to a copy of its samples (empty if unknown)
+        """
+        with self._lock:
+            row = self._rows.get(uuid)
+            if row is None:
+                return {}
+            series = self._ordered(self._series[:, row, :])
+        return dict(zip(METRICS, series))
+
+    def latest(self, uuid: str) -> Dict[str, float]:
+        """Most recent value of each metric (NaN if not sampled last tick)"""
+        with self._lock:
+            row = self._rows.get(uuid)
+            if row is None or self._ticks == 0:
+                return {}
+            values = self._series[:, row, (self._head - 1) % self.capacity]
+        return {metric: float(value) for metric, value in zip(METRICS, values)}
+
+    def timestamps(self) -> np.ndarray:
+        """Wall clock time of each sample, oldest first"""
+        with self._lock:
+            return self._ordered(self._times)
+
+    # ------------------------------------------------------------------
+    # Background sampling
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Sample every interval on a background thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name="metrics-collector")
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling; collected history is kept"""
+        self._stop.set()
+
+    def _loop(self):
+        while True:
+            try:
+                self.sample()
+            except Exception:
+                logger.exception("Metrics sampling failed")
+            if self._stop.wait(self.interval):
+                return
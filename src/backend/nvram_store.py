@@ -0,0 +1,121 @@
+"""
+NVRAM Store - Per-VM OVMF vars files keyed by domain UUID
+
+Vars files are cloned from the OVMF template with a FICLONE reflink where
+the filesystem supports it (btrfs, XFS, bcachefs), so creating many VMs is
+a metadata-only operation. Other filesystems fall back to a sparse copy.
+"""
+
+import errno
+import fcntl
+import os
+from pathlib import Path
+from typing import Optional
+
+from backend.host_capabilities import find_ovmf_vars_template
+from utils.logger import logger
+import config
+
+
+# ioctl request number for FICLONE (_IOW(0x94, 9, int))
+FICLONE = 0x40049409
+
+# Block size used when scanning for holes during sparse copies
+SPARSE_BLOCK_SIZE = 64 * 1024
+
+VARS_SUFFIX = "_VARS.fd"
+
+
+def clone_file(source: Path, destination: Path) -> str:
+    """
+    Clone a file, preferring a copy-on-write reflink
+
+    Args:
+        source: File to clone
+        destination: New file path (must not exist)
+
+    Returns:
+        "reflink" or "sparse" depending on the method used
+    """
+    with open(source, 'rb') as src, open(destination, 'xb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return "reflink"
+        except OSError as e:
+            if e.errno not in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV,
+                               errno.EINVAL, errno.ENOSYS, errno.EPERM):
+                raise
+
+        size = os.fstat(src.fileno()).st_size
+        zero_block = bytes(SPARSE_BLOCK_SIZE)
+        while True:
+            block = src.read(SPARSE_BLOCK_SIZE)
+            if not block:
+                break
+            if block == zero_block[:len(block)]:
+                dst.seek(len(block), os.SEEK_CUR)
+            else:
+                dst.write(block)
+        dst.truncate(size)
+    return "sparse"
+
+
+class NVRAMStore:
+    """Manages per-domain OVMF vars files"""
+
+    def __init__(self, nvram_dir: Path = None):
+        self.nvram_dir = Path(nvram_dir or config.NVRAM_DIR)
+        self.nvram_dir.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, domain_uuid: str) -> Path:
+        """Get the vars file path for a domain UUID"""
+        return self.nvram_dir / f"{domain_uuid}{VARS_SUFFIX}"
+
+    def create(self, domain_uuid: str, template: Optional[str] = None) -> str:
+        """
+        Create the vars file for a domain if it does not exist yet
+
+        Args:
+            domain_uuid: Domain UUID string
+            template: Vars file to clone (default: system OVMF template)
+
+        Returns:
+            Full path to the vars file
+        """
+        nvram_path = self.path_for(domain_uuid)
+        if nvram_path.exists():
+            return str(nvram_path)
+
+        template = template or find_ovmf_vars_template()
+        if not template:
+            logger.warning("OVMF vars template not found; boot may fail.")
+            return str(nvram_path)
+
+        try:
+            method = clone_file(Path(template), nvram_path)
+            logger.info(f"Cloned OVMF vars for {domain_uuid} ({method})")
+        except FileExistsError:
+            pass
+        except OSError as e:
+            logger.error(f"Failed to clone OVMF vars template: {e}")
+            nvram_path.unlink(missing_ok=True)
+        return str(nvram_path)
+
+    def remove(self, domain_uuid: str) -> int:
+        """
+        Remove a domain's vars file
+
+        Returns:
+            Number of bytes freed
+        """
+        nvram_path = self.path_for(domain_uuid)
+        try:
+            freed = nvram_path.stat().st_blocks * 512
+            nvram_path.unlink()
+            logger.info(f"Removed NVRAM vars for {domain_uuid}")
+            return freed
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            logger.warning(f"Could not remove NVRAM vars {nvram_path}: {e}")
+            return 0
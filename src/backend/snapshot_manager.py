@@ -0,0 +1,445 @@
+"""
+Snapshot Manager - External and internal VM snapshots with fast revert
+
+External snapshots freeze the current disk images and redirect writes into
+new qcow2 overlays, so creating one is instant regardless of disk size.
+Quick revert throws the active overlays away and recreates them empty on
+top of the same backing images, which resets a test guest in milliseconds.
+
+Memory state can only be saved for VMs without PCI passthrough: VFIO
+devices cannot be migrated, so QEMU cannot serialize their state.
+"""
+
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import libvirt
+
+from backend.disk_jobs import DiskJob, disk_jobs
+from backend.disk_manager import DiskManager
+from backend.disk_metadata import disk_metadata
+from backend.domain_xml import DomainDocument, XML_INACTIVE
+from backend.libvirt_manager import LibvirtManager
+from utils.logger import logger
+import config
+
+
+SNAPSHOT_NAME_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*$')
+
+
+@dataclass
+class SnapshotInfo:
+    """Snapshot summary"""
+    name: str
+    description: str
+    created: int  # unix time
+    state: str  # domain state when taken
+    external: bool
+    has_memory: bool
+    is_current: bool
+    parent: Optional[str]
+    overlays: Dict[str, str] = field(default_factory=dict)  # disk target -> overlay path
+
+
+class SnapshotManager:
+    """Creates, lists, reverts and deletes VM snapshots"""
+
+    def __init__(self, manager: LibvirtManager, disk_manager: Optional[DiskManager] = None, controller=None):
+        """
+        Args:
+            manager: LibvirtManager instance
+            disk_manager: DiskManager instance (created if omitted)
+            controller: VMController that starts reverted VMs (created if omitted)
+        """
+        self.manager = manager
+        self.disk_manager = disk_manager or DiskManager()
+        self._controller = controller
+
+    @property
+    def controller(self):
+        """VMController used to start VMs, so starts go through admission and metrics"""
+        if self._controller is None:
+            from backend.vm_controller import VMController  # imports this module
+            self._controller = VMController(self.manager)
+        return self._controller
+
+    # ------------------------------------------------------------------
+    # Listing
+    # ------------------------------------------------------------------
+
+    def _parse(self, snapshot: libvirt.virDomainSnapshot) -> SnapshotInfo:
+        root = ET.fromstring(snapshot.getXMLDesc(0))
+        memory = root.find('memory')
+        memory_mode = memory.get('snapshot') if memory is not None else None
+
+        overlays = {}
+        for disk in root.findall('disks/disk'):
+            if disk.get('snapshot') != 'external':
+                continue
+            source = disk.find('source')
+            if source is not None and source.get('file'):
+                overlays[disk.get('name')] = source.get('file')
+
+        external = bool(overlays) or memory_mode == 'external'
+        return SnapshotInfo(
+            name=root.findtext('name'),
+            description=root.findtext('description', ''),
+            created=int(root.findtext('creationTime', '0')),
+            state=root.findtext('state', ''),
+            external=external,
+            has_memory=memory_mode in ('internal', 'external') or (
+                not external and root.findtext('state') in ('running', 'paused')
+            ),
+            is_current=snapshot.isCurrent() == 1,
+            parent=root.findtext('parent/name'),
+            overlays=overlays
+        )
+
+    def list_snapshots(self, domain: libvirt.virDomain) -> List[SnapshotInfo]:
+        """
+        List a VM's snapshots, oldest first
+
+        Returns:
+            List of SnapshotInfo
+        """
+        try:
+            snapshots = [self._parse(s) for s in domain.listAllSnapshots(0)]
+        except libvirt.libvirtError as e:
+            logger.error(f"Failed to list snapshots of '{domain.name()}': {e}")
+            return []
+        return sorted(snapshots, key=lambda s: s.created)
+
+    def get_snapshot(self, domain: libvirt.virDomain, name: str) -> Optional[SnapshotInfo]:
+        """Get one snapshot by name"""
+        try:
+            return self._parse(domain.snapshotLookupByName(name, 0))
+        except libvirt.libvirtError:
+            logger.error(f"Snapshot '{name}' not found for VM '{domain.name()}'")
+            return None
+
+    # ------------------------------------------------------------------
+    # Create
+    # ------------------------------------------------------------------
+
+    def create_snapshot(
+        self,
+        domain: libvirt.virDomain,
+        name: str,
+        description: str = "",
+        memory: Optional[bool] = None,
+        internal: bool = False,
+        quiesce: bool = False
+    ) -> Optional[SnapshotInfo]:
+        """
+        Take a snapshot
+
+        Args:
+            domain: libvirt domain object
+            name: Snapshot name (letters, digits, '.', '_', '-')
+            description: Free-form description
+            memory: Save RAM and device state (default: only if the VM is
+                    running and has no PCI passthrough)
+            internal: Use qcow2-internal snapshots instead of overlays
+                      (not supported by libvirt for UEFI pflash VMs)
+            quiesce: Freeze guest filesystems through the guest agent
+
+        Returns:
+            SnapshotInfo or None on failure
+        """
+        if not SNAPSHOT_NAME_PATTERN.match(name):
+            logger.error(f"Invalid snapshot name: {name!r}")
+            return None
+
+        try:
+            document = DomainDocument.from_domain(domain, XML_INACTIVE)
+            running = domain.isActive() == 1
+        except libvirt.libvirtError as e:
+            logger.error(f"Failed to read VM '{domain.name()}': {e}")
+            return None
+
+        passthrough = document.has_pci_hostdev()
+        if memory is None:
+            memory = running and not passthrough
+        if memory and passthrough:
+            logger.error(
+                f"VM '{document.name}' uses PCI passthrough; VFIO device state cannot "
+                "be saved, so only disk-only snapshots are possible"
+            )
+            return None
+        if memory and not running:
+            logger.error(f"VM '{document.name}' is not running; there is no memory state to save")
+            return None
+
+        root = ET.Element('domainsnapshot')
+        ET.SubElement(root, 'name').text = name
+        if description:
+            ET.SubElement(root, 'description').text = description
+
+        flags = 0
+        if internal:
+            # Internal snapshots of a running VM always include its memory
+            if running and not memory:
+                logger.error("Internal snapshots of a running VM must include memory; use an external snapshot")
+                return None
+        else:
+            flags |= libvirt.VIR_DOMAIN_SNAPSHOT_CREATE_ATOMIC
+            if memory:
+                config.SNAPSHOTS_DIR.mkdir(parents=True, exist_ok=True)
+                memory_file = config.SNAPSHOTS_DIR / f"{document.uuid}-{name}.mem"
+                ET.SubElement(root, 'memory', {'snapshot': 'external', 'file': str(memory_file)})
+            else:
+                flags |= libvirt.VIR_DOMAIN_SNAPSHOT_CREATE_DISK_ONLY
+                ET.SubElement(root, 'memory', {'snapshot': 'no'})
+
+            disks = ET.SubElement(root, 'disks')
+            for disk in document.disks():
+                if not disk.target:
+                    continue
+                if disk.device != 'disk' or not disk.source:
+                    ET.SubElement(disks, 'disk', {'name': disk.target, 'snapshot': 'no'})
+                    continue
+                overlay = Path(disk.source).parent / f"{document.name}-{disk.target}-{name}.qcow2"
+                element = ET.SubElement(disks, 'disk', {'name': disk.target, 'snapshot': 'external'})
+                ET.SubElement(element, 'driver', {'type': 'qcow2'})
+                ET.SubElement(element, 'source', {'file': str(overlay)})
+
+        if quiesce and running:
+            flags |= libvirt.VIR_DOMAIN_SNAPSHOT_CREATE_QUIESCE
+
+        try:
+            snapshot = domain.snapshotCreateXML(ET.tostring(root, encoding='unicode'), flags)
+        except libvirt.libvirtError as e:
+            logger.error(f"Failed to create snapshot '{name}' of '{document.name}': {e}")
+            return None
+        # External snapshots moved the disks onto new overlays
+        self.manager.domains.invalidate(document.uuid)
+
+        logger.info(f"Snapshot '{name}' of VM '{document.name}' created")
+        return self._parse(snapshot)
+
+    # ------------------------------------------------------------------
+    # Revert
+    # ------------------------------------------------------------------
+
+    def revert_snapshot(
+        self,
+        domain: libvirt.virDomain,
+        name: str,
+        start: Optional[bool] = None
+    ) -> bool:
+        """
+        Revert to a snapshot through libvirt
+
+        Memory snapshots resume where they were taken. Reverting external
+        snapshots needs libvirt 9.9 or newer; for the newest disk-only
+        snapshot, quick_revert() works everywhere and is faster.
+
+        Args:
+            domain: libvirt domain object
+            name: Snapshot to revert to
+            start: Force the VM running (True) or paused/stopped as recorded (None)
+
+        Returns:
+            bool: Success status
+        """
+        flags = libvirt.VIR_DOMAIN_SNAPSHOT_REVERT_RUNNING if start else 0
+        try:
+            snapshot = domain.snapshotLookupByName(name, 0)
+            domain.revertToSnapshot(snapshot, flags)
+            logger.info(f"VM '{domain.name()}' reverted to snapshot '{name}'")
+            return True
+        except libvirt.libvirtError as e:
+            logger.error(f"Failed to revert '{domain.name()}' to '{name}': {e}")
+            return False
+        finally:
+            # The definition (disk sources included) may have changed
+            self.manager.domains.invalidate(domain.UUIDString())
+
+    def quick_revert(self, domain: libvirt.virDomain, start: bool = False) -> bool:
+        """
+        Reset a VM to its current external snapshot by recreating the overlays
+
+        Any running guest is powered off hard and memory state is not
+        restored; the VM cold-boots from the snapshot's disk state.
+
+        Args:
+            domain: libvirt domain object
+            start: Start the VM again afterwards
+
+        Returns:
+            bool: Success status
+        """
+        started = time.monotonic()
+        try:
+            vm_name = domain.name()
+            snapshot = domain.snapshotCurrent(0)
+            info = self._parse(snapshot)
+            if snapshot.numChildren(0):
+                logger.error(f"Snapshot '{info.name}' has children; quick revert only applies to the newest snapshot")
+                return False
+            document = DomainDocument.from_domain(domain, XML_INACTIVE)
+        except libvirt.libvirtError as e:
+            logger.error(f"Quick revert failed: {e}")
+            return False
+
+        if not info.overlays:
+            logger.error(f"Snapshot '{info.name}' has no external disk overlays")
+            return False
+
+        sources = {d.target: d.source for d in document.disks()}
+        for target, overlay in info.overlays.items():
+            if sources.get(target) != overlay:
+                logger.error(f"Disk {target} of '{vm_name}' no longer uses overlay {overlay}")
+                return False
+
+        # Resolve backing files before touching anything
+        backings = {}
+        for overlay in info.overlays.values():
+            metadata = disk_metadata.get(overlay)
+            if metadata is None or not metadata.backing_file:
+                logger.error(f"Cannot read backing file of {overlay}")
+                return False
+            backings[overlay] = (
+                metadata.backing_file,
+                metadata.raw.get('backing-filename-format', 'qcow2')
+            )
+
+        try:
+            if domain.isActive():
+                domain.destroy()
+        except libvirt.libvirtError as e:
+            logger.error(f"Failed to stop '{vm_name}': {e}")
+            return False
+
+        for overlay, (backing, backing_format) in backings.items():
+            fresh = overlay + ".new"
+            Path(fresh).unlink(missing_ok=True)
+            if not self.disk_manager.create_overlay(fresh, backing, backing_format):
+                return False
+            os.replace(fresh, overlay)
+            disk_metadata.invalidate(overlay)
+
+        logger.info(
+            f"VM '{vm_name}' reset to snapshot '{info.name}' "
+            f"in {(time.monotonic() - started) * 1000:.0f} ms"
+        )
+
+        if start:
+            from backend.admission import AdmissionError
+
+            try:
+                return self.controller.start_vm(domain)
+            except AdmissionError as e:
+                logger.error(f"Failed to start '{vm_name}' after revert: {e}")
+                return False
+        return True
+
+    # ------------------------------------------------------------------
+    # Delete
+    # ------------------------------------------------------------------
+
+    def delete_snapshot(self, domain: libvirt.virDomain, name: str) -> bool:
+        """
+        Delete a snapshot, keeping the VM's current state
+
+        libvirt handles internal snapshots and, from 9.0, external ones.
+        On older versions the newest external snapshot of a stopped VM is
+        removed by committing its overlays into their backing images in
+        background disk jobs.
+
+        Returns:
+            bool: True if deleted (or the commit jobs were started)
+        """
+        try:
+            snapshot = domain.snapshotLookupByName(name, 0)
+            info = self._parse(snapshot)
+        except libvirt.libvirtError as e:
+            logger.error(f"Snapshot '{name}' not found: {e}")
+            return False
+
+        try:
+            snapshot.delete(0)
+            self.manager.domains.invalidate(domain.UUIDString())
+            self._remove_memory_file(domain, name)
+            logger.info(f"Snapshot '{name}' of VM '{domain.name()}' deleted")
+            return True
+        except libvirt.libvirtError as e:
+            if not info.external:
+                logger.error(f"Failed to delete snapshot '{name}': {e}")
+                return False
+            logger.debug(f"libvirt cannot delete external snapshot '{name}': {e}")
+
+        return self._commit_external(domain, snapshot, info) is not None
+
+    def _commit_external(
+        self,
+        domain: libvirt.virDomain,
+        snapshot: libvirt.virDomainSnapshot,
+        info: SnapshotInfo
+    ) -> Optional[List[DiskJob]]:
+        """Merge the newest external snapshot's overlays back into their bases"""
+        try:
+            if domain.isActive():
+                logger.error("Shut down the VM to delete external snapshots on this libvirt version")
+                return None
+            if not info.is_current or snapshot.numChildren(0):
+                logger.error(f"Only the newest external snapshot can be deleted ('{info.name}' is not)")
+                return None
+            document = DomainDocument.from_domain(domain, XML_INACTIVE)
+        except libvirt.libvirtError as e:
+            logger.error(f"Failed to delete snapshot '{info.name}': {e}")
+            return None
+
+        sources = {d.target: d.source for d in document.disks()}
+        backings = {}
+        for target, overlay in info.overlays.items():
+            metadata = disk_metadata.get(overlay)
+            if sources.get(target) != overlay or metadata is None or not metadata.backing_file:
+                logger.error(f"Disk {target} is not on snapshot overlay {overlay}")
+                return None
+            backings[target] = (
+                overlay,
+                metadata.backing_file,
+                metadata.raw.get('backing-filename-format')
+            )
+
+        # Drop the restore point first; if a commit fails the VM simply
+        # keeps running on its (still valid) overlay
+        try:
+            snapshot.delete(libvirt.VIR_DOMAIN_SNAPSHOT_DELETE_METADATA_ONLY)
+        except libvirt.libvirtError as e:
+            logger.error(f"Failed to delete snapshot metadata: {e}")
+            return None
+        self._remove_memory_file(domain, info.name)
+
+        registry = self.manager.domains
+        jobs = []
+        for target, (overlay, backing, backing_format) in backings.items():
+            def repoint(job: DiskJob, target=target, overlay=overlay,
+                        backing=backing, backing_format=backing_format):
+                with registry.edit(domain) as doc:
+                    doc.set_disk_source(target, backing, backing_format)
+                os.unlink(overlay)
+                disk_metadata.invalidate(overlay)
+                disk_metadata.invalidate(backing)
+                return True
+
+            jobs.append(disk_jobs.submit_commit(overlay, on_success=repoint))
+
+        logger.info(f"Committing snapshot '{info.name}' of VM '{domain.name()}' in the background")
+        return jobs
+
+    def _remove_memory_file(self, domain: libvirt.virDomain, name: str):
+        """Remove our external memory state file for a snapshot, if any"""
+        memory_file = config.SNAPSHOTS_DIR / f"{domain.UUIDString()}-{name}.mem"
+        try:
+            memory_file.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove {memory_file}: {e}")
@@ -0,0 +1,264 @@
+"""
+Startup checks - System requirements verified concurrently and cached
+
+The individual probes (package binaries, group membership, libvirtd,
+/dev/kvm, IOMMU groups, KVM module) are independent, so they run on a
+thread pool; results are then evaluated in priority order so the reported
+problem is the same one a sequential check would have found first.
+
+Passing results are cached in a file keyed by the kernel boot ID and a
+fingerprint of the installed packages, so an unchanged host skips probing
+entirely. A cache hit is revalidated in the background.
+"""
+
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from backend.dependency_checker import DependencyChecker
+from backend.system_checker import SystemChecker
+from utils.logger import logger
+import config
+
+
+IOMMU_WARNING = (
+    "IOMMU is not enabled. GPU passthrough will not work. "
+    "Enable IOMMU in BIOS and add 'intel_iommu=on' or 'amd_iommu=on' to kernel parameters."
+)
+
+CACHE_FILE = config.CACHE_DIR / "startup_checks.json"
+CACHE_FORMAT = 1
+
+BOOT_ID_PATH = "/proc/sys/kernel/random/boot_id"
+
+# Package databases whose mtime changes whenever packages are (un)installed
+PACKAGE_DATABASES = [
+    "/var/lib/dpkg/status",
+    "/var/lib/rpm/rpmdb.sqlite",
+    "/var/lib/rpm/Packages",
+    "/var/lib/pacman/local",
+]
+
+
+@dataclass
+class StartupCheckResult:
+    """Outcome of the startup checks"""
+    ok: bool
+    error: str = ""
+    warnings: List[str] = field(default_factory=list)
+    kvm_module: str = "unknown"
+    cached: bool = False
+
+
+def _mtime(path) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def host_fingerprint() -> Dict:
+    """
+    Cheap description of everything the probes depend on
+
+    Uses only stat() calls: the boot ID (modules, services, /dev/kvm),
+    package database and binary mtimes (installed versions) and
+    /etc/group (group membership).
+    """
+    try:
+        with open(BOOT_ID_PATH) as f:
+            boot_id = f.read().strip()
+    except OSError:
+        boot_id = None
+
+    binaries = {}
+    for binary in DependencyChecker.REQUIRED_PACKAGES:
+        path = shutil.which(binary)
+        binaries[binary] = [path, _mtime(path)] if path else None
+
+    return {
+        'boot_id': boot_id,
+        'uid': os.getuid(),
+        'user': os.getenv('USER'),
+        'app_version': config.APP_VERSION,
+        'packages': {db: _mtime(db) for db in PACKAGE_DATABASES if os.path.exists(db)},
+        'binaries': binaries,
+        'groups': _mtime('/etc/group'),
+    }
+
+
+def probe_system(max_workers: int = 6) -> Dict:
+    """
+    Run all probes concurrently
+
+    Returns:
+        JSON-serializable probe results
+    """
+    dependency_checker = DependencyChecker()
+    system_checker = SystemChecker()
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="startup-check") as executor:
+        dependencies = executor.submit(dependency_checker.check_all_dependencies)
+        groups = executor.submit(dependency_checker.check_user_groups)
+        libvirtd = executor.submit(system_checker.is_libvirt_running)
+        kvm = executor.submit(system_checker.has_kvm_support)
+        iommu = executor.submit(system_checker.has_iommu_enabled)
+        kvm_module = executor.submit(system_checker.get_kvm_module)
+
+    return {
+        'missing_packages': dependencies.result()[1],
+        'missing_groups': groups.result()[1],
+        'libvirtd_running': libvirtd.result(),
+        'kvm_available': kvm.result(),
+        'iommu_enabled': iommu.result(),
+        'kvm_module': kvm_module.result(),
+    }
+
+
+def evaluate(probes: Dict) -> StartupCheckResult:
+    """Turn probe results into the first blocking problem (if any)"""
+    kvm_module = probes.get('kvm_module', 'unknown')
+
+    # Check system dependencies
+    missing_packages = probes['missing_packages']
+    if missing_packages:
+        install_cmd = DependencyChecker().get_install_command(missing_packages)
+        return StartupCheckResult(False, (
+            f"Missing required packages:\n\n{', '.join(missing_packages)}\n\n"
+            f"Install them with:\n{install_cmd}"
+        ), kvm_module=kvm_module)
+
+    # Check user groups
+    missing_groups = probes['missing_groups']
+    if missing_groups:
+        return StartupCheckResult(False, (
+            f"User not in required groups: {', '.join(missing_groups)}\n\n"
+            f"Add yourself to groups:\n"
+            f"sudo usermod -aG {' '.join(missing_groups)} $USER\n\n"
+            f"Then log out and log back in."
+        ), kvm_module=kvm_module)
+
+    # Check libvirt daemon
+    if not probes['libvirtd_running']:
+        return StartupCheckResult(
+            False, "libvirtd service is not running. Please start it:\nsudo systemctl start libvirtd",
+            kvm_module=kvm_module
+        )
+
+    # Check KVM support
+    if not probes['kvm_available']:
+        return StartupCheckResult(
+            False, "KVM virtualization is not available. Check BIOS settings and CPU support.",
+            kvm_module=kvm_module
+        )
+
+    # Check IOMMU (warning only, not fatal)
+    warnings = []
+    if not probes['iommu_enabled']:
+        warnings.append(IOMMU_WARNING)
+
+    return StartupCheckResult(True, warnings=warnings, kvm_module=kvm_module)
+
+
+def _load_cache(fingerprint: Dict) -> Optional[Dict]:
+    """Get cached probe results if they were taken on this exact host state"""
+    try:
+        data = json.loads(CACHE_FILE.read_text())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.debug(f"Ignoring startup check cache: {e}")
+        return None
+
+    if data.get('format') != CACHE_FORMAT or data.get('fingerprint') != fingerprint:
+        return None
+    return data.get('probes')
+
+
+def _save_cache(fingerprint: Dict, probes: Dict):
+    """Persist passing probe results atomically"""
+    try:
+        CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = CACHE_FILE.with_suffix('.tmp')
+        tmp.write_text(json.dumps(
+            {'format': CACHE_FORMAT, 'fingerprint': fingerprint, 'probes': probes},
+            indent=2
+        ))
+        tmp.replace(CACHE_FILE)
+    except Exception as e:
+        logger.debug(f"Could not write startup check cache: {e}")
+
+
+def invalidate_cache():
+    """Force the next check to probe the system"""
+    try:
+        CACHE_FILE.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _probe_and_store(fingerprint: Dict, max_workers: int) -> StartupCheckResult:
+    probes = probe_system(max_workers)
+    result = evaluate(probes)
+    # Failures are never cached: the user is expected to fix them and retry
+    if result.ok:
+        _save_cache(fingerprint, probes)
+    else:
+        invalidate_cache()
+    return result
+
+
+def check_system_requirements(
+    max_workers: int = 6,
+    use_cache: bool = True,
+    on_revalidated: Optional[Callable[[StartupCheckResult], None]] = None
+) -> StartupCheckResult:
+    """
+    Check if the system meets the requirements for running VirtFlow
+
+    Args:
+        max_workers: Probes run in parallel
+        use_cache: Return a cached passing result for an unchanged host
+        on_revalidated: Called from a background thread if revalidating a
+                        cached result finds the host no longer passes
+
+    Returns:
+        StartupCheckResult
+    """
+    # Check if running as root (bad)
+    if os.geteuid() == 0:
+        return StartupCheckResult(
+            False, "Please do not run VirtFlow as root. Add your user to 'libvirt' group instead."
+        )
+
+    fingerprint = host_fingerprint()
+    probes = _load_cache(fingerprint) if use_cache else None
+    if probes is None:
+        result = _probe_and_store(fingerprint, max_workers)
+        for warning in result.warnings:
+            logger.warning(warning)
+        return result
+
+    result = evaluate(probes)
+    result.cached = True
+    logger.debug("Startup checks served from cache; revalidating in background")
+
+    def revalidate():
+        try:
+            fresh = _probe_and_store(fingerprint, max_workers)
+        except Exception:
+            # Don't keep serving a result that could not be confirmed
+            logger.exception("Revalidating startup checks failed")
+            invalidate_cache()
+            return
+        if not fresh.ok:
+            logger.warning(f"System no longer meets requirements: {fresh.error}")
+            if on_revalidated:
+                on_revalidated(fresh)
+
+    threading.Thread(target=revalidate, daemon=True, name="startup-revalidate").start()
+    return result
@@ -0,0 +1,232 @@
+"""
+Storage Reclaimer - Removes a deleted VM's disks, NVRAM and TPM state
+
+The deleted domain's XML is read once before it is undefined; everything
+else runs as a background disk job so deleting a VM returns immediately:
+the job plans what to remove (the VM's disks, snapshot overlays and
+memory files, NVRAM and TPM state), then unlinks it. Backing images are
+never followed. Images that any other domain still uses, as a disk or
+anywhere in a disk's backing chain, are left alone, as are template base
+images. The job's result is the number of bytes reclaimed.
+"""
+
+import os
+import shutil
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import libvirt
+
+from backend.disk_jobs import DiskJob, disk_jobs
+from backend.disk_metadata import disk_metadata
+from backend.domain_xml import DomainDocument, XML_INACTIVE
+from utils.logger import logger
+import config
+
+
+def default_tpm_state_dir(uri: str, domain_uuid: str) -> Path:
+    """Where libvirt keeps swtpm state when the domain does not say"""
+    if uri.endswith('/session'):
+        return Path.home() / ".config" / "libvirt" / "qemu" / "swtpm" / domain_uuid
+    return Path("/var/lib/libvirt/swtpm") / domain_uuid
+
+
+def allocated_bytes(path: Path) -> int:
+    """Bytes actually allocated on disk by a file or directory tree"""
+    try:
+        if path.is_dir():
+            return sum(
+                p.stat().st_blocks * 512 for p in path.rglob('*') if p.is_file()
+            )
+        return path.stat().st_blocks * 512
+    except OSError:
+        return 0
+
+
+def snapshot_files(domain: libvirt.virDomain) -> List[str]:
+    """
+    Disk overlays and memory files recorded in a domain's snapshots
+
+    Read these before the domain is undefined: that drops the snapshot
+    metadata, but not the files.
+    """
+    files = []
+    for snapshot in domain.listAllSnapshots(0):
+        root = ET.fromstring(snapshot.getXMLDesc(0))
+        memory = root.find('memory')
+        if memory is not None and memory.get('file'):
+            files.append(memory.get('file'))
+        for disk in root.findall('disks/disk'):
+            source = disk.find('source')
+            if disk.get('snapshot') == 'external' and source is not None and source.get('file'):
+                files.append(source.get('file'))
+    return files
+
+
+@dataclass
+class ReclaimPlan:
+    """Storage to remove for one deleted VM"""
+    vm_name: str
+    vm_uuid: str
+    files: List[str] = field(default_factory=list)
+    directories: List[str] = field(default_factory=list)
+    skipped: Dict[str, str] = field(default_factory=dict)  # path -> reason
+
+    @property
+    def bytes_total(self) -> int:
+        paths = self.files + self.directories
+        return sum(allocated_bytes(Path(p)) for p in paths)
+
+
+class StorageReclaimer:
+    """Plans and runs storage removal for deleted VMs"""
+
+    def __init__(self, conn: libvirt.virConnect, registry=None):
+        """
+        Args:
+            conn: libvirt connection
+            registry: DomainRegistry to read definitions from (optional)
+        """
+        self.conn = conn
+        self.registry = registry
+
+    def _definitions(self, exclude_uuid: str):
+        """(name, disk and CD-ROM sources, NVRAM path) of every other defined domain"""
+        if self.registry is not None:
+            for uuid, facts in self.registry.all_facts(XML_INACTIVE).items():
+                if uuid != exclude_uuid:
+                    yield facts.name, facts.source_paths, facts.nvram_path
+            return
+        for domain in self.conn.listAllDomains():
+            if domain.UUIDString() == exclude_uuid:
+                continue
+            document = DomainDocument.from_domain(domain, XML_INACTIVE)
+            sources = [d.source for d in document.disks() if d.source]
+            yield domain.name(), sources, document.nvram_path()
+
+    def paths_in_use(self, exclude_uuid: str) -> Dict[str, str]:
+        """
+        Map every image path other domains depend on to a domain name
+
+        Includes disk sources, their backing chains and NVRAM files.
+        """
+        in_use: Dict[str, str] = {}
+        for name, sources, nvram in self._definitions(exclude_uuid):
+            metadata = disk_metadata.get_many(
+                s for s in sources if os.path.isfile(s)
+            )
+            for source in sources:
+                in_use.setdefault(os.path.realpath(source), name)
+                if source in metadata:
+                    for backing in metadata[source].backing_chain:
+                        in_use.setdefault(backing, name)
+
+            if nvram:
+                in_use.setdefault(os.path.realpath(nvram), name)
+        return in_use
+
+    def plan(self, document: DomainDocument, snapshots: Iterable[str] = ()) -> ReclaimPlan:
+        """
+        Work out which files can be removed with a domain
+
+        Runs qemu-img info on the disks of every other domain, so call it
+        from a worker thread (submit() does).
+
+        Args:
+            document: Persistent definition of the deleted domain
+            snapshots: Files of its snapshots (see snapshot_files())
+
+        Returns:
+            ReclaimPlan
+        """
+        plan = ReclaimPlan(vm_name=document.name, vm_uuid=document.uuid)
+        in_use = self.paths_in_use(plan.vm_uuid)
+        templates_dir = os.path.realpath(config.TEMPLATES_DIR)
+
+        sources = [
+            d.source for d in document.disks()
+            if d.device == 'disk' and d.source
+        ]
+        memory_files = [path for path in snapshots if path.endswith('.mem')]
+        sources += [path for path in snapshots if not path.endswith('.mem')]
+        # Memory files whose snapshot metadata was already lost
+        memory_files += [str(p) for p in config.SNAPSHOTS_DIR.glob(f"{plan.vm_uuid}-*.mem")]
+        # Only the domain's own files: backing images may be shared bases
+        candidates = sources + memory_files
+        nvram = document.nvram_path()
+        if nvram:
+            candidates.append(nvram)
+
+        for source in candidates:
+            path = os.path.realpath(source)
+            if not os.path.isfile(path):
+                plan.skipped[source] = "not a regular file"
+            elif path in in_use:
+                plan.skipped[source] = f"in use by '{in_use[path]}'"
+            elif os.path.dirname(path) == templates_dir:
+                plan.skipped[source] = "template base image"
+            elif path not in plan.files:
+                plan.files.append(path)
+
+        if document.has_emulated_tpm():
+            state = document.tpm_state_path()
+            state_dir = Path(state) if state else default_tpm_state_dir(
+                self.conn.getURI(), plan.vm_uuid
+            )
+            plan.directories.append(str(state_dir))
+
+        for path, reason in plan.skipped.items():
+            logger.info(f"Keeping {path}: {reason}")
+        return plan
+
+    def submit(self, document: DomainDocument, snapshots: Iterable[str] = ()) -> DiskJob:
+        """
+        Plan and remove a deleted domain's storage in the background
+
+        Run this after the domain has been undefined (keeping its NVRAM,
+        which the plan removes). TPM state that libvirt already removed on
+        undefine is simply skipped.
+
+        Args:
+            document: Persistent definition read before the undefine
+            snapshots: Files of its snapshots, also read before the undefine
+
+        Returns:
+            DiskJob whose result is the number of bytes reclaimed
+        """
+        def task(job: DiskJob) -> int:
+            plan = self.plan(document, snapshots)
+            job.bytes_total = plan.bytes_total
+            reclaimed = 0
+            for path in plan.files + plan.directories:
+                if job.cancelled:
+                    break
+                target = Path(path)
+                size = allocated_bytes(target)
+                try:
+                    if target.is_dir():
+                        shutil.rmtree(target)
+                    elif target.exists():
+                        target.unlink()
+                        disk_metadata.invalidate(path)
+                    else:
+                        continue
+                except OSError as e:
+                    logger.warning(f"Could not remove {path}: {e}")
+                    continue
+                reclaimed += size
+                job.update_progress(bytes_done=reclaimed)
+                logger.info(f"Removed {path}")
+
+            logger.info(f"Reclaimed {reclaimed} bytes from VM '{plan.vm_name}'")
+            return reclaimed
+
+        disks = [d.source for d in document.disks() if d.device == 'disk' and d.source]
+        return disk_jobs.submit_task(
+            'reclaim',
+            disks[0] if disks else str(config.NVRAM_DIR),
+            task,
+            description=f"Removing storage of '{document.name}'"
+        )
@@ -0,0 +1,270 @@
+"""
+Template Manager - Golden images and linked-clone VM provisioning
+
+A template is a finished VM disk turned into a read-only qcow2 base image
+(plus a copy of its OVMF vars). New VMs get a thin qcow2 overlay on top of
+the base, a fresh UUID, MAC address and NVRAM, so provisioning takes
+milliseconds instead of a full Windows install.
+"""
+
+import errno
+import json
+import os
+import subprocess
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import List, Optional
+
+import libvirt
+
+from backend.disk_manager import DiskManager
+from backend.domain_xml import DomainDocument, XML_INACTIVE
+from backend.libvirt_manager import LibvirtManager
+from backend.nvram_store import clone_file
+from backend.xml_generator import XMLGenerator
+from utils.logger import logger
+import config
+
+
+@dataclass
+class VMTemplate:
+    """Golden image metadata"""
+    name: str
+    disk_path: str
+    disk_format: str
+    nvram_path: Optional[str]
+    source_vm: str
+    memory_mb: int
+    vcpus: int
+    enable_tpm: bool
+    created: float
+
+
+class TemplateManager:
+    """Creates golden images and provisions linked clones from them"""
+
+    def __init__(
+        self,
+        manager: LibvirtManager,
+        disk_manager: Optional[DiskManager] = None,
+        templates_dir: Optional[Path] = None
+    ):
+        """
+        Args:
+            manager: LibvirtManager instance
+            disk_manager: DiskManager instance (created if omitted)
+            templates_dir: Where base images are kept
+        """
+        self.manager = manager
+        self.disk_manager = disk_manager or DiskManager()
+        self.templates_dir = Path(templates_dir or config.TEMPLATES_DIR)
+        self.templates_dir.mkdir(parents=True, exist_ok=True)
+
+    def _metadata_path(self, name: str) -> Path:
+        return self.templates_dir / f"{name}.json"
+
+    def list_templates(self) -> List[VMTemplate]:
+        """List available templates"""
+        templates = []
+        for meta in sorted(self.templates_dir.glob("*.json")):
+            template = self.get_template(meta.stem)
+            if template:
+                templates.append(template)
+        return templates
+
+    def get_template(self, name: str) -> Optional[VMTemplate]:
+        """Load template metadata by name"""
+        try:
+            data = json.loads(self._metadata_path(name).read_text())
+            return VMTemplate(**data)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Invalid template metadata for '{name}': {e}")
+            return None
+
+    def create_template(self, vm_name: str, template_name: str) -> Optional[VMTemplate]:
+        """
+        Turn a stopped VM's disk into a read-only golden image
+
+        The disk is moved into the template directory and marked read-only;
+        the source VM keeps working because an overlay backed by the new
+        template is created at its original disk path.
+
+        Args:
+            vm_name: Source VM (must be shut off)
+            template_name: Name for the new template
+
+        Returns:
+            VMTemplate or None on failure
+        """
+        if self._metadata_path(template_name).exists():
+            logger.error(f"Template '{template_name}' already exists")
+            return None
+
+        domain = self.manager.get_vm_by_name(vm_name)
+        if domain is None:
+            return None
+
+        try:
+            if domain.isActive():
+                logger.error(f"VM '{vm_name}' must be shut off to create a template")
+                return None
+            document = DomainDocument.from_domain(domain, XML_INACTIVE)
+        except libvirt.libvirtError as e:
+            logger.error(f"Failed to read VM '{vm_name}': {e}")
+            return None
+
+        disk = next((d for d in document.disks() if d.device == 'disk' and d.source), None)
+        if disk is None:
+            logger.error(f"VM '{vm_name}' has no file-backed disk")
+            return None
+
+        disk_format = disk.driver_type or 'qcow2'
+        base_path = self.templates_dir / f"{template_name}.{disk_format}"
+        if not self._move_image(disk.source, base_path, disk_format):
+            return None
+        os.chmod(base_path, 0o444)
+
+        # Keep the source VM bootable on top of its former disk
+        if not self.disk_manager.create_overlay(disk.source, str(base_path), disk_format):
+            logger.error("Failed to re-attach source VM; restoring its disk")
+            os.chmod(base_path, 0o644)
+            self._move_image(str(base_path), disk.source, disk_format)
+            return None
+
+        # The overlay is always qcow2, whatever the base image is
+        if disk_format != 'qcow2':
+            try:
+                with self.manager.domains.edit(domain) as source_document:
+                    source_document.set_disk_source(disk.target, disk.source, 'qcow2')
+            except libvirt.libvirtError as e:
+                logger.error(f"Failed to switch VM '{vm_name}' to its overlay ({e}); restoring its disk")
+                os.unlink(disk.source)
+                os.chmod(base_path, 0o644)
+                self._move_image(str(base_path), disk.source, disk_format)
+                return None
+
+        nvram_copy = None
+        source_nvram = document.nvram_path()
+        if source_nvram and Path(source_nvram).exists():
+            nvram_copy = self.templates_dir / f"{template_name}_VARS.fd"
+            try:
+                clone_file(Path(source_nvram), nvram_copy)
+                os.chmod(nvram_copy, 0o444)
+            except OSError as e:
+                logger.warning(f"Could not copy NVRAM vars into template: {e}")
+                nvram_copy = None
+
+        memory_kib = document.memory_kib()
+        vcpus = int(document.root.findtext('vcpu', '1'))
+        template = VMTemplate(
+            name=template_name,
+            disk_path=str(base_path),
+            disk_format=disk_format,
+            nvram_path=str(nvram_copy) if nvram_copy else None,
+            source_vm=vm_name,
+            memory_mb=memory_kib // 1024,
+            vcpus=vcpus,
+            enable_tpm=document.root.find('devices/tpm') is not None,
+            created=time.time()
+        )
+        self._metadata_path(template_name).write_text(json.dumps(asdict(template), indent=2))
+        logger.info(f"Template '{template_name}' created from VM '{vm_name}'")
+        return template
+
+    def _move_image(self, source: str, destination, disk_format: str) -> bool:
+        """Move an image, converting when crossing filesystems"""
+        try:
+            os.rename(source, destination)
+            return True
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                logger.error(f"Failed to move {source}: {e}")
+                return False
+
+        result = subprocess.run(
+            ['qemu-img', 'convert', '-f', disk_format, '-O', disk_format,
+             source, str(destination)],
+            capture_output=True,
+            text=True
+        )
+        if result.returncode != 0:
+            logger.error(f"qemu-img convert failed: {result.stderr}")
+            return False
+        os.unlink(source)
+        return True
+
+    def provision_linked_clone(
+        self,
+        template_name: str,
+        vm_name: str,
+        memory_mb: Optional[int] = None,
+        vcpus: Optional[int] = None
+    ) -> Optional[libvirt.virDomain]:
+        """
+        Define a new VM as a linked clone of a template
+
+        Args:
+            template_name: Template to clone
+            vm_name: Name of the new VM
+            memory_mb: RAM override (default: template's)
+            vcpus: vCPU override (default: template's)
+
+        Returns:
+            libvirt domain object or None
+        """
+        template = self.get_template(template_name)
+        if template is None:
+            logger.error(f"Template '{template_name}' not found")
+            return None
+
+        disk_path = self.disk_manager.get_disk_path(vm_name)
+        if not self.disk_manager.create_overlay(disk_path, template.disk_path, template.disk_format):
+            return None
+
+        xml_generator = XMLGenerator(self.manager.connection)
+        xml = xml_generator.generate_windows_vm_xml(
+            vm_name=vm_name,
+            memory_mb=memory_mb or template.memory_mb,
+            vcpus=vcpus or template.vcpus,
+            disk_path=disk_path,
+            iso_path=None,
+            virtio_iso_path=None,
+            enable_tpm=template.enable_tpm,
+            nvram_template=template.nvram_path
+        )
+
+        domain = self.manager.create_vm_from_xml(xml)
+        if domain is None:
+            self.disk_manager.delete_disk(disk_path)
+            xml_generator.nvram_store.remove(DomainDocument(xml).uuid)
+            return None
+
+        logger.info(f"Linked clone '{vm_name}' provisioned from template '{template_name}'")
+        return domain
+
+    def flatten(self, vm_name: str):
+        """
+        Detach a linked clone from its template in the background
+
+        Args:
+            vm_name: Linked-clone VM (must be shut off)
+
+        Returns:
+            DiskJob handle, or None if the VM cannot be flattened
+        """
+        domain = self.manager.get_vm_by_name(vm_name)
+        if domain is None:
+            return None
+        if domain.isActive():
+            logger.error(f"VM '{vm_name}' must be shut off to flatten its disk")
+            return None
+
+        document = DomainDocument.from_domain(domain, XML_INACTIVE)
+        disk = next((d for d in document.disks() if d.device == 'disk' and d.source), None)
+        if disk is None:
+            logger.error(f"VM '{vm_name}' has no file-backed disk")
+            return None
+        return self.disk_manager.flatten_disk(disk.source)
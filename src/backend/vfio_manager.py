@@ -9,19 +9,38 @@ from typing import Optional
 
 from backend.gpu_detector import GPU
 from utils.logger import logger
+from utils import metrics
+import config
+
+
+VFIO_SECONDS = metrics.histogram(
+    'virtflow_vfio_operation_seconds', "Duration of VFIO bind/unbind worker runs", ['operation', 'result']
+)
+VFIO_FAILURES = metrics.counter(
+    'virtflow_vfio_failures_total', "Failed VFIO bind/unbind attempts", ['operation', 'reason']
+)
 
 
 class VFIOManager:
     """Manages VFIO driver binding using isolated worker process"""
     
-    def __init__(self):
+    def __init__(self, sysfs_root: Optional[Path] = None):
+        """
+        Args:
+            sysfs_root: sysfs mount point (default: config.SYSFS_ROOT)
+        """
+        self.sysfs_root = Path(sysfs_root or config.SYSFS_ROOT)
         self.worker_path = Path(__file__).parent / "gpu_worker.py"
         if not self.worker_path.exists():
             logger.error(f"GPU worker not found at {self.worker_path}")
-        self._check_vfio_available()
+        # Checked (and modules loaded) on first bind, not at construction
+        self._vfio_checked = False
     
     def _check_vfio_available(self) -> bool:
         """Check if VFIO modules are loaded"""
+        if self._vfio_checked:
+            return True
+        self._vfio_checked = True
         try:
             result = subprocess.run(['lsmod'], capture_output=True, text=True, timeout=5)
             has_vfio = 'vfio_pci' in result.stdout
@@ -38,12 +57,23 @@ class VFIOManager:
             logger.error(f"Failed to check VFIO: {e}")
             return False
     
+    def _timed(self, operation: str, worker, gpu: GPU) -> bool:
+        """Run a bind/unbind and record its duration"""
+        start = time.perf_counter()
+        success = worker(gpu)
+        VFIO_SECONDS.labels(operation, 'ok' if success else 'error').observe(time.perf_counter() - start)
+        return success
+    
     def bind_gpu_to_vfio(self, gpu: GPU) -> bool:
         """
         Bind GPU to VFIO using isolated worker subprocess
         CRASH-SAFE: If worker crashes, main app continues
         """
+        return self._timed('bind', self._bind_gpu_to_vfio, gpu)
+    
+    def _bind_gpu_to_vfio(self, gpu: GPU) -> bool:
         logger.info(f"Binding {gpu.full_name} to VFIO via worker...")
+        self._check_vfio_available()
         
         try:
             # Build device list arguments
@@ -77,17 +107,20 @@ class VFIOManager:
                     logger.info(f"Successfully bound {gpu.full_name} to VFIO")
                     return True
                 else:
+                    VFIO_FAILURES.labels('bind', 'worker').inc()
                     logger.error(f"Worker failed with code {process.returncode}")
                     if stderr:
                         logger.error(f"Worker error: {stderr}")
                     return False
                     
             except subprocess.TimeoutExpired:
+                VFIO_FAILURES.labels('bind', 'timeout').inc()
                 logger.error("Worker timed out after 60 seconds")
                 process.kill()
                 return False
                 
         except Exception as e:
+            VFIO_FAILURES.labels('bind', 'launch').inc()
             logger.exception(f"Failed to launch worker: {e}")
             return False
     
@@ -95,6 +128,9 @@ class VFIOManager:
         """
         Unbind GPU from VFIO using isolated worker subprocess
         """
+        return self._timed('unbind', self._unbind_gpu_from_vfio, gpu)
+    
+    def _unbind_gpu_from_vfio(self, gpu: GPU) -> bool:
         logger.info(f"Unbinding {gpu.full_name} from VFIO via worker...")
         
         try:
@@ -131,24 +167,27 @@ class VFIOManager:
                     logger.info(f"Successfully restored {gpu.full_name} to host")
                     return True
                 else:
+                    VFIO_FAILURES.labels('unbind', 'worker').inc()
                     logger.error(f"Worker failed with code {process.returncode}")
                     if stderr:
                         logger.error(f"Worker error: {stderr}")
                     return False
                     
             except subprocess.TimeoutExpired:
+                VFIO_FAILURES.labels('unbind', 'timeout').inc()
                 logger.error("Worker timed out after 60 seconds")
                 process.kill()
                 return False
                 
         except Exception as e:
+            VFIO_FAILURES.labels('unbind', 'launch').inc()
             logger.exception(f"Failed to launch worker: {e}")
             return False
     
     def is_bound_to_vfio(self, pci_address: str) -> bool:
         """Check if device is bound to vfio-pci"""
         try:
-            driver_path = Path(f"/sys/bus/pci/devices/{pci_address}/driver")
+            driver_path = self.sysfs_root / "bus" / "pci" / "devices" / pci_address / "driver"
             if driver_path.exists():
                 driver_name = driver_path.resolve().name
                 return driver_name == "vfio-pci"
@@ -4,11 +4,25 @@ VM operations controller (start, stop, pause, etc.)
 
 import libvirt
 import time
-import xml.etree.ElementTree as ET
 from typing import Optional, Dict
-from backend.libvirt_manager import LibvirtManager
+from backend.libvirt_manager import LIBVIRT_CALLS, LibvirtManager
 from backend.vm_viewer_manager import VMViewerManager
+from backend.snapshot_manager import SnapshotManager
 from utils.logger import logger
+from utils import metrics
+
+
+VM_OPERATIONS = metrics.counter(
+    'virtflow_vm_operations_total', "VM lifecycle operations", ['operation', 'result']
+)
+VM_START_SECONDS = metrics.histogram(
+    'virtflow_vm_start_seconds', "Time for libvirt to start a domain", ['result']
+)
+_STATE_CALLS = LIBVIRT_CALLS.labels('state')
+_INFO_CALLS = LIBVIRT_CALLS.labels('info')
+_IS_ACTIVE_CALLS = LIBVIRT_CALLS.labels('isActive')
+_IS_PERSISTENT_CALLS = LIBVIRT_CALLS.labels('isPersistent')
+_AUTOSTART_CALLS = LIBVIRT_CALLS.labels('autostart')
 
 
 class VMState:
@@ -45,7 +59,16 @@ class VMController:
             manager: LibvirtManager instance
         """
         self.manager = manager
-        self.viewer_manager = VMViewerManager()
+        self._viewer_manager = None
+        self._restore_threads = []
+        self.snapshots = SnapshotManager(manager, controller=self)
+    
+    @property
+    def viewer_manager(self) -> VMViewerManager:
+        """Viewer integration, set up on first use"""
+        if self._viewer_manager is None:
+            self._viewer_manager = VMViewerManager(self.manager.domains)
+        return self._viewer_manager
     
     def get_vm_info(self, domain: libvirt.virDomain) -> Dict:
         """
@@ -58,26 +81,44 @@ class VMController:
             Dictionary with VM details
         """
         try:
+            # name/UUID are cached by the bindings; count the calls that are not
             state, reason = domain.state()
+            _STATE_CALLS.inc()
             info = domain.info()
+            _INFO_CALLS.inc()
+            is_active = domain.isActive() == 1
+            _IS_ACTIVE_CALLS.inc()
+            is_persistent = domain.isPersistent() == 1
+            _IS_PERSISTENT_CALLS.inc()
+            autostart = domain.autostart() == 1
+            _AUTOSTART_CALLS.inc()
             
             return {
                 'name': domain.name(),
                 'uuid': domain.UUIDString(),
                 'state': state,
                 'state_name': VMState.STATE_NAMES.get(state, "Unknown"),
-                'is_active': domain.isActive() == 1,
-                'is_persistent': domain.isPersistent() == 1,
+                'is_active': is_active,
+                'is_persistent': is_persistent,
                 'max_memory': info[1],  # KB
                 'memory': info[2],  # KB
                 'vcpus': info[3],
                 'cpu_time': info[4],  # nanoseconds
-                'autostart': domain.autostart() == 1
+                'autostart': autostart or self._has_autostart_policy(domain)
             }
         except libvirt.libvirtError as e:
             logger.error(f"Failed to get VM info: {e}")
             return {}
     
+    def _has_autostart_policy(self, domain: libvirt.virDomain) -> bool:
+        """Check for a VirtFlow autostart policy (cached with the definition)"""
+        from backend.domain_xml import XML_INACTIVE
+        
+        try:
+            return self.manager.domains.facts(domain, XML_INACTIVE).autostart is not None
+        except libvirt.libvirtError:
+            return False
+    
     def start_vm(self, domain: libvirt.virDomain) -> bool:
         """
         Start a VM
@@ -87,13 +128,16 @@ class VMController:
             
         Returns:
             bool: Success status
+            
+        Raises:
+            AdmissionError: If the host cannot back the guest's memory
         """
         try:
             if domain.isActive():
                 logger.warning(f"VM '{domain.name()}' is already running")
                 return True
             
-            domain.create()
+            self._create(domain)
             logger.info(f"VM '{domain.name()}' started successfully")
             return True
             
@@ -101,6 +145,29 @@ class VMController:
             logger.error(f"Failed to start VM '{domain.name()}': {e}")
             return False
     
+    def _create(self, domain: libvirt.virDomain):
+        """Start a domain once admission control allows it, recording its start latency"""
+        from backend.admission import AdmissionError
+        
+        admission = self.manager.admission
+        try:
+            admission.admit(domain)
+        except AdmissionError:
+            VM_OPERATIONS.labels('start', 'refused').inc()
+            raise
+        
+        start = time.perf_counter()
+        try:
+            domain.create()
+        except libvirt.libvirtError:
+            VM_START_SECONDS.labels('error').observe(time.perf_counter() - start)
+            VM_OPERATIONS.labels('start', 'error').inc()
+            raise
+        finally:
+            admission.release(domain)
+        VM_START_SECONDS.labels('ok').observe(time.perf_counter() - start)
+        VM_OPERATIONS.labels('start', 'ok').inc()
+    
     def start_vm_with_viewer(
         self,
         domain: libvirt.virDomain,
@@ -115,13 +182,16 @@ class VMController:
         
         Returns:
             bool: Success status
+            
+        Raises:
+            AdmissionError: If the host cannot back the guest's memory
         """
         try:
             vm_name = domain.name()
 
             if not domain.isActive():
                 logger.info(f"Starting VM '{vm_name}'...")
-                domain.create()
+                self._create(domain)
                 time.sleep(2)
 
             success = self.viewer_manager.launch_viewer(
@@ -158,8 +228,8 @@ class VMController:
                 logger.warning(f"VM '{domain.name()}' is not running")
                 return True
             
-            # Check if VM has GPU passthrough enabled
-            has_gpu_passthrough = self._check_gpu_passthrough(domain)
+            # Check if VM has GPU passthrough enabled (GPUs can only be restored on this host)
+            has_gpu_passthrough = self.manager.is_local and self._check_gpu_passthrough(domain)
             
             if force:
                 domain.destroy()
@@ -167,6 +237,7 @@ class VMController:
             else:
                 domain.shutdown()
                 logger.info(f"VM '{domain.name()}' shutdown initiated")
+            VM_OPERATIONS.labels('destroy' if force else 'shutdown', 'ok').inc()
             
             # If GPU passthrough is enabled, unbind GPU from VFIO after VM stops
             if has_gpu_passthrough:
@@ -176,6 +247,7 @@ class VMController:
             return True
             
         except libvirt.libvirtError as e:
+            VM_OPERATIONS.labels('destroy' if force else 'shutdown', 'error').inc()
             logger.error(f"Failed to stop VM '{domain.name()}': {e}")
             return False
     
@@ -190,17 +262,7 @@ class VMController:
             bool: True if GPU passthrough is configured
         """
         try:
-            xml_str = domain.XMLDesc(0)
-            root = ET.fromstring(xml_str)
-            devices = root.find('devices')
-            
-            if devices is not None:
-                # Look for PCI hostdev devices (GPU passthrough)
-                for hostdev in devices.findall('hostdev'):
-                    if hostdev.get('type') == 'pci':
-                        return True
-            
-            return False
+            return self.manager.domains.facts(domain).has_pci_hostdev
         except Exception as e:
             logger.error(f"Failed to check GPU passthrough: {e}")
             return False
@@ -253,6 +315,18 @@ class VMController:
         # Run in background thread to not block UI
         thread = threading.Thread(target=wait_and_restore, daemon=True)
         thread.start()
+        self._restore_threads.append(thread)
+
+    def wait_for_gpu_restore(self, timeout: Optional[float] = None):
+        """
+        Wait for pending GPU restores started by stop_vm
+        
+        Restores run in daemon threads; a short-lived process (e.g. the
+        command line interface) calls this before exiting.
+        """
+        for thread in self._restore_threads:
+            thread.join(timeout)
+        self._restore_threads = [t for t in self._restore_threads if t.is_alive()]
 
     def stop_vm_and_close_viewer(self, domain: libvirt.virDomain, force: bool = False) -> bool:
         """
@@ -285,9 +359,11 @@ class VMController:
         """
         try:
             domain.reboot()
+            VM_OPERATIONS.labels('reboot', 'ok').inc()
             logger.info(f"VM '{domain.name()}' reboot initiated")
             return True
         except libvirt.libvirtError as e:
+            VM_OPERATIONS.labels('reboot', 'error').inc()
             logger.error(f"Failed to reboot VM: {e}")
             return False
     
@@ -299,9 +375,11 @@ class VMController:
                 return False
             
             domain.suspend()
+            VM_OPERATIONS.labels('pause', 'ok').inc()
             logger.info(f"VM '{domain.name()}' paused")
             return True
         except libvirt.libvirtError as e:
+            VM_OPERATIONS.labels('pause', 'error').inc()
             logger.error(f"Failed to pause VM: {e}")
             return False
     
@@ -309,26 +387,42 @@ class VMController:
         """Resume a paused VM"""
         try:
             domain.resume()
+            VM_OPERATIONS.labels('resume', 'ok').inc()
             logger.info(f"VM '{domain.name()}' resumed")
             return True
         except libvirt.libvirtError as e:
+            VM_OPERATIONS.labels('resume', 'error').inc()
             logger.error(f"Failed to resume VM: {e}")
             return False
     
-    def set_autostart(self, domain: libvirt.virDomain, enable: bool) -> bool:
+    def set_autostart(
+        self,
+        domain: libvirt.virDomain,
+        enable: bool,
+        priority: int = 0,
+        delay: float = 0.0
+    ) -> bool:
         """
         Set VM autostart on host boot
         
+        VMs are started by VirtFlow's autostart scheduler (see
+        backend.autostart_scheduler), not all at once by libvirtd.
+        
         Args:
             domain: libvirt domain object
             enable: Enable or disable autostart
+            priority: Higher priorities are started first
+            delay: Seconds after the scheduler starts, at the earliest
             
         Returns:
             bool: Success status
         """
+        from backend.autostart_scheduler import set_autostart_policy
+        from backend.domain_xml import AutostartPolicy
+        
         try:
-            domain.setAutostart(1 if enable else 0)
-            status = "enabled" if enable else "disabled"
+            set_autostart_policy(self.manager, domain, AutostartPolicy(priority, delay) if enable else None)
+            status = f"enabled (priority {priority}, delay {delay:g}s)" if enable else "disabled"
             logger.info(f"Autostart {status} for VM '{domain.name()}'")
             return True
         except libvirt.libvirtError as e:
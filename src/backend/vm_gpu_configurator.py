@@ -1,7 +1,14 @@
 import time
-import xml.etree.ElementTree as ET
 from utils.logger import logger
 from backend.vfio_manager import VFIOManager
+from utils import metrics
+
+
+GPU_PASSTHROUGH_SECONDS = metrics.histogram(
+    'virtflow_gpu_passthrough_seconds', "Duration of GPU passthrough activation/deactivation",
+    ['operation', 'result']
+)
+
 
 class VMGPUConfigurator:
     """
@@ -20,8 +27,9 @@ class VMGPUConfigurator:
         3. Remove all virtual display devices
         """
         logger.info(f"Enabling GPU passthrough for '{vm_name}'")
+        start = time.perf_counter()
         try:
-            domain = self.libvirt_manager.get_vm_by_name(vm_name)
+            domain = self.libvirt_manager.domains.domain_by_name(vm_name)
             if domain is None:
                 raise RuntimeError(f"VM '{vm_name}' not found")
             
@@ -37,82 +45,54 @@ class VMGPUConfigurator:
                 raise RuntimeError("Failed to bind GPU to VFIO driver")
             logger.info("GPU successfully bound to VFIO")
             
-            # 3. Parse domain XML
-            xml_str = domain.XMLDesc(0)
-            root = ET.fromstring(xml_str)
-            devices = root.find('devices')
-            
-            if devices is not None:
+            # 3. Patch domain XML (one parse, one defineXML)
+            with self.libvirt_manager.domains.edit(domain) as document:
                 # Remove ALL audio devices first (before graphics)
-                for audio in list(devices.findall('audio')):
-                    logger.info(f"Removing audio device {audio.get('id')}")
-                    devices.remove(audio)
-                
-                # Remove all sound devices
-                for sound in list(devices.findall('sound')):
-                    model = sound.get('model')
-                    logger.info(f"Removing sound device {model}")
-                    devices.remove(sound)
+                for audio in document.audio():
+                    logger.info(f"Removing audio device {audio.id}")
+                document.remove_audio()
                 
                 # Remove all graphics (vnc, spice, etc)
-                for graphics in list(devices.findall('graphics')):
-                    logger.info(f"Removing graphics type {graphics.get('type')}")
-                    devices.remove(graphics)
+                for graphics in document.graphics():
+                    logger.info(f"Removing graphics type {graphics.type}")
+                document.remove_graphics()
                 
                 # Remove all video (qxl, vga, virtio)
-                for video in list(devices.findall('video')):
-                    model = video.find('model')
-                    if model is not None:
-                        logger.info(f"Removing video device {model.get('type')}")
-                    devices.remove(video)
+                for video in document.video():
+                    logger.info(f"Removing video device {video.model}")
+                document.remove_video()
                 
                 # Remove all channel devices (spicevmc, virtio, etc)
-                for channel in list(devices.findall('channel')):
-                    target = channel.find('target')
-                    if target is not None:
-                        logger.info(f"Removing channel device {target.get('type')}")
-                        devices.remove(channel)
-                
-                # Remove all redirdev (spice USB redirection)
-                for redirdev in list(devices.findall('redirdev')):
-                    logger.info(f"Removing redirdev {redirdev.get('type')}")
-                    devices.remove(redirdev)
+                removed = document.remove_devices(
+                    'channel', lambda channel: channel.find('target') is not None
+                )
+                if removed:
+                    logger.info(f"Removed {removed} channel device(s)")
                 
-                # Remove all smartcard (spice)
-                for smartcard in list(devices.findall('smartcard')):
-                    logger.info("Removing smartcard")
-                    devices.remove(smartcard)
+                # Remove spice USB redirection and smartcards
+                if document.remove_devices('redirdev'):
+                    logger.info("Removed redirdev devices")
+                if document.remove_devices('smartcard'):
+                    logger.info("Removed smartcard")
                 
                 # Remove tablet input device (spice)
-                for inputdev in list(devices.findall('input')):
-                    if inputdev.get('type') == 'tablet' and inputdev.get('bus') == 'usb':
-                        logger.info("Removing input tablet device")
-                        devices.remove(inputdev)
+                if document.remove_devices(
+                    'input',
+                    lambda inputdev: inputdev.get('type') == 'tablet' and inputdev.get('bus') == 'usb'
+                ):
+                    logger.info("Removed input tablet device")
                 
                 # Add GPU hostdevs
                 for pci_device in gpu.all_devices:
-                    domain_s, bus, slot_func = pci_device.address.split(':')
-                    slot, func = slot_func.split('.')
-                    hostdev = ET.Element('hostdev')
-                    hostdev.set('mode', 'subsystem')
-                    hostdev.set('type', 'pci')
-                    hostdev.set('managed', 'yes')
-                    source = ET.SubElement(hostdev, 'source')
-                    address = ET.SubElement(source, 'address')
-                    address.set('domain', f"0x{domain_s}")
-                    address.set('bus', f"0x{bus}")
-                    address.set('slot', f"0x{slot}")
-                    address.set('function', f"0x{func}")
-                    devices.append(hostdev)
-                    logger.info(f"Added hostdev for {pci_device.address}")
+                    if document.add_hostdev(pci_device.address):
+                        logger.info(f"Added hostdev for {pci_device.address}")
             
-            # 4. Write back and redefine
-            new_xml = ET.tostring(root, encoding='unicode')
-            self.libvirt_manager.connection.defineXML(new_xml)
             logger.info(f"GPU passthrough enabled for '{vm_name}'. GPU will be available on next start.")
+            GPU_PASSTHROUGH_SECONDS.labels('enable', 'ok').observe(time.perf_counter() - start)
             return True
             
         except Exception as e:
+            GPU_PASSTHROUGH_SECONDS.labels('enable', 'error').observe(time.perf_counter() - start)
             logger.exception(f"Failed to enable GPU passthrough: {e}")
             return False
     
@@ -125,8 +105,9 @@ class VMGPUConfigurator:
         4. Unbind GPU from VFIO and restore to host driver
         """
         logger.info(f"Disabling GPU passthrough for '{vm_name}'")
+        start = time.perf_counter()
         try:
-            domain = self.libvirt_manager.get_vm_by_name(vm_name)
+            domain = self.libvirt_manager.domains.domain_by_name(vm_name)
             if domain is None:
                 raise RuntimeError(f"VM '{vm_name}' not found")
             
@@ -136,52 +117,21 @@ class VMGPUConfigurator:
                 domain.destroy()
                 time.sleep(2)
             
-            # 2. Parse domain XML
-            xml_str = domain.XMLDesc(0)
-            root = ET.fromstring(xml_str)
-            devices = root.find('devices')
-            
-            if devices is not None:
+            # 2. Patch domain XML (one parse, one defineXML)
+            with self.libvirt_manager.domains.edit(domain) as document:
                 # Remove all GPU hostdevs
                 gpu_addresses = [dev.address for dev in gpu.all_devices]
-                for hostdev in list(devices.findall('hostdev')):
-                    if hostdev.get('type') == 'pci':
-                        source = hostdev.find('source')
-                        if source is not None:
-                            address = source.find('address')
-                            if address is not None:
-                                # Reconstruct PCI address
-                                domain_hex = address.get('domain', '0x0000')
-                                bus_hex = address.get('bus', '0x00')
-                                slot_hex = address.get('slot', '0x00')
-                                func_hex = address.get('function', '0x0')
-                                
-                                pci_addr = f"{int(domain_hex, 16):04x}:{int(bus_hex, 16):02x}:{int(slot_hex, 16):02x}.{int(func_hex, 16)}"
-                                
-                                if pci_addr in gpu_addresses:
-                                    logger.info(f"Removing hostdev for {pci_addr}")
-                                    devices.remove(hostdev)
-                
-                # Add back basic graphics (VNC)
-                graphics = ET.SubElement(devices, 'graphics')
-                graphics.set('type', 'vnc')
-                graphics.set('port', '-1')
-                graphics.set('autoport', 'yes')
-                logger.info("Added VNC graphics")
+                removed = document.remove_hostdevs(gpu_addresses)
+                logger.info(f"Removed {removed} GPU hostdev(s)")
                 
-                # Add back video device (QXL)
-                video = ET.SubElement(devices, 'video')
-                model = ET.SubElement(video, 'model')
-                model.set('type', 'qxl')
-                model.set('ram', '65536')
-                model.set('vram', '65536')
-                model.set('vgamem', '16384')
-                model.set('heads', '1')
-                logger.info("Added QXL video device")
+                # Add back basic graphics (VNC) and video (QXL)
+                if not document.graphics():
+                    document.add_graphics('vnc')
+                    logger.info("Added VNC graphics")
+                if not document.video():
+                    document.add_video('qxl')
+                    logger.info("Added QXL video device")
             
-            # 3. Write back and redefine
-            new_xml = ET.tostring(root, encoding='unicode')
-            self.libvirt_manager.connection.defineXML(new_xml)
             logger.info(f"Removed GPU hostdev from '{vm_name}' XML")
             
             # 4. UNBIND GPU FROM VFIO AND RESTORE TO HOST
@@ -191,8 +141,10 @@ class VMGPUConfigurator:
             else:
                 logger.info("GPU successfully restored to host")
             
+            GPU_PASSTHROUGH_SECONDS.labels('disable', 'ok').observe(time.perf_counter() - start)
             return True
             
         except Exception as e:
+            GPU_PASSTHROUGH_SECONDS.labels('disable', 'error').observe(time.perf_counter() - start)
             logger.exception(f"Failed to disable GPU passthrough: {e}")
             return False
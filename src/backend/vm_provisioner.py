@@ -0,0 +1,221 @@
+"""
+VM Provisioner - Create a VM (disk, domain XML, definition) from a spec
+
+Shared by the creation wizard and the command line so both produce
+identical VMs. A spec is a plain dataclass that can be loaded from JSON.
+"""
+
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import libvirt
+
+from backend.disk_jobs import DiskJob, JobState
+from backend.disk_manager import DiskManager
+from backend.disk_profiles import DISK_PROFILES, DEFAULT_DISK_PROFILE, get_disk_profile
+from backend.autostart_scheduler import set_autostart_policy
+from backend.domain_xml import AutostartPolicy, DomainDocument, PCIAddress
+from backend.gpu_detector import GPU, GPUDetector
+from backend.libvirt_manager import LibvirtManager
+from backend.xml_generator import XMLGenerator
+from utils.logger import logger
+import config
+
+
+@dataclass
+class VMSpec:
+    """Everything needed to create a Windows VM"""
+    name: str
+    iso_path: Optional[str] = None
+    virtio_iso_path: Optional[str] = None
+    memory_mb: int = config.DEFAULT_VM_RAM
+    vcpus: int = config.DEFAULT_VM_VCPUS
+    disk_size_gb: int = config.DEFAULT_VM_DISK_SIZE
+    disk_profile: str = DEFAULT_DISK_PROFILE
+    enable_tpm: bool = True
+    autostart: bool = False
+    gpu: Optional[str] = None  # PCI address of a GPU to pass through
+    cpu_pinning: Dict[int, str] = field(default_factory=dict)  # vCPU -> host cpuset
+    emulatorpin: Optional[str] = None
+    hugepages: bool = False
+    hugepage_size_kib: Optional[int] = None  # default: host default page size
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'VMSpec':
+        """
+        Build a spec from a parsed JSON object
+
+        Raises:
+            ValueError: Unknown keys or a missing name
+        """
+        known = {f.name for f in fields(cls)}
+        unknown = sorted(set(data) - known)
+        if unknown:
+            raise ValueError(f"Unknown spec keys: {', '.join(unknown)}")
+        if not data.get('name'):
+            raise ValueError("Spec is missing 'name'")
+        data = dict(data)
+        if 'cpu_pinning' in data:
+            # JSON object keys are always strings
+            data['cpu_pinning'] = {int(vcpu): str(cpuset) for vcpu, cpuset in data['cpu_pinning'].items()}
+        return cls(**data)
+
+    def validate(self) -> List[str]:
+        """
+        Check the spec before anything is created
+
+        Returns:
+            List of problems (empty if the spec is usable)
+        """
+        errors = []
+        if not self.name or not self.name.strip():
+            errors.append("VM name cannot be empty")
+        if self.iso_path and not Path(self.iso_path).exists():
+            errors.append(f"Windows ISO not found: {self.iso_path}")
+        if self.virtio_iso_path and not Path(self.virtio_iso_path).exists():
+            errors.append(f"VirtIO ISO not found: {self.virtio_iso_path}")
+        if self.memory_mb <= 0:
+            errors.append("memory_mb must be positive")
+        if self.vcpus <= 0:
+            errors.append("vcpus must be positive")
+        if self.disk_size_gb <= 0:
+            errors.append("disk_size_gb must be positive")
+        if self.disk_profile not in DISK_PROFILES:
+            errors.append(f"Unknown disk profile: {self.disk_profile}")
+        invalid_vcpus = [vcpu for vcpu in self.cpu_pinning if not 0 <= vcpu < self.vcpus]
+        if invalid_vcpus:
+            errors.append(f"Pinning refers to vCPUs that do not exist: {sorted(invalid_vcpus)}")
+        if self.gpu:
+            try:
+                PCIAddress.parse(self.gpu)
+            except ValueError:
+                errors.append(f"Invalid GPU PCI address: {self.gpu}")
+        return errors
+
+
+class VMProvisioner:
+    """Creates the disk image and defines the domain for a VMSpec"""
+
+    def __init__(self, manager: LibvirtManager, disk_manager: Optional[DiskManager] = None):
+        """
+        Args:
+            manager: LibvirtManager instance
+            disk_manager: DiskManager instance (created if omitted)
+        """
+        self.manager = manager
+        self.disk_manager = disk_manager or DiskManager()
+
+    def provision(
+        self,
+        spec: VMSpec,
+        overwrite: bool = False,
+        wait: Optional[Callable[[DiskJob], None]] = None,
+        gpu: Optional[GPU] = None
+    ) -> Optional[libvirt.virDomain]:
+        """
+        Create and define a VM
+
+        A GPU is attached as managed hostdevs (libvirt detaches it from the
+        host driver on start) next to the emulated display, which is still
+        needed to install Windows; activating passthrough removes it later.
+
+        Args:
+            spec: VM to create
+            overwrite: Replace an existing disk image with the same name
+            wait: Called with the disk creation job to wait for it
+                  (e.g. to show a progress dialog); defaults to blocking
+            gpu: Detected GPU matching spec.gpu (looked up if omitted)
+
+        Returns:
+            libvirt domain object, or None if disk creation was cancelled
+
+        Raises:
+            ValueError: The spec is invalid
+            RuntimeError: The disk or the domain could not be created
+        """
+        errors = spec.validate()
+        if errors:
+            raise ValueError("; ".join(errors))
+
+        if self.manager.get_vm_by_name(spec.name) is not None:
+            raise RuntimeError(f"VM '{spec.name}' already exists")
+
+        if spec.gpu and gpu is None:
+            gpu = GPUDetector().get_gpu_by_address(spec.gpu)
+            if gpu is None:
+                raise RuntimeError(f"No GPU at {spec.gpu}")
+
+        disk_path = self.disk_manager.get_disk_path(spec.name)
+        if Path(disk_path).exists():
+            if not overwrite:
+                raise RuntimeError(f"Disk already exists: {disk_path}")
+            self.disk_manager.delete_disk(disk_path)
+
+        if not self.disk_manager.check_qemu_img_available():
+            raise RuntimeError("qemu-img is not installed")
+
+        profile = get_disk_profile(spec.disk_profile)
+        logger.info(f"Creating disk: {disk_path} ({spec.disk_size_gb}GB)")
+        job = self.disk_manager.create_disk_image_async(disk_path, spec.disk_size_gb, profile=profile)
+        if job is None:
+            raise RuntimeError(f"Disk already exists: {disk_path}")
+        if wait is not None:
+            wait(job)
+        else:
+            job.wait()
+        if job.state == JobState.CANCELLED:
+            return None
+        if job.state != JobState.SUCCEEDED:
+            raise RuntimeError(f"Failed to create disk image {disk_path}: {job.error or 'unknown error'}")
+
+        # Generate XML (emulated display for the first boot; a GPU is added as hostdevs)
+        xml_generator = XMLGenerator(self.manager.connection)
+        try:
+            xml = xml_generator.generate_windows_vm_xml(
+                vm_name=spec.name,
+                memory_mb=spec.memory_mb,
+                vcpus=spec.vcpus,
+                disk_path=disk_path,
+                iso_path=spec.iso_path,
+                virtio_iso_path=spec.virtio_iso_path,
+                gpu=None,  # No GPU on first boot
+                enable_tpm=spec.enable_tpm,
+                enable_gpu_passthrough=False,
+                disk_profile=profile,
+                disk_size_gb=spec.disk_size_gb
+            )
+            xml = self._apply_tuning(xml, spec, gpu)
+        except Exception:
+            self.disk_manager.delete_disk(disk_path)
+            raise
+
+        domain = self.manager.create_vm_from_xml(xml)
+        if domain is None:
+            # Cleanup disk and NVRAM if VM creation failed
+            self.disk_manager.delete_disk(disk_path)
+            xml_generator.nvram_store.remove(DomainDocument(xml).uuid)
+            raise RuntimeError("Failed to define VM. Check libvirt logs for details.")
+
+        if spec.autostart:
+            try:
+                set_autostart_policy(self.manager, domain, AutostartPolicy())
+            except libvirt.libvirtError as e:
+                logger.warning(f"Could not enable autostart for '{spec.name}': {e}")
+
+        logger.info(f"VM '{spec.name}' provisioned")
+        return domain
+
+    def _apply_tuning(self, xml: str, spec: VMSpec, gpu: Optional[GPU]) -> str:
+        """Add pinning, hugepages and GPU hostdevs the generator does not emit"""
+        if not (spec.cpu_pinning or spec.emulatorpin or spec.hugepages or gpu):
+            return xml
+        document = DomainDocument(xml)
+        if spec.cpu_pinning or spec.emulatorpin:
+            document.set_vcpu_pinning(spec.cpu_pinning, spec.emulatorpin)
+        if spec.hugepages:
+            document.set_memory_backing(hugepages=True, page_size_kib=spec.hugepage_size_kib)
+        if gpu is not None:
+            for device in gpu.all_devices:
+                document.add_hostdev(device.address)
+        return document.to_xml()
@@ -5,19 +5,24 @@ Automatically launches virt-viewer when VM starts
 
 import subprocess
 import time
-import xml.etree.ElementTree as ET
 from typing import Optional, Tuple
 from pathlib import Path
 
 import libvirt
 
+from backend.domain_xml import DomainDocument
 from utils.logger import logger
 
 
 class VMViewerManager:
     """Manages VM display viewer (virt-viewer/remote-viewer)"""
     
-    def __init__(self):
+    def __init__(self, registry=None):
+        """
+        Args:
+            registry: DomainRegistry to read domain XML from (optional)
+        """
+        self.registry = registry
         self.viewer_processes = {}  # vm_name -> subprocess.Popen
         self._check_viewer_available()
     
@@ -53,16 +58,19 @@ class VMViewerManager:
             Tuple of (protocol, host, port) or None
         """
         try:
-            xml_desc = domain.XMLDesc(0)
-            root = ET.fromstring(xml_desc)
+            if self.registry is not None:
+                document = self.registry.document(domain)
+            else:
+                document = DomainDocument.from_domain(domain)
             
-            # Find graphics element
-            graphics = root.find('.//devices/graphics')
+            # First graphics device
+            displays = document.graphics()
             
-            if graphics is not None:
-                protocol = graphics.get('type')  # 'spice' or 'vnc'
-                host = graphics.get('listen', '127.0.0.1')
-                port = graphics.get('port', 'auto')
+            if displays:
+                graphics = displays[0]
+                protocol = graphics.type  # 'spice' or 'vnc'
+                host = graphics.listen or '127.0.0.1'
+                port = graphics.port or 'auto'
                 
                 # Handle autoport
                 if port == 'auto' or port == '-1':
@@ -82,7 +90,7 @@ class VMViewerManager:
         try:
             # Use virsh domdisplay to get connection URI
             result = subprocess.run(
-                ['virsh', 'domdisplay', domain.name()],
+                ['virsh', '--connect', domain.connect().getURI(), 'domdisplay', domain.name()],
                 capture_output=True,
                 text=True,
                 timeout=5
@@ -135,7 +143,7 @@ class VMViewerManager:
             # Build viewer command
             cmd = [
                 self.viewer_binary,
-                '--connect', 'qemu:///system',
+                '--connect', domain.connect().getURI(),
                 '--wait' if wait_for_vm else '--reconnect',
                 vm_name
             ]
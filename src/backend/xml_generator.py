@@ -4,12 +4,14 @@ PRODUCTION-READY - Fixed for Ubuntu 25.10 OVMF paths
 """
 
 import uuid
-import subprocess
 from typing import List, Dict, Optional
 from pathlib import Path
-from shutil import copy2
 
 from backend.gpu_detector import GPU
+from backend.domain_xml import PCIAddress, xml_attr, xml_text
+from backend.host_capabilities import find_ovmf_code_path
+from backend.nvram_store import NVRAMStore
+from backend.disk_profiles import DiskProfile, get_disk_profile
 from utils.logger import logger
 import config
 
@@ -17,75 +19,34 @@ import config
 class XMLGenerator:
     """Generate libvirt domain XML for Windows VMs"""
     
-    def __init__(self):
+    def __init__(self, conn=None):
+        """
+        Args:
+            conn: Optional libvirt connection used to look up firmware
+                  through the host capabilities cache
+        """
+        self.conn = conn
+        self.nvram_store = NVRAMStore()
         self.ovmf_code_path = self._find_ovmf_code_path()
 
-
     def _find_ovmf_code_path(self) -> str:
         """Find OVMF CODE firmware path on system"""
-        possible_paths = [
-            "/usr/share/OVMF/OVMF_CODE_4M.ms.fd",
-            "/usr/share/OVMF/OVMF_CODE_4M.fd",
-            "/usr/share/OVMF/OVMF_CODE.fd",
-            "/usr/share/edk2-ovmf/OVMF_CODE.fd",
-            "/usr/share/qemu/OVMF_CODE.fd"
-        ]
-        
-        for path in possible_paths:
-            if Path(path).exists():
-                logger.info(f"Using OVMF CODE firmware: {path}")
-                return path
-        
-        # Fallback - use libvirt to detect
-        try:
-            result = subprocess.run(
-                ['virsh', 'domcapabilities', '--machine', 'q35'],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            
-            if result.returncode == 0:
-                import xml.etree.ElementTree as ET
-                root = ET.fromstring(result.stdout)
-                
-                for loader in root.findall('.//loader/value'):
-                    path = loader.text
-                    if path and 'OVMF_CODE' in path and Path(path).exists():
-                        logger.info(f"Auto-detected OVMF CODE: {path}")
-                        return path
-        except Exception as e:
-            logger.debug(f"Failed to auto-detect OVMF: {e}")
+        path = find_ovmf_code_path(self.conn)
+        if path:
+            logger.info(f"Using OVMF CODE firmware: {path}")
+            return path
         
         # Default fallback
         logger.warning("OVMF CODE firmware not found; VM launch may fail.")
         return "/usr/share/OVMF/OVMF_CODE_4M.fd"
 
-    def _prepare_ovmf_vars_file(self, vm_name: str) -> str:
+    def _prepare_ovmf_vars_file(self, vm_uuid: str, template: Optional[str] = None) -> str:
         """
-        Prepare NVRAM vars file per VM by copying template if missing.
+        Prepare NVRAM vars file per VM by cloning the template if missing.
 
-        Returns full path to NVRAM vars file for given VM.
+        Returns full path to NVRAM vars file for given VM UUID.
         """
-        nvram_dir = Path.home() / ".local" / "share" / "virtflow" / "nvram"
-        nvram_dir.mkdir(parents=True, exist_ok=True)
-        nvram_path = nvram_dir / f"{vm_name}_VARS.fd"
-
-        templates = [
-            Path("/usr/share/OVMF/OVMF_VARS_4M.ms.fd"),
-            Path("/usr/share/OVMF/OVMF_VARS_4M.fd"),
-            Path("/usr/share/OVMF/OVMF_VARS.fd"),
-        ]
-
-        for template_path in templates:
-            if template_path.exists():
-                if not nvram_path.exists():
-                    copy2(str(template_path), str(nvram_path))
-                    logger.info(f"Copied OVMF vars template for VM '{vm_name}'")
-                return str(nvram_path)
-
-        logger.warning("OVMF vars template not found; boot may fail.")
-        return str(nvram_path)
+        return self.nvram_store.create(vm_uuid, template)
     
     def generate_windows_vm_xml(
         self,
@@ -93,14 +54,23 @@ class XMLGenerator:
         memory_mb: int,
         vcpus: int,
         disk_path: str,
-        iso_path: str,
-        virtio_iso_path: str,
+        iso_path: Optional[str],
+        virtio_iso_path: Optional[str],
         gpu: Optional[GPU] = None,
         enable_tpm: bool = True,
-        enable_gpu_passthrough: bool = False
+        enable_gpu_passthrough: bool = False,
+        nvram_template: Optional[str] = None,
+        disk_profile: Optional[DiskProfile] = None,
+        disk_size_gb: Optional[int] = None
     ) -> str:
         """
         Generate complete XML for Windows 10/11 VM
+        
+        ISO paths may be None for VMs whose disk is already installed
+        (e.g. linked clones), in which case no CD-ROM drives are added
+        and the VM boots straight from disk. nvram_template overrides the
+        OVMF vars file cloned for the new VM. disk_profile and disk_size_gb
+        select the disk driver tuning (cache mode, AIO, qcow2 metadata cache).
         """
         # Check if OVMF exists
         if not Path(self.ovmf_code_path).exists():
@@ -118,7 +88,7 @@ class XMLGenerator:
         # Domain header
         xml_parts.append('<?xml version="1.0" encoding="UTF-8"?>')
         xml_parts.append('<domain type="kvm">')
-        xml_parts.append(f'  <name>{vm_name}</name>')
+        xml_parts.append(f'  <name>{xml_text(vm_name)}</name>')
         xml_parts.append(f'  <uuid>{vm_uuid}</uuid>')
         xml_parts.append(f'  <metadata>')
         xml_parts.append(f'    <libosinfo:libosinfo xmlns:libosinfo="http://libosinfo.org/xmlns/libvirt/domain/1.0">')
@@ -134,7 +104,11 @@ class XMLGenerator:
         xml_parts.append(f'  <vcpu placement="static">{vcpus}</vcpu>')
         
         # OS boot configuration
-        xml_parts.append(self._generate_os_config(vm_name, enable_tpm))
+        xml_parts.append(self._generate_os_config(
+            vm_uuid, enable_tpm,
+            boot_cdrom=iso_path is not None,
+            nvram_template=nvram_template
+        ))
         
         # Features
         xml_parts.append(self._generate_features())
@@ -160,11 +134,13 @@ class XMLGenerator:
         xml_parts.append('    </controller>')
         
         # Disk (main Windows installation)
-        xml_parts.append(self._generate_disk_config(disk_path))
+        xml_parts.append(self._generate_disk_config(disk_path, disk_profile, disk_size_gb))
         
         # CD-ROM drives (Windows ISO + VirtIO ISO)
-        xml_parts.append(self._generate_cdrom_config(iso_path, 'sda'))
-        xml_parts.append(self._generate_cdrom_config(virtio_iso_path, 'sdb'))
+        if iso_path:
+            xml_parts.append(self._generate_cdrom_config(iso_path, 'sda'))
+        if virtio_iso_path:
+            xml_parts.append(self._generate_cdrom_config(virtio_iso_path, 'sdb'))
         
         # Network
         xml_parts.append(self._generate_network_config())
@@ -191,6 +167,7 @@ class XMLGenerator:
         
         # Memory balloon
         xml_parts.append('    <memballoon model="virtio">')
+        xml_parts.append(f'      <stats period="{config.BALLOON_STATS_PERIOD}"/>')
         xml_parts.append('      <address type="pci" domain="0x0000" bus="0x05" slot="0x00" function="0x0"/>')
         xml_parts.append('    </memballoon>')
         
@@ -214,18 +191,26 @@ class XMLGenerator:
             'threads': 1
         }
     
-    def _generate_os_config(self, vm_name: str, enable_tpm: bool) -> str:
-        nvram_path = self._prepare_ovmf_vars_file(vm_name)
+    def _generate_os_config(
+        self,
+        vm_uuid: str,
+        enable_tpm: bool,
+        boot_cdrom: bool = True,
+        nvram_template: Optional[str] = None
+    ) -> str:
+        nvram_path = self._prepare_ovmf_vars_file(vm_uuid, nvram_template)
         config = [
             '  <os>',
             '    <type arch="x86_64" machine="q35">hvm</type>',
-            f'    <loader readonly="yes" type="pflash">{self.ovmf_code_path}</loader>',
-            f'    <nvram>{nvram_path}</nvram>',
+            f'    <loader readonly="yes" type="pflash">{xml_text(self.ovmf_code_path)}</loader>',
+            f'    <nvram>{xml_text(nvram_path)}</nvram>',
             '    <boot dev="cdrom"/>',
             '    <boot dev="hd"/>',
             '    <bootmenu enable="yes"/>',
             '  </os>'
         ]
+        if not boot_cdrom:
+            config.remove('    <boot dev="cdrom"/>')
         return '\n'.join(config)
     
     def _generate_features(self) -> str:
@@ -278,12 +263,35 @@ class XMLGenerator:
         ]
         return '\n'.join(config)
     
-    def _generate_disk_config(self, disk_path: str) -> str:
+    def _generate_disk_config(
+        self,
+        disk_path: str,
+        profile: Optional[DiskProfile] = None,
+        size_gb: Optional[int] = None
+    ) -> str:
         """Generate virtio-blk disk configuration"""
+        profile = profile or get_disk_profile(None)
+        driver_attrs = ' '.join(
+            f'{key}="{xml_attr(value)}"' for key, value in profile.driver_attributes().items()
+        )
+        
+        # Size the qcow2 L2 cache to cover the whole disk
+        cache_bytes = profile.metadata_cache_bytes(size_gb) if size_gb else None
+        if cache_bytes:
+            driver = [
+                f'      <driver {driver_attrs}>',
+                '        <metadata_cache>',
+                f'          <max_size unit="bytes">{cache_bytes}</max_size>',
+                '        </metadata_cache>',
+                '      </driver>'
+            ]
+        else:
+            driver = [f'      <driver {driver_attrs}/>']
+        
         config = [
             f'    <disk type="file" device="disk">',
-            f'      <driver name="qemu" type="qcow2" cache="writeback"/>',
-            f'      <source file="{disk_path}"/>',
+            *driver,
+            f'      <source file="{xml_attr(disk_path)}"/>',
             '      <target dev="vda" bus="virtio"/>',
             '      <address type="pci" domain="0x0000" bus="0x04" slot="0x00" function="0x0"/>',
             '    </disk>'
@@ -295,8 +303,8 @@ class XMLGenerator:
         config = [
             '    <disk type="file" device="cdrom">',
             '      <driver name="qemu" type="raw"/>',
-            f'      <source file="{iso_path}"/>',
-            f'      <target dev="{dev_name}" bus="sata"/>',
+            f'      <source file="{xml_attr(iso_path)}"/>',
+            f'      <target dev="{xml_attr(dev_name)}" bus="sata"/>',
             '      <readonly/>',
             '    </disk>'
         ]
@@ -332,18 +340,13 @@ class XMLGenerator:
     
     def _generate_pci_hostdev(self, pci_address: str) -> str:
         """Generate PCI hostdev passthrough for GPU"""
-        parts = pci_address.split(':')
-        domain = parts[0]
-        bus = parts[1]
-        slot_func = parts[2].split('.')
-        slot = slot_func[0]
-        function = slot_func[1]
+        address = PCIAddress.parse(pci_address).to_attributes()
         
         config = [
             '    <hostdev mode="subsystem" type="pci" managed="yes">',
             '      <source>',
-            f'        <address domain="0x{domain}" bus="0x{bus}" '
-            f'slot="0x{slot}" function="0x{function}"/>',
+            f'        <address domain="{address["domain"]}" bus="{address["bus"]}" '
+            f'slot="{address["slot"]}" function="{address["function"]}"/>',
             '      </source>',
             '      <address type="pci" domain="0x0000" bus="0x07" slot="0x00" function="0x0"/>',
             '    </hostdev>'
@@ -0,0 +1,587 @@
+#!/usr/bin/env python3
+"""
+VirtFlow - Command line interface
+
+Headless access to the same backend the GUI uses, for scripts and batch
+work. Qt is never imported and backend modules are only imported by the
+command that needs them, so short invocations stay fast in shell loops.
+
+Commands that take several VMs run them on a bounded worker pool
+(--jobs). Logs go to stderr; stdout carries only command output, as
+plain text or as JSON with --json. The exit status is 0 only if every
+VM succeeded.
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import config
+
+
+DEFAULT_JOBS = min(8, os.cpu_count() or 1)
+
+
+def _connect(args):
+    """Open the libvirt connection shared by all workers"""
+    from backend.libvirt_manager import LibvirtManager
+
+    manager = LibvirtManager(args.uri)
+    if manager.connection is None:
+        raise RuntimeError(f"Cannot connect to libvirt at {manager.uri}")
+    return manager
+
+
+def _resolve_domains(manager, args, active: Optional[bool] = None) -> List:
+    """
+    Map VM names (or --all) to domains
+
+    Unknown names become failed results instead of aborting the batch.
+    """
+    if getattr(args, 'all', False):
+        domains = manager.list_all_vms()
+        if active is not None:
+            domains = [d for d in domains if bool(d.isActive()) == active]
+        return domains
+    return [manager.get_vm_by_name(name) or name for name in args.names]
+
+
+def _run_parallel(args, items: List, action: Callable[..., Dict]) -> List[Dict]:
+    """
+    Run an action for each VM on a bounded pool
+
+    Args:
+        args: Parsed arguments (--jobs)
+        items: Domains, or names that could not be resolved
+        action: Called with a domain; returns extra result fields and
+                raises or returns {'ok': False, ...} on failure
+
+    Returns:
+        One result dict per item, in input order
+    """
+    def run(item) -> Dict:
+        if isinstance(item, str):
+            return {'name': item, 'ok': False, 'error': "VM not found"}
+        name = item.name()
+        try:
+            result = {'name': name, 'ok': True}
+            result.update(action(item) or {})
+            return result
+        except Exception as e:
+            return {'name': name, 'ok': False, 'error': str(e)}
+
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(args.jobs, len(items))),
+                            thread_name_prefix="virtflow-cli") as executor:
+        return list(executor.map(run, items))
+
+
+def _wait_for_disk_jobs():
+    """Let background disk jobs (e.g. snapshot commits) finish before exiting"""
+    from backend.disk_jobs import disk_jobs
+
+    for job in disk_jobs.jobs():
+        job.wait()
+
+
+def _run_bulk(args, controller, items: List, operation: str, **kwargs) -> List[Dict]:
+    """
+    Run a lifecycle operation on several VMs through BulkLifecycle
+
+    Args:
+        args: Parsed arguments (--jobs)
+        controller: VMController of the connection
+        items: Domains, or names that could not be resolved
+        operation: One of bulk_lifecycle.OPERATIONS
+        kwargs: Passed to the operation
+
+    Returns:
+        One result dict per item, in input order
+    """
+    from backend.bulk_lifecycle import BulkLifecycle
+
+    domains = [item for item in items if not isinstance(item, str)]
+    done = {
+        result.name: result.to_dict()
+        for result in BulkLifecycle(controller, max_workers=args.jobs).run(operation, domains, **kwargs)
+    }
+    return [
+        {'name': item, 'ok': False, 'error': "VM not found"} if isinstance(item, str) else done[item.name()]
+        for item in items
+    ]
+
+
+def _parse_depends(values: Optional[List[str]]) -> Optional[Dict[str, List[str]]]:
+    """Parse --depends VM=DEP[,DEP] options (None: use config)"""
+    if not values:
+        return None
+    depends = {}
+    for value in values:
+        name, separator, deps = value.partition('=')
+        if not separator or not name.strip():
+            raise ValueError(f"Invalid --depends '{value}', expected VM=DEP[,DEP]")
+        depends.setdefault(name.strip(), []).extend(d.strip() for d in deps.split(',') if d.strip())
+    return depends
+
+
+def _check(ok: bool, message: str) -> Dict:
+    if not ok:
+        raise RuntimeError(message)
+    return {}
+
+
+# ----------------------------------------------------------------------
+# Commands
+# ----------------------------------------------------------------------
+
+def cmd_list(args) -> List[Dict]:
+    from backend.vm_controller import VMController
+
+    manager = _connect(args)
+    controller = VMController(manager)
+
+    def info(domain) -> Dict:
+        details = controller.get_vm_info(domain)
+        if not details:
+            raise RuntimeError("Failed to get VM info")
+        return details
+
+    return _run_parallel(args, manager.list_all_vms(), info)
+
+
+def cmd_start(args) -> List[Dict]:
+    from backend.vm_controller import VMController
+
+    depends = _parse_depends(args.depends)
+    manager = _connect(args)
+    return _run_bulk(
+        args, VMController(manager), _resolve_domains(manager, args, active=False), 'start',
+        stagger=args.stagger, depends=depends
+    )
+
+
+def cmd_stop(args) -> List[Dict]:
+    from backend.vm_controller import VMController
+
+    manager = _connect(args)
+    controller = VMController(manager)
+    domains = _resolve_domains(manager, args, active=True)
+    if args.wait is not None and not args.force:
+        results = _run_bulk(args, controller, domains, 'shutdown',
+                            timeout=args.wait, force_after=args.force_after)
+    else:
+        results = _run_bulk(args, controller, domains, 'stop', force=args.force)
+    controller.wait_for_gpu_restore()
+    return results
+
+
+def _cmd_lifecycle(args) -> List[Dict]:
+    """pause, resume and reboot"""
+    from backend.vm_controller import VMController
+
+    manager = _connect(args)
+    return _run_bulk(args, VMController(manager), _resolve_domains(manager, args, active=True), args.command)
+
+
+def cmd_autostart(args) -> List[Dict]:
+    from backend.domain_xml import XML_INACTIVE
+    from backend.vm_controller import VMController
+
+    manager = _connect(args)
+
+    if args.autostart_command == 'run':
+        from backend.autostart_scheduler import AutostartScheduler
+
+        return [result.to_dict() for result in AutostartScheduler(manager, args.concurrency).run()]
+
+    if args.autostart_command == 'list':
+        def show(domain) -> Dict:
+            policy = manager.domains.facts(domain, XML_INACTIVE).autostart
+            if policy is None:
+                return {'autostart': False, 'action': "no autostart"}
+            return {'autostart': True, 'priority': policy.priority, 'delay': policy.delay,
+                    'action': f"priority {policy.priority}, delay {policy.delay:g}s"}
+
+        results = _run_parallel(args, manager.list_all_vms(), show)
+        return results if args.all else [r for r in results if not r['ok'] or r['autostart']]
+
+    controller = VMController(manager)
+    if args.autostart_command == 'enable':
+        def action(domain):
+            return _check(controller.set_autostart(domain, True, args.priority, args.delay),
+                          "Failed to enable autostart")
+    else:  # disable
+        def action(domain):
+            return _check(controller.set_autostart(domain, False), "Failed to disable autostart")
+
+    return _run_parallel(args, _resolve_domains(manager, args), action)
+
+
+def cmd_balloon(args) -> List[Dict]:
+    """Rebalance guest balloons in the foreground until interrupted (or once)"""
+    import time
+    from backend.balloon_controller import BalloonController
+
+    controller = BalloonController(_connect(args), args.interval)
+    results = []
+    try:
+        while True:
+            for change in controller.rebalance():
+                results.append({
+                    'name': change.name, 'ok': True, 'current_kib': change.current_kib,
+                    'target_kib': change.target_kib,
+                    'action': f"{change.direction} {change.current_kib // 1024} -> "
+                              f"{change.target_kib // 1024} MiB ({change.reason})"
+                })
+            if args.once:
+                break
+            time.sleep(controller.interval)
+    except KeyboardInterrupt:
+        pass
+    return results
+
+
+def cmd_activate_gpu(args) -> List[Dict]:
+    from backend.gpu_detector import GPUDetector
+    from backend.vm_gpu_configurator import VMGPUConfigurator
+
+    manager = _connect(args)
+    detector = GPUDetector()
+    if args.gpu:
+        gpu = detector.get_gpu_by_address(args.gpu)
+        if gpu is None:
+            raise RuntimeError(f"No GPU at {args.gpu}")
+    else:
+        gpus = detector.get_passthrough_gpus()
+        if not gpus:
+            raise RuntimeError("No GPU available for passthrough")
+        gpu = gpus[0]
+
+    # One GPU can only be attached to one VM, so this is never parallel
+    configurator = VMGPUConfigurator(manager)
+    ok = configurator.enable_gpu_passthrough(args.name, gpu)
+    result = {'name': args.name, 'ok': ok, 'gpu': gpu.pci_address}
+    if not ok:
+        result['error'] = "GPU passthrough activation failed"
+    return [result]
+
+
+def _load_specs(paths: List[str]) -> List:
+    """Read VM specs from JSON files holding one object or a list of them"""
+    from backend.vm_provisioner import VMSpec
+
+    specs = []
+    for path in paths:
+        with open(path) as f:
+            data = json.load(f)
+        for entry in data if isinstance(data, list) else [data]:
+            specs.append(VMSpec.from_dict(entry))
+    return specs
+
+
+def cmd_create_from_spec(args) -> List[Dict]:
+    from backend.vm_controller import VMController
+    from backend.vm_provisioner import VMProvisioner
+
+    specs = _load_specs(args.specs)
+    manager = _connect(args)
+    provisioner = VMProvisioner(manager)
+    controller = VMController(manager)
+
+    def create(spec) -> Dict:
+        result = {'name': spec.name, 'ok': True}
+        try:
+            domain = provisioner.provision(spec, overwrite=args.overwrite)
+            if domain is None:
+                raise RuntimeError("Disk creation cancelled")
+            result['uuid'] = domain.UUIDString()
+            if args.start:
+                _check(controller.start_vm(domain), "Created, but failed to start")
+        except Exception as e:
+            result.update(ok=False, error=str(e))
+        return result
+
+    if not specs:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(args.jobs, len(specs))),
+                            thread_name_prefix="virtflow-cli") as executor:
+        return list(executor.map(create, specs))
+
+
+def cmd_apply_fleet(args) -> List[Dict]:
+    from backend.fleet import FleetExecutor, FleetManifest
+
+    manifest = FleetManifest.load(args.manifest)
+    manager = _connect(args)
+    executor = FleetExecutor(manager, max_workers=args.jobs)
+    plan = executor.plan(manifest, overwrite=args.overwrite)
+    for warning in plan.warnings:
+        print(f"virtflow: warning: {warning}", file=sys.stderr)
+    if not plan.ok:
+        raise RuntimeError("Manifest has errors:\n  " + "\n  ".join(plan.errors))
+
+    if args.dry_run:
+        return ([{'name': name, 'ok': True, 'action': 'exists'} for name in plan.existing] +
+                [{'name': spec.name, 'ok': True, 'action': 'create'} for spec in plan.create])
+
+    results = []
+    for result in executor.apply(plan):
+        entry = {'name': result.name, 'ok': result.action != 'failed', 'action': result.action}
+        if result.uuid:
+            entry['uuid'] = result.uuid
+        if result.error:
+            entry['error'] = result.error
+        results.append(entry)
+    return results
+
+
+def cmd_snapshot(args) -> List[Dict]:
+    from dataclasses import asdict
+    from backend.vm_controller import VMController
+
+    manager = _connect(args)
+    snapshots = VMController(manager).snapshots
+    domains = _resolve_domains(manager, args)
+
+    if args.snapshot_command == 'list':
+        def action(domain):
+            return {'snapshots': [asdict(s) for s in snapshots.list_snapshots(domain)]}
+    elif args.snapshot_command == 'create':
+        def action(domain):
+            info = snapshots.create_snapshot(
+                domain, args.snapshot, args.description,
+                memory=args.memory, quiesce=args.quiesce
+            )
+            if info is None:
+                raise RuntimeError(f"Failed to create snapshot '{args.snapshot}'")
+            return {'snapshot': asdict(info)}
+    elif args.snapshot_command == 'revert':
+        def action(domain):
+            return _check(
+                snapshots.revert_snapshot(domain, args.snapshot, start=args.start or None),
+                f"Failed to revert to '{args.snapshot}'"
+            )
+    elif args.snapshot_command == 'quick-revert':
+        def action(domain):
+            return _check(snapshots.quick_revert(domain, start=args.start), "Quick revert failed")
+    else:  # delete
+        def action(domain):
+            return _check(
+                snapshots.delete_snapshot(domain, args.snapshot),
+                f"Failed to delete '{args.snapshot}'"
+            )
+
+    results = _run_parallel(args, domains, action)
+    _wait_for_disk_jobs()
+    return results
+
+
+# ----------------------------------------------------------------------
+# Output
+# ----------------------------------------------------------------------
+
+def _format_text(command: str, results: List[Dict]) -> str:
+    lines = []
+    if command == 'list':
+        lines.append(f"{'NAME':<24} {'STATE':<14} {'VCPUS':>5} {'MEMORY':>10} AUTOSTART")
+        for vm in results:
+            if not vm['ok']:
+                lines.append(f"{vm['name']:<24} error: {vm['error']}")
+                continue
+            lines.append(
+                f"{vm['name']:<24} {vm['state_name']:<14} {vm['vcpus']:>5} "
+                f"{vm['max_memory'] // 1024:>7} MB {'yes' if vm['autostart'] else 'no'}"
+            )
+        return "\n".join(lines)
+
+    for result in results:
+        if not result['ok']:
+            lines.append(f"{result['name']}: FAILED: {result.get('error', 'unknown error')}")
+        elif 'action' in result:
+            lines.append(f"{result['name']}: {result['action']}")
+        elif 'snapshots' in result:
+            for snapshot in result['snapshots']:
+                marker = '*' if snapshot['is_current'] else ' '
+                kind = 'external' if snapshot['external'] else 'internal'
+                memory = ', memory' if snapshot['has_memory'] else ''
+                lines.append(f"{result['name']}: {marker} {snapshot['name']} ({kind}{memory})")
+        else:
+            lines.append(f"{result['name']}: ok")
+    return "\n".join(lines)
+
+
+# ----------------------------------------------------------------------
+# Entry point
+# ----------------------------------------------------------------------
+
+def _add_targets(parser: argparse.ArgumentParser):
+    parser.add_argument('names', nargs='*', metavar='VM', help="VM names")
+    parser.add_argument('--all', action='store_true', help="All matching VMs")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="virtflow",
+        description=f"{config.APP_NAME} command line interface"
+    )
+    parser.add_argument('--version', action='version', version=f"%(prog)s {config.APP_VERSION}")
+    parser.add_argument('--uri', default=None,
+                        help=f"libvirt connection URI (default: {config.DEFAULT_LIBVIRT_URI})")
+    parser.add_argument('--json', action='store_true', help="Print results as JSON")
+    parser.add_argument('-j', '--jobs', type=int, default=DEFAULT_JOBS,
+                        help=f"VMs processed in parallel (default: {DEFAULT_JOBS})")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Show informational logs")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('list', help="List VMs").set_defaults(handler=cmd_list)
+
+    start = commands.add_parser('start', help="Start VMs")
+    _add_targets(start)
+    start.add_argument('--stagger', type=float, metavar='SECONDS',
+                       help=f"Wait SECONDS between starts (default: {config.START_STAGGER:g})")
+    start.add_argument('--depends', action='append', metavar='VM=DEP[,DEP]',
+                       help="Start DEPs before VM (repeatable; default: config.VM_START_DEPENDENCIES)")
+    start.set_defaults(handler=cmd_start)
+
+    stop = commands.add_parser('stop', help="Shut down VMs")
+    _add_targets(stop)
+    stop.add_argument('--force', action='store_true', help="Power off instead of shutting down")
+    stop.add_argument('--wait', type=float, metavar='SECONDS',
+                      help="Wait up to SECONDS for the VMs to stop")
+    stop.add_argument('--force-after', action='store_true',
+                      help="With --wait, power off VMs still running after SECONDS")
+    stop.set_defaults(handler=cmd_stop)
+
+    for name, help in (
+        ('pause', "Pause running VMs"),
+        ('resume', "Resume paused VMs"),
+        ('reboot', "Reboot running VMs"),
+    ):
+        command = commands.add_parser(name, help=help)
+        _add_targets(command)
+        command.set_defaults(handler=_cmd_lifecycle)
+
+    autostart = commands.add_parser('autostart', help="Start VMs at boot, by priority")
+    autostart.set_defaults(handler=cmd_autostart)
+    autostart_commands = autostart.add_subparsers(dest='autostart_command', required=True)
+
+    autostart_run = autostart_commands.add_parser(
+        'run', help="Start all autostart VMs that are not running (run once at boot)"
+    )
+    autostart_run.add_argument('--concurrency', type=int, default=config.AUTOSTART_JOBS, metavar='N',
+                               help=f"VMs started at once (default: {config.AUTOSTART_JOBS})")
+
+    autostart_list = autostart_commands.add_parser('list', help="Show autostart VMs")
+    autostart_list.add_argument('--all', action='store_true', help="Include VMs without autostart")
+
+    autostart_enable = autostart_commands.add_parser('enable', help="Start VMs at boot")
+    _add_targets(autostart_enable)
+    autostart_enable.add_argument('--priority', type=int, default=0,
+                                  help="Higher priorities start first (default: 0)")
+    autostart_enable.add_argument('--delay', type=float, default=0.0, metavar='SECONDS',
+                                  help="Start no earlier than SECONDS after boot (default: 0)")
+
+    autostart_disable = autostart_commands.add_parser('disable', help="Stop starting VMs at boot")
+    _add_targets(autostart_disable)
+
+    balloon = commands.add_parser('balloon', help="Shrink idle VMs while the host is short on memory")
+    balloon.add_argument('--interval', type=float, metavar='SECONDS',
+                         help=f"Seconds between passes (default: {config.BALLOON_INTERVAL:g})")
+    balloon.add_argument('--once', action='store_true',
+                         help="Run a single pass (only grows; shrinking needs several idle samples)")
+    balloon.set_defaults(handler=cmd_balloon)
+
+    gpu = commands.add_parser('activate-gpu', help="Enable GPU passthrough for a VM")
+    gpu.add_argument('name', metavar='VM')
+    gpu.add_argument('--gpu', metavar='PCI_ADDRESS', help="GPU to use (default: first available)")
+    gpu.set_defaults(handler=cmd_activate_gpu)
+
+    create = commands.add_parser('create-from-spec', help="Create VMs from JSON spec files")
+    create.add_argument('specs', nargs='+', metavar='SPEC', help="JSON file with one spec or a list")
+    create.add_argument('--overwrite', action='store_true', help="Replace existing disk images")
+    create.add_argument('--start', action='store_true', help="Start each VM once created")
+    create.set_defaults(handler=cmd_create_from_spec)
+
+    fleet = commands.add_parser('apply-fleet', help="Create the missing VMs of a fleet manifest")
+    fleet.add_argument('manifest', help="JSON (or YAML, with PyYAML) manifest")
+    fleet.add_argument('--dry-run', action='store_true', help="Validate and show what would be created")
+    fleet.add_argument('--overwrite', action='store_true',
+                       help="Replace disk images left behind without a VM")
+    fleet.set_defaults(handler=cmd_apply_fleet)
+
+    snapshot = commands.add_parser('snapshot', help="Manage snapshots")
+    snapshot.set_defaults(handler=cmd_snapshot)
+    snapshot_commands = snapshot.add_subparsers(dest='snapshot_command', required=True)
+
+    snapshot_list = snapshot_commands.add_parser('list', help="List snapshots")
+    _add_targets(snapshot_list)
+
+    snapshot_create = snapshot_commands.add_parser('create', help="Take a snapshot")
+    snapshot_create.add_argument('snapshot', metavar='NAME')
+    _add_targets(snapshot_create)
+    snapshot_create.add_argument('--description', default="")
+    snapshot_create.add_argument('--memory', action=argparse.BooleanOptionalAction, default=None,
+                                 help="Save RAM state (default: if the VM is running)")
+    snapshot_create.add_argument('--quiesce', action='store_true',
+                                 help="Freeze guest filesystems (needs the guest agent)")
+
+    snapshot_revert = snapshot_commands.add_parser('revert', help="Revert to a snapshot")
+    snapshot_revert.add_argument('snapshot', metavar='NAME')
+    _add_targets(snapshot_revert)
+    snapshot_revert.add_argument('--start', action='store_true', help="Leave the VM running")
+
+    snapshot_quick = snapshot_commands.add_parser(
+        'quick-revert', help="Reset VMs to their current external snapshot"
+    )
+    _add_targets(snapshot_quick)
+    snapshot_quick.add_argument('--start', action='store_true', help="Start the VM afterwards")
+
+    snapshot_delete = snapshot_commands.add_parser('delete', help="Delete a snapshot")
+    snapshot_delete.add_argument('snapshot', metavar='NAME')
+    _add_targets(snapshot_delete)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Command line entry point"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    import logging
+    from utils.logger import set_console_stream
+    set_console_stream(sys.stderr, logging.INFO if args.verbose else logging.WARNING)
+
+    # A run is too short to scrape, so metrics only go to the textfile, once at exit
+    from utils import metrics
+    metrics.registry.enabled = bool(config.METRICS_TEXTFILE)
+
+    try:
+        results = args.handler(args)
+    except Exception as e:
+        if args.json:
+            print(json.dumps({'ok': False, 'error': str(e)}))
+        else:
+            print(f"virtflow: error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if metrics.registry.enabled:
+            metrics.write_textfile(config.METRICS_TEXTFILE)
+
+    if args.json:
+        print(json.dumps(results, indent=2, default=str))
+    else:
+        output = _format_text(args.command, results)
+        if output:
+            print(output)
+    return 0 if all(result['ok'] for result in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
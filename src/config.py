@@ -17,16 +17,97 @@ ASSETS_DIR = BASE_DIR / "ui" / "assets"
 ICONS_DIR = ASSETS_DIR / "icons"
 STYLES_DIR = BASE_DIR / "ui" / "styles"
 
+# VirtFlow data directories
+DATA_DIR = Path.home() / ".local" / "share" / "virtflow"
+CACHE_DIR = Path.home() / ".cache" / "virtflow"
+NVRAM_DIR = DATA_DIR / "nvram"
+TEMPLATES_DIR = DATA_DIR / "templates"
+SNAPSHOTS_DIR = DATA_DIR / "snapshots"  # external memory state files
+
 # libvirt defaults
 DEFAULT_LIBVIRT_URI = "qemu:///system"
 VM_STORAGE_POOL = "default"
 DEFAULT_VM_RAM = 4096  # MB
 DEFAULT_VM_VCPUS = 2
 DEFAULT_VM_DISK_SIZE = 40  # GB
+DISK_JOBS_PER_DEVICE = 1  # concurrent qemu-img jobs per storage device
+DISK_JOB_HISTORY = 100  # finished disk jobs kept for the jobs list
+LIBVIRT_HOSTS = None  # name -> URI shown together, e.g. {"local": "qemu:///system", "rig2": "qemu+ssh://rig2/system"}
+HOST_TIMEOUT = 5.0  # seconds a host may take to answer a list/stats query
+LIBVIRT_KEEPALIVE_INTERVAL = 5  # seconds between keepalive probes
+LIBVIRT_KEEPALIVE_COUNT = 3  # unanswered probes before the connection is dropped
+LIBVIRT_RECONNECT_DELAY = 0.5  # seconds before the first retry after a failed connect
+LIBVIRT_RECONNECT_MAX_DELAY = 30.0  # backoff cap
+
+# Per-VM metrics (CPU, balloon, disk and network sparklines)
+METRICS_INTERVAL = 2.0  # seconds between getAllDomainStats samples
+METRICS_HISTORY = 60  # samples kept per VM and metric
+
+# Prometheus metrics (disabled unless a port or textfile is set)
+METRICS_PORT = os.environ.get("VIRTFLOW_METRICS_PORT") or None  # served on 127.0.0.1; parsed by metrics.configure()
+METRICS_TEXTFILE = os.environ.get("VIRTFLOW_METRICS_TEXTFILE") or None  # node-exporter .prom file
+METRICS_TEXTFILE_INTERVAL = 15.0  # seconds between textfile rewrites
+
+# Fleet manifests
+FLEET_JOBS = 4  # VMs provisioned concurrently
+FLEET_CPU_OVERCOMMIT = 4.0  # defined vCPUs allowed per host CPU
+
+# Bulk lifecycle operations (multi-select and CLI)
+BULK_JOBS = 4  # VMs started/stopped concurrently
+START_STAGGER = 0.0  # seconds between consecutive starts of a group
+SHUTDOWN_TIMEOUT = 120  # seconds to wait for guests to shut down
+VM_START_DEPENDENCIES = {}  # VM name -> names started first, e.g. {"web": ["router"]}
+
+# Autostart scheduler (`virtflow autostart run` at boot)
+AUTOSTART_JOBS = 2  # VMs started concurrently
+AUTOSTART_STORAGE_LATENCY_MS = 50.0  # hold starts while VM disks are slower than this
+AUTOSTART_GATE_TIMEOUT = 300  # seconds a VM may wait for host resources (then skipped, or started if only storage is slow)
+AUTOSTART_POLL_INTERVAL = 1.0  # seconds between resource checks
+
+# Memory admission control before VM starts
+ADMISSION_MODE = "refuse"  # "refuse", "warn" (start anyway, with a warning) or "off"
+ADMISSION_OVERCOMMIT = 1.0  # guest memory allowed per byte of host RAM (outside hugepage pools)
+ADMISSION_HOST_RESERVE_MB = 2048  # kept free for the host desktop and QEMU overhead
+ADMISSION_QUEUE_TIMEOUT = 60  # seconds a start may wait for memory to be freed
+
+# Balloon rebalancing of idle guests (hugepage, locked and passthrough guests are never touched)
+BALLOON_ENABLED = False  # run the controller in the GUI
+BALLOON_INTERVAL = 10.0  # seconds between passes
+BALLOON_STATS_PERIOD = 5  # seconds between guest memory reports (set on guests that lack it)
+BALLOON_HOST_LOW_MB = 4096  # shrink idle guests while host MemAvailable is below this
+BALLOON_HOST_HIGH_MB = 8192  # give memory back while it is above this
+BALLOON_SHRINK_ABOVE = 0.5  # guest is idle while this share of its memory is usable
+BALLOON_GROW_BELOW = 0.1  # guest gets memory back as soon as less than this share is usable
+BALLOON_IDLE_SAMPLES = 3  # passes a guest must stay idle before it is shrunk
+BALLOON_HEADROOM = 0.25  # kept on top of the memory a shrunk guest uses
+BALLOON_FLOOR_RATIO = 0.25  # never shrink below this share of the guest's maximum
+BALLOON_MIN_MB = 512  # ... nor below this
+BALLOON_STEP_MB = 512  # largest change per pass
+BALLOON_MIN_CHANGE_MB = 64  # smaller changes are not applied
+
+# Offline qcow2 compaction of idle VMs
+COMPACTION_INTERVAL_HOURS = 24  # how often idle VMs are checked
+COMPACTION_IDLE_HOURS = 24  # disk must be untouched this long
+COMPACTION_RATE_LIMIT = 200 * 1024 * 1024  # bytes/s, keeps shared storage usable
 
 # GPU Passthrough
 VFIO_DRIVER = "vfio-pci"
-IOMMU_GROUPS_PATH = "/sys/kernel/iommu_groups"
+SYSFS_ROOT = Path(os.environ.get("VIRTFLOW_SYSFS_ROOT", "/sys"))  # overridden for benchmarks
+IOMMU_GROUPS_PATH = str(SYSFS_ROOT / "kernel" / "iommu_groups")
+
+# UEFI firmware (searched in order)
+OVMF_CODE_PATHS = [
+    "/usr/share/OVMF/OVMF_CODE_4M.ms.fd",
+    "/usr/share/OVMF/OVMF_CODE_4M.fd",
+    "/usr/share/OVMF/OVMF_CODE.fd",
+    "/usr/share/edk2-ovmf/OVMF_CODE.fd",
+    "/usr/share/qemu/OVMF_CODE.fd"
+]
+OVMF_VARS_TEMPLATES = [
+    "/usr/share/OVMF/OVMF_VARS_4M.ms.fd",
+    "/usr/share/OVMF/OVMF_VARS_4M.fd",
+    "/usr/share/OVMF/OVMF_VARS.fd",
+]
 
 # UI Settings
 WINDOW_MIN_WIDTH = 1200
@@ -37,7 +118,7 @@ ANIMATION_DURATION = 300  # ms
 
 # Logging
 LOG_LEVEL = "INFO"  # DEBUG, INFO, WARNING, ERROR
-LOG_FILE = Path.home() / ".local" / "share" / "virtflow" / "virtflow.log"
+LOG_FILE = DATA_DIR / "virtflow.log"
 
 # Ensure log directory exists
 LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
@@ -2,109 +2,83 @@
 """
 VirtFlow - Main Entry Point
 Modern GPU Passthrough Virtual Machine Manager
+
+Startup shows the main window first; system checks run concurrently in
+the background and libvirt, the GPU subsystems and other heavy modules are
+only imported once something uses them.
 """
 
+import argparse
 import sys
-import os
-from pathlib import Path
-
-# PySide6 imports
-from PySide6.QtWidgets import QApplication, QMessageBox, QDialog
-from PySide6.QtCore import Qt, QCoreApplication
-from PySide6.QtGui import QIcon
-
-# Local imports
-from ui.main_window import MainWindow
-from utils.logger import setup_logger
-from backend.system_checker import SystemChecker
+import threading
+
+from utils.startup_profiler import StartupProfiler
 import config
 
 
-def check_system_requirements():
+def parse_args(argv):
     """
-    Check if system meets requirements for running VirtFlow
-    Returns: tuple (bool, str) - (success, error_message)
+    Parse VirtFlow options, leaving Qt's own options untouched
+
+    Returns:
+        Tuple of (options, remaining argv for QApplication)
     """
-    from backend.dependency_checker import DependencyChecker
-    
-    checker_dep = DependencyChecker()
-    checker = SystemChecker()
-    
-    # Check if running as root (bad)
-    if os.geteuid() == 0:
-        return False, "Please do not run VirtFlow as root. Add your user to 'libvirt' group instead."
-    
-    # Check system dependencies
-    deps_ok, missing_packages = checker_dep.check_all_dependencies()
-    if not deps_ok:
-        install_cmd = checker_dep.get_install_command(missing_packages)
-        return False, (
-            f"Missing required packages:\n\n{', '.join(missing_packages)}\n\n"
-            f"Install them with:\n{install_cmd}"
-        )
-    
-    # Check user groups
-    groups_ok, missing_groups = checker_dep.check_user_groups()
-    if not groups_ok:
-        return False, (
-            f"User not in required groups: {', '.join(missing_groups)}\n\n"
-            f"Add yourself to groups:\n"
-            f"sudo usermod -aG {' '.join(missing_groups)} $USER\n\n"
-            f"Then log out and log back in."
-        )
-    
-    # Check libvirt daemon
-    if not checker.is_libvirt_running():
-        return False, "libvirtd service is not running. Please start it:\nsudo systemctl start libvirtd"
-    
-    # Check KVM support
-    if not checker.has_kvm_support():
-        return False, "KVM virtualization is not available. Check BIOS settings and CPU support."
-    
-    # Check IOMMU (warning only, not fatal)
-    if not checker.has_iommu_enabled():
-        print("[WARNING] IOMMU is not enabled. GPU passthrough will not work.")
-        print("Please enable IOMMU in BIOS and add 'intel_iommu=on' or 'amd_iommu=on' to kernel parameters.")
-    
-    return True, ""
+    parser = argparse.ArgumentParser(prog="virtflow-gui", add_help=False)
+    parser.add_argument(
+        '--profile-startup',
+        action='store_true',
+        help="Report import and init time per startup phase on stderr"
+    )
+    args, remaining = parser.parse_known_args(argv[1:])
+    return args, argv[:1] + remaining
 
 
 def main():
     """Main application entry point"""
-    
+    args, qt_argv = parse_args(sys.argv)
+    profiler = StartupProfiler(args.profile_startup)
+
+    with profiler.phase("import Qt"):
+        from PySide6.QtWidgets import QApplication, QMessageBox, QDialog
+        from PySide6.QtCore import Qt, QCoreApplication, QObject, QTimer, Signal
+        from PySide6.QtGui import QIcon
+
     # Set application metadata
     QCoreApplication.setApplicationName(config.APP_NAME)
     QCoreApplication.setApplicationVersion(config.APP_VERSION)
     QCoreApplication.setOrganizationName(config.APP_AUTHOR)
-    
+
     # Enable High DPI scaling
     QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
     QApplication.setAttribute(Qt.AA_UseHighDpiPixmaps, True)
-    
+
     # Create application instance
-    app = QApplication(sys.argv)
-    
+    with profiler.phase("create QApplication"):
+        app = QApplication(qt_argv)
+
     # Setup logging
-    logger = setup_logger()
+    with profiler.phase("setup logging"):
+        from utils.logger import setup_logger
+        logger = setup_logger()
     logger.info(f"Starting {config.APP_NAME} v{config.APP_VERSION}")
-    
-    # Check system requirements
-    success, error_msg = check_system_requirements()
-    if not success:
-        from ui.setup_dialog import SetupDialog
-        setup = SetupDialog()
-        if setup.exec() != QDialog.Accepted:
-            return 1
-    
+
+    # Prometheus metrics, if an endpoint port or textfile is configured
+    from utils import metrics
+    metrics.configure()
+
     # Set application icon
     icon_path = config.ICONS_DIR / "app_icon.png"
     if icon_path.exists():
         app.setWindowIcon(QIcon(str(icon_path)))
-    
+
     # Create and show main window
     try:
-        main_window = MainWindow()
-        main_window.show()
+        with profiler.phase("import main window"):
+            from ui.main_window import MainWindow
+        with profiler.phase("create main window"):
+            main_window = MainWindow()
+        with profiler.phase("show main window"):
+            main_window.show()
         logger.info("Main window displayed successfully")
     except Exception as e:
         logger.exception("Failed to create main window")
@@ -114,7 +88,42 @@ def main():
             f"Failed to initialize application:\n{str(e)}"
         )
         return 1
-    
+
+    QTimer.singleShot(0, lambda: profiler.mark("event loop running"))
+
+    # Check system requirements in the background
+    class CheckSignals(QObject):
+        finished = Signal(object)  # StartupCheckResult
+
+    def on_checks_finished(result):
+        profiler.mark("system checks finished")
+        profiler.report()
+
+        for warning in result.warnings:
+            main_window.status_bar.showMessage(warning)
+        if result.ok:
+            return
+
+        logger.warning(f"System requirements not met: {result.error}")
+        from ui.setup_dialog import SetupDialog
+        setup = SetupDialog(main_window)
+        if setup.exec() != QDialog.Accepted:
+            app.quit()
+
+    def run_checks():
+        from backend.startup_checks import StartupCheckResult, check_system_requirements
+        try:
+            result = check_system_requirements(on_revalidated=signals.finished.emit)
+        except Exception as e:
+            logger.exception("System requirement checks failed")
+            result = StartupCheckResult(True, warnings=[f"System checks failed: {e}"])
+        signals.finished.emit(result)
+
+    signals = CheckSignals()
+    signals.finished.connect(on_checks_finished)
+    profiler.mark("system checks started")
+    threading.Thread(target=run_checks, daemon=True, name="startup-checks").start()
+
     # Run application event loop
     exit_code = app.exec()
     logger.info(f"{config.APP_NAME} exiting with code {exit_code}")
@@ -2,13 +2,14 @@
 GPU model for UI representation
 """
 
-from dataclasses import dataclass
-from typing import List
+from dataclasses import dataclass, field
 
+from models.snapshot import compute_fingerprint
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class GPUModel:
-    """UI-friendly GPU model"""
+    """UI-friendly GPU model (immutable, keyed by PCI address)"""
     
     pci_address: str
     vendor: str  # NVIDIA, AMD, Intel
@@ -18,6 +19,18 @@ class GPUModel:
     can_passthrough: bool
     driver: str
     related_device_count: int
+    fingerprint: int = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        object.__setattr__(self, 'fingerprint', compute_fingerprint(self))
+    
+    def __hash__(self) -> int:
+        return self.fingerprint
+    
+    @property
+    def key(self) -> str:
+        """Stable identity"""
+        return self.pci_address
     
     @property
     def display_name(self) -> str:
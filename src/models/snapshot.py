@@ -0,0 +1,72 @@
+"""
+Snapshot diffing for immutable models
+
+Models are frozen, slotted dataclasses with a stable identity `key`
+(UUID or PCI address) and a `fingerprint` hashed once at construction.
+Comparing two snapshots is then a dict lookup and an integer comparison
+per item instead of a field-by-field comparison.
+"""
+
+from dataclasses import dataclass, fields
+from typing import Dict, Hashable, Iterable, Tuple
+
+
+_FIELD_NAMES: Dict[type, Tuple[str, ...]] = {}
+
+
+def compute_fingerprint(instance) -> int:
+    """
+    Hash all compared fields of a dataclass instance
+
+    Nested models contribute their own precomputed hashes.
+    """
+    cls = type(instance)
+    names = _FIELD_NAMES.get(cls)
+    if names is None:
+        names = tuple(f.name for f in fields(cls) if f.compare)
+        _FIELD_NAMES[cls] = names
+    return hash(tuple(getattr(instance, name) for name in names))
+
+
+@dataclass(frozen=True, slots=True)
+class SnapshotDiff:
+    """Difference between two model snapshots"""
+    added: Tuple = ()
+    removed: Tuple = ()
+    changed: Tuple = ()  # (old, new) pairs
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+
+def index_by_key(models: Iterable) -> Dict[Hashable, object]:
+    """Map models by their identity key"""
+    return {model.key: model for model in models}
+
+
+def diff(old: Iterable, new: Iterable) -> SnapshotDiff:
+    """
+    Compare two snapshots of models
+
+    Args:
+        old: Previous models (iterable or dict keyed by model.key)
+        new: Current models (iterable or dict keyed by model.key)
+
+    Returns:
+        SnapshotDiff with added, removed and (old, new) changed models,
+        each in the order of the snapshot they come from
+    """
+    old_index = old if isinstance(old, dict) else index_by_key(old)
+    new_index = new if isinstance(new, dict) else index_by_key(new)
+
+    added = []
+    changed = []
+    for key, model in new_index.items():
+        previous = old_index.get(key)
+        if previous is None:
+            added.append(model)
+        elif previous.fingerprint != model.fingerprint:
+            changed.append((previous, model))
+
+    removed = tuple(model for key, model in old_index.items() if key not in new_index)
+    return SnapshotDiff(tuple(added), removed, tuple(changed))
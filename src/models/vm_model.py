@@ -2,13 +2,15 @@
 VM data model for UI representation
 """
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Optional
 
+from models.snapshot import compute_fingerprint
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class VMModel:
-    """Data model for a virtual machine"""
+    """Data model for a virtual machine (immutable, keyed by UUID)"""
     
     name: str
     uuid: str
@@ -22,6 +24,19 @@ class VMModel:
     autostart: bool
     has_gpu_passthrough: bool = False
     gpu_vendor: Optional[str] = None
+    host: str = ""  # HostManager host name, empty for a single connection
+    fingerprint: int = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        object.__setattr__(self, 'fingerprint', compute_fingerprint(self))
+    
+    def __hash__(self) -> int:
+        return self.fingerprint
+    
+    @property
+    def key(self) -> str:
+        """Stable identity (the same UUID may be defined on several hosts)"""
+        return f"{self.host}/{self.uuid}" if self.host else self.uuid
     
     @property
     def memory_gb(self) -> float:
@@ -46,5 +61,6 @@ class VMModel:
             max_memory_mb=info['max_memory'] // 1024,
             current_memory_mb=info['memory'] // 1024,
             vcpus=info['vcpus'],
-            autostart=info['autostart']
+            autostart=info['autostart'],
+            host=info.get('host', "")
         )
@@ -14,9 +14,10 @@ from typing import Optional
 from pathlib import Path
 
 from backend.gpu_detector import GPUDetector, GPU
-from backend.xml_generator import XMLGenerator
+from backend.disk_profiles import DISK_PROFILES, get_disk_profile
 from backend.libvirt_manager import LibvirtManager
 from models.gpu_model import GPUModel
+from ui.disk_job_dialog import DiskJobDialog
 from utils.logger import logger
 import config
 
@@ -126,16 +127,26 @@ class StoragePage(QWizardPage):
         disk_group = QGroupBox("Virtual Disk Size")
         disk_layout = QHBoxLayout(disk_group)
         self.disk_spin = QSpinBox()
-        self.disk_spin.setRange(20, 500)
+        self.disk_spin.setRange(20, 4096)
         self.disk_spin.setValue(60)
         self.disk_spin.setSuffix(" GB")
         disk_layout.addWidget(self.disk_spin)
         layout.addWidget(disk_group)
         
+        # Disk performance profile
+        profile_group = QGroupBox("Disk Performance Profile")
+        profile_layout = QVBoxLayout(profile_group)
+        self.profile_combo = QComboBox()
+        for profile in DISK_PROFILES.values():
+            self.profile_combo.addItem(f"{profile.name} - {profile.description}", profile.name)
+        profile_layout.addWidget(self.profile_combo)
+        layout.addWidget(profile_group)
+        
         # Register fields
         self.registerField("iso_path*", self.iso_input)
         self.registerField("virtio_iso_path*", self.virtio_input)
         self.registerField("disk_size", self.disk_spin)
+        self.registerField("disk_profile", self.profile_combo, "currentData")
     
     def _browse_iso(self):
         path, _ = QFileDialog.getOpenFileName(
@@ -240,6 +251,7 @@ class SummaryPage(QWizardPage):
         summary += f"CPUs: {vcpus}\n"
         summary += f"TPM 2.0: {'Enabled' if enable_tpm else 'Disabled'}\n"
         summary += f"Disk Size: {disk_size} GB\n"
+        summary += f"Disk Profile: {self.field('disk_profile')}\n"
         summary += f"Windows ISO: {Path(iso_path).name}\n"
         summary += f"GPU Passthrough: {'Enabled' if enable_gpu else 'Disabled'}\n"
         
@@ -265,8 +277,7 @@ class CreateVMWizard(QWizard):
         self.addPage(GPUPage())
         self.addPage(SummaryPage())
         
-        # Setup
-        self.xml_generator = XMLGenerator()
+        # Setup (shares the app's libvirt connection)
         self.manager = LibvirtManager()
         
         # Apply theme
@@ -317,6 +328,11 @@ class CreateVMWizard(QWizard):
             }
         """)
     
+    def done(self, result):
+        """Release the shared libvirt connection when the wizard closes"""
+        self.manager.disconnect()
+        super().done(result)
+    
     def accept(self):
         """Create VM when wizard finishes"""
         try:
@@ -331,6 +347,7 @@ class CreateVMWizard(QWizard):
             virtio_iso = self.field("virtio_iso_path")
             disk_size = self.field("disk_size")
             enable_gpu = self.field("enable_gpu_passthrough")
+            disk_profile = get_disk_profile(self.field("disk_profile"))
             
             # Validate inputs
             if not vm_name or len(vm_name.strip()) == 0:
@@ -347,11 +364,11 @@ class CreateVMWizard(QWizard):
             
             # Use DiskManager for disk creation
             from backend.disk_manager import DiskManager
+            from backend.vm_provisioner import VMProvisioner, VMSpec
             disk_mgr = DiskManager()
             
-            # Create disk image
             disk_path = disk_mgr.get_disk_path(vm_name)
-            
+            overwrite = False
             if Path(disk_path).exists():
                 reply = QMessageBox.question(
                     self,
@@ -361,62 +378,60 @@ class CreateVMWizard(QWizard):
                 )
                 if reply == QMessageBox.No:
                     return
-                disk_mgr.delete_disk(disk_path)
+                overwrite = True
+            
+            spec = VMSpec(
+                name=vm_name,
+                iso_path=iso_path,
+                virtio_iso_path=virtio_iso,
+                memory_mb=memory,
+                vcpus=vcpus,
+                disk_size_gb=disk_size,
+                disk_profile=disk_profile.name,
+                enable_tpm=enable_tpm
+            )
             
-            logger.info(f"Creating disk: {disk_path} ({disk_size}GB)")
-            if not disk_mgr.create_disk_image(disk_path, disk_size):
+            # Preallocated images can take minutes; keep the UI responsive
+            provisioner = VMProvisioner(self.manager, disk_mgr)
+            try:
+                domain = provisioner.provision(
+                    spec,
+                    overwrite=overwrite,
+                    wait=lambda job: DiskJobDialog(job, self).exec()
+                )
+            except (ValueError, RuntimeError) as e:
                 QMessageBox.critical(
                     self,
-                    "Disk Creation Failed",
-                    f"Failed to create disk image.\n\n"
+                    "VM Creation Failed",
+                    f"Failed to create VM.\n\n{e}\n\n"
                     f"Check that qemu-img is installed and you have write permissions to:\n"
                     f"{disk_path}"
                 )
                 return
             
-            # Generate XML (without GPU for first boot)
-            from backend.xml_generator import XMLGenerator
-            xml_gen = XMLGenerator()
+            if domain is None:
+                # Disk creation cancelled
+                return
             
-            xml = xml_gen.generate_windows_vm_xml(
-                vm_name=vm_name,
-                memory_mb=memory,
-                vcpus=vcpus,
-                disk_path=disk_path,
-                iso_path=iso_path,
-                virtio_iso_path=virtio_iso,
-                gpu=None,  # No GPU on first boot
-                enable_tpm=enable_tpm,
-                enable_gpu_passthrough=False
+            reply = QMessageBox.question(
+                self,
+                "VM Created",
+                f"VM '{vm_name}' created successfully!\n\n"
+                f"Would you like to start it now?",
+                QMessageBox.Yes | QMessageBox.No
             )
-            
-            # Create VM
-            domain = self.manager.create_vm_from_xml(xml)
-            
-            if domain:
-                reply = QMessageBox.question(
-                    self,
-                    "VM Created",
-                    f"VM '{vm_name}' created successfully!\n\n"
-                    f"Would you like to start it now?",
-                    QMessageBox.Yes | QMessageBox.No
-                )
 
-                if reply == QMessageBox.Yes:
-                    from backend.vm_controller import VMController
-                    controller = VMController(self.manager)
+            if reply == QMessageBox.Yes:
+                from backend.admission import AdmissionError
+                from backend.vm_controller import VMController
+                controller = VMController(self.manager)
+                try:
                     controller.start_vm_with_viewer(domain, fullscreen=False)
+                except AdmissionError as e:
+                    QMessageBox.warning(self, "Not Enough Memory", f"VM '{vm_name}' was created but not started:\n\n{e}")
 
-                self.vm_created.emit(vm_name)
-                super().accept()
-            else:
-                QMessageBox.critical(
-                    self,
-                    "VM Creation Failed",
-                    "Failed to create VM. Check libvirt logs for details."
-                )
-                # Cleanup disk if VM creation failed
-                disk_mgr.delete_disk(disk_path)
+            self.vm_created.emit(vm_name)
+            super().accept()
             
         except Exception as e:
             logger.exception("Failed to create VM")
@@ -0,0 +1,89 @@
+"""
+Disk Job Dialog - Progress, throughput and ETA for background disk jobs
+"""
+
+from PySide6.QtWidgets import QProgressDialog
+from PySide6.QtCore import Qt, QObject, QTimer, Signal
+
+from backend.disk_jobs import DiskJob, JobState, disk_jobs
+
+
+def format_bytes(value: float) -> str:
+    """Format a byte count for display"""
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if abs(value) < 1024 or unit == "TB":
+            return f"{value:.1f} {unit}" if unit != "B" else f"{int(value)} B"
+        value /= 1024
+
+
+def format_eta(seconds) -> str:
+    """Format remaining time for display"""
+    if seconds is None:
+        return "estimating..."
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class DiskJobSignals(QObject):
+    """Forwards disk job updates from worker threads to the GUI thread"""
+
+    job_updated = Signal(object)  # DiskJob
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._listener = self.job_updated.emit
+        disk_jobs.add_listener(self._listener)
+
+    def detach(self):
+        """Stop receiving updates"""
+        disk_jobs.remove_listener(self._listener)
+
+
+class DiskJobDialog(QProgressDialog):
+    """Modal progress dialog for a single disk job"""
+
+    def __init__(self, job: DiskJob, parent=None):
+        super().__init__(job.description, "Cancel", 0, 100, parent)
+
+        self.job = job
+
+        self.setWindowTitle("Disk Operation - VirtFlow")
+        self.setWindowModality(Qt.WindowModal)
+        self.setMinimumWidth(450)
+        self.setMinimumDuration(0)
+        self.setAutoClose(False)
+        self.setAutoReset(False)
+
+        self.signals = DiskJobSignals(self)
+        self.signals.job_updated.connect(self._on_job_updated)
+        self.canceled.connect(self.job.cancel)
+
+        # The job may have finished before the signal was connected. Check
+        # once the dialog's event loop runs: closing it from here would
+        # leave a later exec() waiting for updates that never come.
+        QTimer.singleShot(0, lambda: self._on_job_updated(self.job))
+
+    def _on_job_updated(self, job: DiskJob):
+        """Update the dialog from a job snapshot"""
+        if job is not self.job:
+            return
+
+        self.setValue(int(job.progress))
+
+        details = job.description
+        if job.state == JobState.QUEUED:
+            details += "\n\nWaiting for the storage device..."
+        elif job.state == JobState.RUNNING and job.bytes_total:
+            details += (
+                f"\n\n{format_bytes(job.bytes_done)} of {format_bytes(job.bytes_total)}"
+                f" at {format_bytes(job.rate)}/s - {format_eta(job.eta)} remaining"
+            )
+        self.setLabelText(details)
+
+        if job.is_done:
+            self.signals.detach()
+            self.done(1 if job.state == JobState.SUCCEEDED else 0)
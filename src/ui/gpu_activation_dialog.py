@@ -25,7 +25,7 @@ class GPUActivationWorker(QThread):
         super().__init__()
         self.vm_name = vm_name
         self.gpu = gpu
-        self.manager = LibvirtManager()
+        self.manager = LibvirtManager()  # shared connection, released when done
         self.helper = GuestDriverHelper(self.manager)
         self.configurator = VMGPUConfigurator(self.manager)
     
@@ -59,11 +59,8 @@ class GPUActivationWorker(QThread):
             logger.exception("GPU activation failed")
             self.finished.emit(False, f"Unexpected error: {str(e)}")
         finally:
-            # Clean up libvirt connection
-            try:
-                self.manager.disconnect()
-            except:
-                pass
+            # Release our reference to the shared connection
+            self.manager.disconnect()
 
 
 class GPUActivationDialog(QDialog):
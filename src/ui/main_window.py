@@ -6,7 +6,7 @@ from PySide6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QLabel, QStatusBar, QMenuBar, QMenu,
     QToolBar, QMessageBox
 )
-from PySide6.QtCore import Qt, QSize
+from PySide6.QtCore import Qt, QSize, QTimer
 from PySide6.QtGui import QAction, QIcon
 
 import config
@@ -58,6 +58,10 @@ class MainWindow(QMainWindow):
         
         self.vm_list = VMListWidget()
         layout.addWidget(self.vm_list)
+        
+        # Background services need libvirt; start them after the first paint
+        self.compaction_scheduler = None
+        QTimer.singleShot(0, self._start_background_services)
    
     def _create_menu_bar(self):
         """Create application menu bar"""
@@ -121,6 +125,7 @@ class MainWindow(QMainWindow):
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
         self.status_bar.showMessage("Ready")
+        self.vm_list.status_message.connect(self.status_bar.showMessage)
     
     def _apply_theme(self):
         """Apply application theme"""
@@ -147,6 +152,21 @@ class MainWindow(QMainWindow):
             }
         """)
     
+    def _start_background_services(self):
+        """Start periodic backend work (compaction of idle VMs, balloons, per-VM metrics)"""
+        from backend.disk_compactor import CompactionScheduler, DiskCompactor
+        
+        self.compaction_scheduler = CompactionScheduler(DiskCompactor(self.vm_list.manager))
+        self.compaction_scheduler.start()
+        
+        if config.BALLOON_ENABLED:
+            from backend.balloon_controller import BalloonController
+            
+            self.balloon_controller = BalloonController(self.vm_list.manager)
+            self.balloon_controller.start()
+        
+        self.vm_list.start_metrics()
+    
     # Slot methods
     def _on_create_vm(self):
         """Handle Create VM button click"""
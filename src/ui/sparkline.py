@@ -0,0 +1,68 @@
+"""
+Sparkline table cells
+"""
+
+import math
+
+from PySide6.QtWidgets import QStyledItemDelegate, QStyle
+from PySide6.QtCore import Qt, QPointF
+from PySide6.QtGui import QColor, QPen, QPainterPath
+
+
+# Item data role holding the sample list drawn by SparklineDelegate
+SPARKLINE_ROLE = Qt.UserRole + 1
+
+
+class SparklineDelegate(QStyledItemDelegate):
+    """Draws a cell's samples as a line with its text on top
+
+    Samples are a list of floats (NaN = no sample, which breaks the line).
+    The line is scaled to the cell height, from zero to max(samples, floor).
+    """
+
+    def __init__(self, color: str = "#14FFEC", floor: float = 1.0, parent=None):
+        super().__init__(parent)
+        self.color = QColor(color)
+        self.floor = floor
+
+    def paint(self, painter, option, index):
+        samples = index.data(SPARKLINE_ROLE) or []
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+
+        finite = [value for value in samples if not math.isnan(value)]
+        if len(samples) > 1 and finite:
+            rect = option.rect.adjusted(2, 3, -2, -3)
+            peak = max(max(finite), self.floor)
+            step = rect.width() / (len(samples) - 1)
+
+            path = QPainterPath()
+            drawing = False
+            for position, value in enumerate(samples):
+                if math.isnan(value):
+                    drawing = False
+                    continue
+                point = QPointF(
+                    rect.left() + position * step,
+                    rect.bottom() - min(value, peak) / peak * rect.height()
+                )
+                if drawing:
+                    path.lineTo(point)
+                else:
+                    path.moveTo(point)
+                    drawing = True
+
+            painter.save()
+            painter.setRenderHint(painter.RenderHint.Antialiasing)
+            line = QColor(self.color)
+            line.setAlpha(160)
+            painter.setPen(QPen(line, 1.2))
+            painter.drawPath(path)
+            painter.restore()
+
+        text = index.data(Qt.DisplayRole)
+        if text:
+            painter.save()
+            painter.setPen(option.palette.text().color())
+            painter.drawText(option.rect.adjusted(4, 0, -4, 0), Qt.AlignRight | Qt.AlignVCenter, text)
+            painter.restore()
@@ -2,6 +2,9 @@
 VM list table widget with real-time updates
 """
 
+import math
+import threading
+
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QTableWidget, 
     QTableWidgetItem, QPushButton, QHeaderView, QMessageBox
@@ -9,34 +12,81 @@ from PySide6.QtWidgets import (
 from PySide6.QtCore import Qt, QTimer, Signal
 from PySide6.QtGui import QColor
 
-from backend.libvirt_manager import LibvirtManager
-from backend.vm_controller import VMController, VMState
+from backend.disk_jobs import JobState
+from models.snapshot import diff
 from models.vm_model import VMModel
+from ui.disk_job_dialog import DiskJobSignals, format_bytes
+from ui.sparkline import SPARKLINE_ROLE, SparklineDelegate
 from utils.logger import logger
+import config
 
 
 class VMListWidget(QWidget):
     """Widget displaying list of VMs with controls"""
     
     vm_selected = Signal(str)  # Emits VM UUID
+    status_message = Signal(str)
+    _vms_loaded = Signal(object)  # FanOutResult from the refresh thread
+    _bulk_finished = Signal(str, object, object)  # operation, OperationResults, callback from a bulk thread
+    
+    COLUMNS = ["Name", "State", "vCPUs", "Memory (GB)", "Autostart", "CPU", "Disk I/O", "Network", "Host", "UUID"]
+    CPU_COLUMN, DISK_COLUMN, NET_COLUMN, HOST_COLUMN, UUID_COLUMN = 5, 6, 7, 8, 9
     
     def __init__(self, parent=None):
         super().__init__(parent)
         
-        # Initialize backend
-        self.manager = LibvirtManager()
-        self.controller = VMController(self.manager)
+        # Backend is connected on first use, after the window is shown
+        self._hosts = None
+        self._manager = None
+        self._backend_lock = threading.Lock()  # first use may come from the refresh thread
+        self._vms = {}  # VMModel.key -> VMModel currently shown
+        self._refreshing = False
+        self._host_errors = {}
+        self.metrics = None  # host name -> MetricsCollector, see start_metrics()
         
         # Setup UI
         self._setup_ui()
         
+        # Report background storage reclamation after deletes
+        self.disk_job_signals = DiskJobSignals(self)
+        self.disk_job_signals.job_updated.connect(self._on_disk_job_updated)
+        
+        self._vms_loaded.connect(self._on_vms_loaded)
+        self._bulk_finished.connect(self._on_bulk_finished)
+        
         # Auto-refresh timer
         self.refresh_timer = QTimer()
         self.refresh_timer.timeout.connect(self.refresh_vm_list)
         self.refresh_timer.start(3000)  # Refresh every 3 seconds
         
-        # Initial load
-        self.refresh_vm_list()
+        # Initial load once the event loop is running
+        QTimer.singleShot(0, self.refresh_vm_list)
+    
+    @property
+    def hosts(self):
+        """HostManager for all configured libvirt hosts"""
+        with self._backend_lock:
+            if self._hosts is None:
+                from backend.host_manager import HostManager
+                self._hosts = HostManager()
+            return self._hosts
+    
+    @property
+    def manager(self):
+        """LibvirtManager of the default host, connected on first use"""
+        if self._manager is None:
+            # HostManager hands every caller the same connection
+            self._manager = self.hosts.manager()
+        return self._manager
+    
+    @property
+    def controller(self):
+        """VMController of the default host, created on first use"""
+        return self.controller_for(self.hosts.default_host)
+    
+    def controller_for(self, host: str):
+        """VMController of a host, created on first use"""
+        return self.hosts.controller(host)
     
     def _setup_ui(self):
         """Setup widget UI"""
@@ -55,10 +105,19 @@ class VMListWidget(QWidget):
         self.reboot_btn = QPushButton("🔄 Reboot")
         self.reboot_btn.clicked.connect(self._on_reboot_vm)
         
+        self.pause_btn = QPushButton("⏸ Pause")
+        self.pause_btn.clicked.connect(self._on_pause_vm)
+        
+        self.resume_btn = QPushButton("⏯ Resume")
+        self.resume_btn.clicked.connect(self._on_resume_vm)
+        
         self.delete_btn = QPushButton("🗑 Delete")
         self.delete_btn.clicked.connect(self._on_delete_vm)
         self.delete_btn.setStyleSheet("background-color: #C62828; color: white;")
         
+        self.compact_btn = QPushButton("🗜 Compact Disk")
+        self.compact_btn.clicked.connect(self._on_compact_vm)
+        
         self.refresh_btn = QPushButton("↻ Refresh")
         self.refresh_btn.clicked.connect(self.refresh_vm_list)
 
@@ -68,7 +127,10 @@ class VMListWidget(QWidget):
         button_layout.addWidget(self.start_btn)
         button_layout.addWidget(self.stop_btn)
         button_layout.addWidget(self.reboot_btn)
+        button_layout.addWidget(self.pause_btn)
+        button_layout.addWidget(self.resume_btn)
         button_layout.addWidget(self.delete_btn)
+        button_layout.addWidget(self.compact_btn)
         button_layout.addStretch()
         button_layout.addWidget(self.gpu_activate_btn)
         button_layout.addWidget(self.refresh_btn)
@@ -77,14 +139,21 @@ class VMListWidget(QWidget):
         
         # VM table
         self.table = QTableWidget()
-        self.table.setColumnCount(6)
-        self.table.setHorizontalHeaderLabels([
-            "Name", "State", "vCPUs", "Memory (GB)", "Autostart", "UUID"
-        ])
+        self.table.setColumnCount(len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        
+        # Sparklines (CPU is always scaled to 100%, rates to their peak)
+        self._sparkline_delegates = {
+            self.CPU_COLUMN: SparklineDelegate("#14FFEC", floor=100.0, parent=self.table),
+            self.DISK_COLUMN: SparklineDelegate("#FFB74D", floor=64 * 1024, parent=self.table),
+            self.NET_COLUMN: SparklineDelegate("#81C784", floor=64 * 1024, parent=self.table),
+        }
+        for column, delegate in self._sparkline_delegates.items():
+            self.table.setItemDelegateForColumn(column, delegate)
         
         # Table styling
         self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        self.table.setSelectionMode(QTableWidget.ExtendedSelection)
         self.table.setAlternatingRowColors(True)
         self.table.setEditTriggers(QTableWidget.NoEditTriggers)
         
@@ -95,7 +164,11 @@ class VMListWidget(QWidget):
         header.setSectionResizeMode(2, QHeaderView.ResizeToContents)
         header.setSectionResizeMode(3, QHeaderView.ResizeToContents)
         header.setSectionResizeMode(4, QHeaderView.ResizeToContents)
-        header.setSectionResizeMode(5, QHeaderView.Stretch)
+        for column in self._sparkline_delegates:
+            header.setSectionResizeMode(column, QHeaderView.Fixed)
+            self.table.setColumnWidth(column, 110)
+        header.setSectionResizeMode(self.HOST_COLUMN, QHeaderView.ResizeToContents)
+        header.setSectionResizeMode(self.UUID_COLUMN, QHeaderView.Stretch)
         
         self.table.itemSelectionChanged.connect(self._on_selection_changed)
         
@@ -121,32 +194,93 @@ class VMListWidget(QWidget):
         """)
     
     def refresh_vm_list(self):
-        """Refresh VM list from libvirt"""
+        """Refresh VM list from all hosts on a background thread"""
+        if self._refreshing:
+            return
+        self._refreshing = True
+        threading.Thread(target=self._load_vms, daemon=True, name="vm-list-refresh").start()
+    
+    def _load_vms(self):
         try:
-            domains = self.manager.list_all_vms()
+            result = self.hosts.list_vm_info()
+        except Exception as e:
+            logger.error(f"Failed to refresh VM list: {e}")
+            result = None
+        self._vms_loaded.emit(result)
+    
+    def _on_vms_loaded(self, result):
+        self._refreshing = False
+        if result is not None:
+            self.apply_vm_info(result)
+    
+    def load_vm_list(self):
+        """Refresh VM list synchronously"""
+        self.apply_vm_info(self.hosts.list_vm_info())
+    
+    def apply_vm_info(self, result):
+        """Show the VMs of a HostManager.list_vm_info() result, touching only rows that changed"""
+        try:
+            vms = {}
+            for infos in result.values.values():
+                for info in infos:
+                    vm = VMModel.from_libvirt_info(info)
+                    vms[vm.key] = vm
             
-            # Clear table
-            self.table.setRowCount(0)
+            # Hosts that did not answer keep their rows until they do
+            for key, vm in self._vms.items():
+                if vm.host in result.errors:
+                    vms.setdefault(key, vm)
+            self._report_host_errors(result.errors)
             
-            # Populate table
-            for domain in domains:
-                info = self.controller.get_vm_info(domain)
-                if not info:
-                    continue
-                
-                vm = VMModel.from_libvirt_info(info)
-                self._add_vm_to_table(vm)
+            changes = diff(self._vms, vms)
+            self._vms = vms
+            if not changes:
+                return
+            
+            for vm in changes.removed:
+                row = self._row_for(vm.key)
+                if row is not None:
+                    self.table.removeRow(row)
             
-            logger.debug(f"Refreshed VM list: {len(domains)} VMs")
+            for _, vm in changes.changed:
+                row = self._row_for(vm.key)
+                if row is not None:
+                    self._set_row(row, vm)
+            
+            for vm in changes.added:
+                row = self.table.rowCount()
+                self.table.insertRow(row)
+                self._set_row(row, vm)
+            
+            logger.debug(
+                f"Refreshed VM list: {len(vms)} VMs on {len(result.values)} host(s) "
+                f"(+{len(changes.added)} -{len(changes.removed)} ~{len(changes.changed)})"
+            )
             
         except Exception as e:
             logger.error(f"Failed to refresh VM list: {e}")
     
-    def _add_vm_to_table(self, vm: VMModel):
-        """Add VM to table"""
-        row = self.table.rowCount()
-        self.table.insertRow(row)
-        
+    def _report_host_errors(self, errors):
+        """Tell the user when hosts become unreachable or come back"""
+        if errors == self._host_errors:
+            return
+        for host in self._host_errors.keys() - errors.keys():
+            self.status_message.emit(f"Host '{host}' is reachable again")
+        for host, error in errors.items():
+            if host not in self._host_errors:
+                self.status_message.emit(f"Host '{host}' unavailable: {error}")
+        self._host_errors = dict(errors)
+    
+    def _row_for(self, key: str):
+        """Find the table row showing a VM (by VMModel.key)"""
+        for row in range(self.table.rowCount()):
+            item = self.table.item(row, self.UUID_COLUMN)
+            if item is not None and item.data(Qt.UserRole) == key:
+                return row
+        return None
+    
+    def _set_row(self, row: int, vm: VMModel):
+        """Fill a table row from a VM model"""
         # Name
         self.table.setItem(row, 0, QTableWidgetItem(vm.name))
         
@@ -168,58 +302,230 @@ class VMListWidget(QWidget):
         autostart = "Yes" if vm.autostart else "No"
         self.table.setItem(row, 4, QTableWidgetItem(autostart))
         
-        # UUID
-        self.table.setItem(row, 5, QTableWidgetItem(vm.uuid))
+        # Sparklines, filled by _update_sparklines()
+        for column in self._sparkline_delegates:
+            if self.table.item(row, column) is None:
+                self.table.setItem(row, column, QTableWidgetItem())
+        
+        # Host
+        self.table.setItem(row, self.HOST_COLUMN, QTableWidgetItem(vm.host))
+        
+        # UUID (the item also carries the row's VMModel.key)
+        uuid_item = QTableWidgetItem(vm.uuid)
+        uuid_item.setData(Qt.UserRole, vm.key)
+        self.table.setItem(row, self.UUID_COLUMN, uuid_item)
+    
+    def start_metrics(self):
+        """Start sampling per-VM CPU, disk and network into the sparkline columns"""
+        if self.metrics is not None:
+            return
+        try:
+            from backend.metrics_collector import MetricsCollector
+        except ImportError as e:
+            logger.warning(f"Per-VM metrics disabled: {e}")
+            return
+        
+        # One collector (and sampling thread) per host, so a dead host only stalls its own
+        self.metrics = {}
+        
+        def start_collector(host):
+            collector = MetricsCollector(self.hosts.manager(host))
+            collector.start()
+            self.metrics[host] = collector
+        
+        for host in self.hosts.names:
+            threading.Thread(target=start_collector, args=(host,), daemon=True).start()
+        
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.timeout.connect(self._update_sparklines)
+        self.metrics_timer.start(int(config.METRICS_INTERVAL * 1000))
+    
+    def _update_sparklines(self):
+        """Copy the collected series into the sparkline cells"""
+        for row in range(self.table.rowCount()):
+            uuid_item = self.table.item(row, self.UUID_COLUMN)
+            host_item = self.table.item(row, self.HOST_COLUMN)
+            if uuid_item is None or host_item is None:
+                continue
+            collector = self.metrics.get(host_item.text())
+            history = collector.history(uuid_item.text()) if collector else {}
+            if history:
+                series = {
+                    self.CPU_COLUMN: history['cpu_percent'],
+                    self.DISK_COLUMN: history['disk_read_bps'] + history['disk_write_bps'],
+                    self.NET_COLUMN: history['net_rx_bps'] + history['net_tx_bps'],
+                }
+            else:
+                series = {column: None for column in self._sparkline_delegates}
+            
+            for column, values in series.items():
+                item = self.table.item(row, column)
+                if item is None:
+                    continue
+                samples = values.tolist() if values is not None else []
+                latest = samples[-1] if samples else math.nan
+                if math.isnan(latest):
+                    text = ""
+                elif column == self.CPU_COLUMN:
+                    text = f"{latest:.0f}%"
+                else:
+                    text = f"{format_bytes(latest)}/s"
+                item.setData(SPARKLINE_ROLE, samples)
+                item.setText(text)
+    
+    def _selected_rows(self):
+        """Selected table rows, top to bottom"""
+        return sorted({item.row() for item in self.table.selectedItems()})
+    
+    def _selected_host(self) -> str:
+        """Host of the (first) selected VM"""
+        rows = self._selected_rows()
+        if not rows:
+            return self.hosts.default_host
+        return self.table.item(rows[0], self.HOST_COLUMN).text()
     
     def _get_selected_vm(self):
-        """Get currently selected VM domain"""
-        selected = self.table.selectedItems()
-        if not selected:
+        """Get currently selected VM domain (exactly one row must be selected)"""
+        rows = self._selected_rows()
+        if not rows:
             QMessageBox.warning(self, "No Selection", "Please select a VM first")
             return None
+        if len(rows) > 1:
+            QMessageBox.warning(self, "Multiple Selection", "Please select a single VM for this action")
+            return None
         
-        row = selected[0].row()
+        row = rows[0]
         vm_name = self.table.item(row, 0).text()
+        host = self.table.item(row, self.HOST_COLUMN).text()
+        uuid = self.table.item(row, self.UUID_COLUMN).text()
         
-        domain = self.manager.get_vm_by_name(vm_name)
+        domain = self.hosts.find_vm(host, uuid)
         if not domain:
-            QMessageBox.critical(self, "Error", f"VM '{vm_name}' not found")
+            QMessageBox.critical(self, "Error", f"VM '{vm_name}' not found on '{host}'")
         
         return domain
     
+    def _get_selected_vms(self):
+        """
+        Get the selected VM domains, grouped by host
+        
+        Returns:
+            dict: host -> domains, empty if nothing usable is selected
+        """
+        rows = self._selected_rows()
+        if not rows:
+            QMessageBox.warning(self, "No Selection", "Please select one or more VMs first")
+            return {}
+        
+        selected, missing = {}, []
+        for row in rows:
+            vm_name = self.table.item(row, 0).text()
+            host = self.table.item(row, self.HOST_COLUMN).text()
+            domain = self.hosts.find_vm(host, self.table.item(row, self.UUID_COLUMN).text())
+            if domain:
+                selected.setdefault(host, []).append(domain)
+            else:
+                missing.append(f"{vm_name} ({host})")
+        if missing:
+            QMessageBox.critical(self, "Error", "VMs not found:\n" + "\n".join(missing))
+        return selected
+    
+    def _run_bulk(self, operation: str, selected, then=None, **kwargs):
+        """
+        Run a lifecycle operation on VMs of several hosts in the background
+        
+        Hosts are handled one after the other, each with a bounded pool;
+        _on_bulk_finished() reports the results and calls then(results)
+        on the UI thread.
+        """
+        from backend.bulk_lifecycle import BulkLifecycle, OperationResult
+        
+        count = sum(len(domains) for domains in selected.values())
+        self.status_message.emit(f"Running {operation} on {count} VM(s)...")
+        
+        def run():
+            results = []
+            for host, domains in selected.items():
+                try:
+                    results.extend(BulkLifecycle(self.controller_for(host)).run(operation, domains, **kwargs))
+                except Exception as e:
+                    logger.exception(f"Bulk {operation} on '{host}' failed: {e}")
+                    results.extend(OperationResult(d.name(), operation, False, error=str(e)) for d in domains)
+            self._bulk_finished.emit(operation, results, then)
+        
+        threading.Thread(target=run, daemon=True, name=f"vm-bulk-{operation}").start()
+    
+    def _on_bulk_finished(self, operation: str, results, then):
+        """Summarize a bulk operation in the status bar, warn about failures"""
+        if then is not None:
+            then(results)
+        failed = [result for result in results if not result.ok]
+        self.status_message.emit(
+            f"{operation.capitalize()}: {len(results) - len(failed)} of {len(results)} VM(s) succeeded"
+        )
+        if failed:
+            QMessageBox.warning(
+                self, f"{operation.capitalize()} Failed",
+                "\n".join(f"{result.name}: {result.error}" for result in failed)
+            )
+        self.refresh_vm_list()
+    
+    def _require_local(self, action: str) -> bool:
+        """Warn and return False if the selected VM is on a remote host"""
+        host = self._selected_host()
+        if self.hosts.manager(host).is_local:
+            return True
+        QMessageBox.warning(self, "Remote Host", f"{action} is only available for VMs on this machine, not '{host}'.")
+        return False
+    
     def _on_start_vm(self):
         """Handle start VM button"""
+        if len(self._selected_rows()) > 1:
+            # Staggered and in config.VM_START_DEPENDENCIES order, no viewers
+            selected = self._get_selected_vms()
+            if selected:
+                self._run_bulk('start', selected)
+            return
+        
         domain = self._get_selected_vm()
         if not domain:
             return
         
-        try:
-            vm_name = domain.name()
-            logger.info(f"Starting VM '{vm_name}'...")
-            
-            # Start VM
-            domain.create()
-            logger.info(f"VM '{vm_name}' started successfully")
-            
-            # Launch viewer after short delay
-            from PySide6.QtCore import QTimer
-            QTimer.singleShot(2000, lambda: self._launch_viewer(vm_name))
-            
-            # Refresh list
-            self.refresh_vm_list()
-            
-        except Exception as e:
-            logger.exception(f"Failed to start VM: {e}")
-            from PySide6.QtWidgets import QMessageBox
-            QMessageBox.critical(self, "Error", f"Failed to start VM:\n{str(e)}")
-
-    def _launch_viewer(self, vm_name: str):
+        # Ask before starting a guest the host cannot back
+        from backend.admission import QUEUE, REFUSE, WARN
+        host = self._selected_host()
+        decision = self.hosts.manager(host).admission.check(domain)
+        if decision.verdict == REFUSE:
+            QMessageBox.critical(self, "Not Enough Memory", f"Cannot start VM:\n{decision.reason}")
+            return
+        if decision.verdict == WARN and QMessageBox.question(
+            self, "Low Memory",
+            f"{decision.reason}\n\nStart anyway?",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        ) != QMessageBox.Yes:
+            return
+        if decision.verdict == QUEUE:
+            self.status_message.emit(f"Waiting for memory to start '{domain.name()}'...")
+        
+        # Start in the background (a queued start can wait), then launch the viewer
+        vm_name = domain.name()
+        uri = domain.connect().getURI()
+        
+        def launch_viewer(results):
+            if results and results[0].ok and not results[0].action:
+                QTimer.singleShot(2000, lambda: self._launch_viewer(vm_name, uri))
+        
+        logger.info(f"Starting VM '{vm_name}'...")
+        self._run_bulk('start', {host: [domain]}, then=launch_viewer)
+    
+    def _launch_viewer(self, vm_name: str, uri: str):
         """Launch virt-viewer for VM"""
         try:
             import subprocess
             subprocess.Popen([
                 'virt-viewer',
-                '--connect', 'qemu:///system',
+                '--connect', uri,
                 '--wait',
                 vm_name
             ])
@@ -230,6 +536,17 @@ class VMListWidget(QWidget):
 
     def _on_stop_vm(self):
         """Handle stop VM button"""
+        if len(self._selected_rows()) > 1:
+            selected = self._get_selected_vms()
+            count = sum(len(domains) for domains in selected.values())
+            if selected and QMessageBox.question(
+                self, "Confirm Stop",
+                f"Shutdown {count} VMs?",
+                QMessageBox.Yes | QMessageBox.No
+            ) == QMessageBox.Yes:
+                self._run_bulk('stop', selected)
+            return
+        
         domain = self._get_selected_vm()
         if domain:
             reply = QMessageBox.question(
@@ -238,14 +555,26 @@ class VMListWidget(QWidget):
                 QMessageBox.Yes | QMessageBox.No
             )
             if reply == QMessageBox.Yes:
-                self.controller.stop_vm_and_close_viewer(domain)
+                self.controller_for(self._selected_host()).stop_vm_and_close_viewer(domain)
                 self.refresh_vm_list()
     
     def _on_reboot_vm(self):
         """Handle reboot VM button"""
-        domain = self._get_selected_vm()
-        if domain and self.controller.reboot_vm(domain):
-            self.refresh_vm_list()
+        selected = self._get_selected_vms()
+        if selected:
+            self._run_bulk('reboot', selected)
+    
+    def _on_pause_vm(self):
+        """Handle pause VM button"""
+        selected = self._get_selected_vms()
+        if selected:
+            self._run_bulk('pause', selected)
+    
+    def _on_resume_vm(self):
+        """Handle resume VM button"""
+        selected = self._get_selected_vms()
+        if selected:
+            self._run_bulk('resume', selected)
     
     def _on_delete_vm(self):
         """Handle delete VM button"""
@@ -262,22 +591,56 @@ class VMListWidget(QWidget):
         )
         
         if reply == QMessageBox.Yes:
-            if self.manager.delete_vm(domain, remove_storage=True):
-                QMessageBox.information(self, "Success", "VM deleted successfully")
+            if self.hosts.manager(self._selected_host()).delete_vm(domain, remove_storage=True):
+                QMessageBox.information(
+                    self, "Success",
+                    "VM deleted successfully.\n\n"
+                    "Its storage is being removed in the background."
+                )
                 self.refresh_vm_list()
     
+    def _on_compact_vm(self):
+        """Handle compact disk button"""
+        domain = self._get_selected_vm()
+        if not domain or not self._require_local("Disk compaction"):
+            return
+        
+        if domain.isActive():
+            QMessageBox.warning(self, "VM Running", "Shut down the VM before compacting its disks.")
+            return
+        
+        from backend.disk_compactor import DiskCompactor
+        jobs = DiskCompactor(self.hosts.manager(self._selected_host())).compact_vm(domain.name())
+        if jobs:
+            self.status_message.emit(f"Compacting {len(jobs)} disk(s) of '{domain.name()}'...")
+        else:
+            QMessageBox.information(self, "Nothing to Compact", "This VM has no disks that can be compacted.")
+    
+    def _on_disk_job_updated(self, job):
+        """Report reclaimed space when a removal or compaction job finishes"""
+        if job.kind not in ('reclaim', 'compact') or not job.is_done:
+            return
+        if job.state != JobState.SUCCEEDED:
+            self.status_message.emit(f"{job.description}: {job.state}")
+            return
+        
+        reclaimed = job.result.reclaimed if job.kind == 'compact' else job.result
+        self.status_message.emit(
+            f"{job.description}: {format_bytes(reclaimed or 0)} reclaimed"
+        )
+    
     def _on_selection_changed(self):
         """Handle table selection change"""
-        selected = self.table.selectedItems()
-        if selected:
-            row = selected[0].row()
-            uuid = self.table.item(row, 5).text()
+        rows = self._selected_rows()
+        if len(rows) == 1:
+            row = rows[0]
+            uuid = self.table.item(row, self.UUID_COLUMN).text()
             self.vm_selected.emit(uuid)
 
     def _on_activate_gpu(self):
         """Handle GPU activation button"""
         domain = self._get_selected_vm()
-        if not domain:
+        if not domain or not self._require_local("GPU passthrough"):
             return
 
         from ui.gpu_activation_dialog import GPUActivationDialog
@@ -53,5 +53,24 @@ def setup_logger(name="virtflow"):
     return logger
 
 
+def set_console_stream(stream, level=None, name="virtflow"):
+    """
+    Redirect console log output
+    
+    The command line interface sends logs to stderr so stdout carries only
+    command output (e.g. JSON).
+    
+    Args:
+        stream: File-like object to write to
+        level: Optional new console log level
+        name: Logger name
+    """
+    for handler in logging.getLogger(name).handlers:
+        if isinstance(handler, logging.StreamHandler) and not isinstance(handler, logging.FileHandler):
+            handler.setStream(stream)
+            if level is not None:
+                handler.setLevel(level)
+
+
 # Create default logger instance
 logger = setup_logger()
@@ -0,0 +1,349 @@
+"""
+Metrics registry - counters, gauges and histograms in Prometheus format
+
+Metrics are declared at module level next to the code they measure and
+cost a single flag check while metrics are disabled (the default).
+Enable them with VIRTFLOW_METRICS_PORT (local HTTP endpoint serving
+/metrics) and/or VIRTFLOW_METRICS_TEXTFILE (a .prom file for the
+node-exporter textfile collector), or config.METRICS_*.
+
+    VM_STARTS = counter('virtflow_vm_starts_total', "VM start attempts", ['result'])
+    VM_STARTS.labels('ok').inc()
+
+    with START_SECONDS.time():
+        domain.create()
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from utils.logger import logger
+import config
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Child:
+    """Values of one label combination"""
+
+    __slots__ = ('_registry', '_lock', 'value')
+
+    def __init__(self, registry: 'Registry'):
+        self._registry = registry
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        if not self._registry.enabled:
+            return
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def set(self, value: float):
+        if not self._registry.enabled:
+            return
+        self.value = value
+
+
+class _HistogramChild:
+    """Buckets of one label combination"""
+
+    __slots__ = ('_registry', '_lock', '_upper_bounds', 'buckets', 'sum', 'count')
+
+    def __init__(self, registry: 'Registry', upper_bounds: Tuple[float, ...]):
+        self._registry = registry
+        self._lock = threading.Lock()
+        self._upper_bounds = upper_bounds
+        self.buckets = [0] * (len(upper_bounds) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        if not self._registry.enabled:
+            return
+        index = bisect.bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self.buckets[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        """Observe the duration of a block"""
+        if not self._registry.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class _Metric:
+    """A metric family with optional labels"""
+
+    type = 'untyped'
+
+    def __init__(self, registry: 'Registry', name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._unlabelled = self.labels()
+
+    def _new_child(self):
+        return _Child(self._registry)
+
+    def labels(self, *values: str):
+        """Get the child for a label combination (cache it in hot paths)"""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        return [
+            (self.name, dict(zip(self.labelnames, key)), child.value)
+            for key, child in list(self._children.items())
+        ]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.type}"]
+        for name, labels, value in self._samples():
+            if labels:
+                rendered = ','.join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                lines.append(f"{name}{{{rendered}}} {_format_value(value)}")
+            else:
+                lines.append(f"{name} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    type = 'counter'
+
+    def inc(self, amount: float = 1):
+        self._unlabelled.inc(amount)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+
+    type = 'gauge'
+
+    def inc(self, amount: float = 1):
+        self._unlabelled.inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._unlabelled.dec(amount)
+
+    def set(self, value: float):
+        self._unlabelled.set(value)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    type = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.upper_bounds = tuple(sorted(buckets))
+        super().__init__(registry, name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self._registry, self.upper_bounds)
+
+    def observe(self, value: float):
+        self._unlabelled.observe(value)
+
+    def time(self):
+        return self._unlabelled.time()
+
+    def _samples(self):
+        samples = []
+        for key, child in list(self._children.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.upper_bounds + (float('inf'),), child.buckets):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", {**labels, 'le': _format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_sum", labels, child.sum))
+            samples.append((f"{self.name}_count", labels, child.count))
+        return samples
+
+
+class Registry:
+    """All metrics of the process"""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric_class, name: str, *args, **kwargs):
+        with self._lock:
+            existing = self._metrics.get(name)
+            if existing is not None:
+                if not isinstance(existing, metric_class):
+                    raise ValueError(f"Metric {name} already registered as {existing.type}")
+                return existing
+            metric = metric_class(self, name, *args, **kwargs)
+            self._metrics[name] = metric
+            return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition of all metrics"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return registry._register(Counter, name, documentation, labelnames)
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return registry._register(Gauge, name, documentation, labelnames)
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = DEFAULT_BUCKETS
+) -> Histogram:
+    return registry._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+
+# ----------------------------------------------------------------------
+# Exporters
+# ----------------------------------------------------------------------
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"metrics endpoint: {format % args}")
+
+
+def start_http_server(port: int, address: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Serve /metrics on a daemon thread"""
+    server = ThreadingHTTPServer((address, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+    logger.info(f"Metrics endpoint at http://{address}:{port}/metrics")
+    return server
+
+
+def write_textfile(path) -> bool:
+    """Atomically write all metrics for the node-exporter textfile collector"""
+    path = Path(path)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(registry.render())
+        tmp.replace(path)
+        return True
+    except OSError as e:
+        logger.warning(f"Could not write metrics textfile {path}: {e}")
+        return False
+
+
+def start_textfile_writer(path, interval: float) -> threading.Event:
+    """
+    Rewrite the textfile every interval on a daemon thread
+
+    Returns:
+        Event that stops the writer when set
+    """
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            write_textfile(path)
+
+    threading.Thread(target=loop, daemon=True, name="metrics-textfile").start()
+    return stop
+
+
+def configure(
+    port: Optional[int] = None,
+    textfile: Optional[str] = None,
+    textfile_interval: Optional[float] = None
+) -> bool:
+    """
+    Enable metrics and start the configured exporters
+
+    Arguments default to config.METRICS_PORT / METRICS_TEXTFILE, which
+    the VIRTFLOW_METRICS_PORT / VIRTFLOW_METRICS_TEXTFILE environment
+    variables override. With neither set, metrics stay disabled.
+
+    Returns:
+        bool: True if metrics are enabled
+    """
+    port = port or config.METRICS_PORT
+    textfile = textfile or config.METRICS_TEXTFILE
+    if port:
+        try:
+            port = int(port)
+        except ValueError:
+            logger.warning(f"Ignoring metrics port {port!r}: not a number")
+            port = None
+    if not port and not textfile:
+        return False
+
+    registry.enabled = True
+    if port:
+        try:
+            start_http_server(port)
+        except OSError as e:
+            logger.warning(f"Could not start metrics endpoint on port {port}: {e}")
+    if textfile:
+        start_textfile_writer(textfile, textfile_interval or config.METRICS_TEXTFILE_INTERVAL)
+    return True
@@ -0,0 +1,51 @@
+"""
+Startup profiler - per-phase wall time and module import counts
+
+Enabled with `--profile-startup`; when disabled every call is a no-op.
+"""
+
+import sys
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+
+class StartupProfiler:
+    """Records named startup phases"""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.origin = time.perf_counter()
+        # (phase, start offset, duration, modules imported)
+        self.phases: List[Tuple[str, float, float, int]] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a block of startup work"""
+        if not self.enabled:
+            yield
+            return
+
+        modules = len(sys.modules)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.phases.append((name, start - self.origin, end - start, len(sys.modules) - modules))
+
+    def mark(self, name: str):
+        """Record a point in time (e.g. first paint) as a zero-length phase"""
+        if self.enabled:
+            self.phases.append((name, time.perf_counter() - self.origin, 0.0, 0))
+
+    def report(self, stream=None):
+        """Print the phase table"""
+        if not self.enabled:
+            return
+
+        stream = stream or sys.stderr
+        print(f"{'phase':<36} {'start ms':>9} {'took ms':>9} {'modules':>8}", file=stream)
+        for name, start, duration, modules in self.phases:
+            print(f"{name:<36} {start * 1000:>9.1f} {duration * 1000:>9.1f} {modules:>8}", file=stream)
+        print(f"{len(sys.modules)} modules loaded in total", file=stream)
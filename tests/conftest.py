@@ -0,0 +1,11 @@
+"""
+Test configuration
+
+The application's modules live in src/ as top-level packages (backend,
+models, utils, config), like the benchmarks import them.
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
@@ -0,0 +1,62 @@
+"""Start ordering and results of bulk lifecycle operations"""
+
+import pytest
+
+pytest.importorskip("libvirt")
+
+from backend.bulk_lifecycle import BulkLifecycle, start_order  # noqa: E402
+
+
+def test_no_dependencies_is_one_wave_in_input_order():
+    assert start_order(["c", "a", "b"]) == [["c", "a", "b"]]
+
+
+def test_duplicates_are_started_once():
+    assert start_order(["a", "b", "a"]) == [["a", "b"]]
+
+
+def test_dependencies_start_in_earlier_waves():
+    depends = {"web": ["db", "router"], "db": ["router"]}
+    assert start_order(["web", "db", "router", "mail"], depends) == [
+        ["router", "mail"], ["db"], ["web"]
+    ]
+
+
+def test_dependencies_outside_the_selection_are_ignored():
+    assert start_order(["web"], {"web": ["db"]}) == [["web"]]
+
+
+def test_self_dependency_is_ignored():
+    assert start_order(["a"], {"a": ["a"]}) == [["a"]]
+
+
+def test_cycle_raises():
+    with pytest.raises(ValueError, match="cycle: a, b"):
+        start_order(["a", "b", "c"], {"a": ["b"], "b": ["a"]})
+
+
+class FakeDomain:
+    def __init__(self, name: str, active: bool):
+        self._name, self.active = name, active
+
+    def name(self) -> str:
+        return self._name
+
+    def isActive(self) -> bool:
+        return self.active
+
+
+class FakeController:
+    def stop_vm(self, domain, force=False) -> bool:
+        domain.active = False
+        return True
+
+
+def test_shutdown_reports_stopped_vms_as_already_off():
+    reported = []
+    domains = [FakeDomain("up", True), FakeDomain("down", False)]
+    results = BulkLifecycle(FakeController()).shutdown(domains, timeout=1, on_result=reported.append)
+    assert [(r.name, r.ok, r.action) for r in results] == [
+        ("up", True, "shut down"), ("down", True, "already off")
+    ]
+    assert sorted(r.name for r in reported) == ["down", "up"]
@@ -0,0 +1,113 @@
+"""Reading and patching domain definitions"""
+
+import xml.etree.ElementTree as ET
+
+from backend.domain_xml import AutostartPolicy, CPUTuning, DomainDocument, MemoryBacking, PCIAddress
+
+
+DOMAIN_XML = """
+<domain type='kvm'>
+  <name>win11</name>
+  <uuid>5f3c0c1e-2a4b-4c6d-8e9f-0a1b2c3d4e5f</uuid>
+  <memory unit='GiB'>8</memory>
+  <currentMemory unit='MiB'>4096</currentMemory>
+  <vcpu>4</vcpu>
+  <devices>
+    <disk type='file' device='disk'>
+      <driver name='qemu' type='qcow2'/>
+      <source file='/var/lib/libvirt/images/win11.qcow2'/>
+      <backingStore type='file'><source file='/base.qcow2'/></backingStore>
+      <target dev='vda' bus='virtio'/>
+    </disk>
+    <disk type='file' device='cdrom'>
+      <source file='/isos/win11.iso'/>
+      <target dev='sda' bus='sata'/>
+    </disk>
+    <hostdev mode='subsystem' type='pci' managed='yes'>
+      <source><address domain='0x0000' bus='0x01' slot='0x00' function='0x0'/></source>
+    </hostdev>
+    <graphics type='spice' autoport='yes'/>
+    <graphics type='vnc' autoport='yes'/>
+  </devices>
+</domain>
+"""
+
+
+def document() -> DomainDocument:
+    return DomainDocument(DOMAIN_XML)
+
+
+def test_accessors():
+    doc = document()
+    assert doc.name == 'win11'
+    assert doc.memory_kib() == 8 * 1024 * 1024
+    assert doc.current_memory_kib() == 4096 * 1024
+    assert [(d.device, d.target, d.source) for d in doc.disks()] == [
+        ('disk', 'vda', '/var/lib/libvirt/images/win11.qcow2'),
+        ('cdrom', 'sda', '/isos/win11.iso'),
+    ]
+    assert [str(h.address) for h in doc.hostdevs()] == ['0000:01:00.0']
+    assert doc.autostart_policy() is None
+    assert not doc.dirty
+
+
+def test_add_hostdev_skips_existing_address():
+    doc = document()
+    assert not doc.add_hostdev('0000:01:00.0')
+    assert not doc.dirty
+    assert doc.add_hostdev(PCIAddress.parse('0000:01:00.1'))
+    assert doc.dirty
+    assert [str(h.address) for h in doc.hostdevs()] == ['0000:01:00.0', '0000:01:00.1']
+
+
+def test_remove_graphics_by_type():
+    doc = document()
+    assert doc.remove_graphics(['vnc']) == 1
+    assert [g.type for g in doc.graphics()] == ['spice']
+    assert doc.dirty
+
+
+def test_set_vcpu_pinning_roundtrips_and_is_idempotent():
+    doc = document()
+    doc.set_vcpu_pinning({1: '3', 0: '2'}, emulatorpin='0-1')
+    reparsed = DomainDocument(doc.to_xml())
+    assert reparsed.cpu_tuning() == CPUTuning({0: '2', 1: '3'}, '0-1')
+    # <cputune> goes right after <vcpu>
+    tags = [child.tag for child in reparsed.root]
+    assert tags.index('cputune') == tags.index('vcpu') + 1
+
+    reparsed.set_vcpu_pinning({0: '2', 1: '3'}, emulatorpin='0-1')
+    assert not reparsed.dirty
+
+    reparsed.set_vcpu_pinning({})
+    assert reparsed.root.find('cputune') is None
+
+
+def test_set_memory_backing():
+    doc = document()
+    doc.set_memory_backing(hugepages=True, page_size_kib=1048576, locked=True)
+    reparsed = DomainDocument(doc.to_xml())
+    assert reparsed.memory_backing() == MemoryBacking(hugepages=True, page_size_kib=1048576, locked=True)
+
+    reparsed.set_memory_backing()
+    assert reparsed.root.find('memoryBacking') is None
+
+
+def test_set_disk_source_drops_backing_store_and_sets_format():
+    doc = document()
+    assert doc.set_disk_source('vda', '/new.img', 'raw')
+    disk = doc.disks()[0]
+    assert (disk.source, disk.driver_type) == ('/new.img', 'raw')
+    assert doc.root.find('devices/disk/backingStore') is None
+    assert not doc.set_disk_source('vdz', '/other.img')
+
+
+def test_autostart_policy_roundtrip():
+    doc = document()
+    metadata = ET.SubElement(doc.root, 'metadata')
+    metadata.append(ET.fromstring(
+        AutostartPolicy(priority=5, delay=2.5).to_xml().replace(
+            '<autostart', '<autostart xmlns="urn:virtflow:domain:1.0"', 1
+        )
+    ))
+    assert DomainDocument(doc.to_xml()).autostart_policy() == AutostartPolicy(5, 2.5)
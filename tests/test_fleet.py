@@ -0,0 +1,48 @@
+"""Expansion of fleet manifests"""
+
+import pytest
+
+pytest.importorskip("libvirt")
+
+from backend.fleet import FleetManifest  # noqa: E402
+
+
+def test_count_expands_name_template():
+    manifest = FleetManifest.from_dict({
+        'vms': [{'name': 'ci-{index:02d}', 'count': 3, 'memory_mb': 2048}]
+    })
+    assert [spec.name for spec in manifest.vms] == ['ci-01', 'ci-02', 'ci-03']
+    assert {spec.memory_mb for spec in manifest.vms} == {2048}
+
+
+def test_first_index():
+    manifest = FleetManifest.from_dict({'vms': [{'name': 'w{index}', 'count': 2, 'first_index': 5}]})
+    assert [spec.name for spec in manifest.vms] == ['w5', 'w6']
+
+
+def test_defaults_apply_unless_overridden():
+    manifest = FleetManifest.from_dict({
+        'defaults': {'vcpus': 4, 'enable_tpm': False},
+        'vms': [{'name': 'a'}, {'name': 'b', 'vcpus': 8}]
+    })
+    assert [(spec.name, spec.vcpus, spec.enable_tpm) for spec in manifest.vms] == [
+        ('a', 4, False), ('b', 8, False)
+    ]
+
+
+def test_cpu_pinning_keys_become_ints():
+    manifest = FleetManifest.from_dict({'vms': [{'name': 'a', 'cpu_pinning': {'0': 2, '1': '3'}}]})
+    assert manifest.vms[0].cpu_pinning == {0: '2', 1: '3'}
+
+
+@pytest.mark.parametrize("data", [
+    [],
+    {},
+    {'vms': {}},
+    {'vms': ['a']},
+    {'vms': [{'vcpus': 2}]},
+    {'vms': [{'name': 'a', 'colour': 'red'}]},
+])
+def test_malformed_manifests_raise(data):
+    with pytest.raises(ValueError):
+        FleetManifest.from_dict(data)
@@ -0,0 +1,24 @@
+"""Parsing of host resource descriptions"""
+
+import pytest
+
+from backend.host_resources import parse_cpuset
+
+
+@pytest.mark.parametrize("cpuset, expected", [
+    ("3", {3}),
+    ("0-3", {0, 1, 2, 3}),
+    ("0-3,8", {0, 1, 2, 3, 8}),
+    ("0-3,^2", {0, 1, 3}),
+    ("^2,0-3", {0, 1, 3}),
+    (" 1 , 4-5 ,", {1, 4, 5}),
+    ("", set()),
+])
+def test_parse_cpuset(cpuset, expected):
+    assert parse_cpuset(cpuset) == expected
+
+
+@pytest.mark.parametrize("cpuset", ["3-1", "a", "1-x", "-1"])
+def test_parse_cpuset_rejects_malformed(cpuset):
+    with pytest.raises(ValueError):
+        parse_cpuset(cpuset)
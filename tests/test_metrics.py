@@ -0,0 +1,59 @@
+"""Prometheus exposition of the metrics registry"""
+
+import pytest
+
+from utils.metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_disabled_registry_records_nothing():
+    registry = Registry(enabled=False)
+    counter = registry._register(Counter, 'calls_total', "Calls")
+    counter.inc()
+    assert registry.render() == "# HELP calls_total Calls\n# TYPE calls_total counter\ncalls_total 0\n"
+
+
+def test_render_counter_and_gauge():
+    registry = Registry(enabled=True)
+    calls = registry._register(Counter, 'calls_total', 'Calls "made"\nso far', ['call'])
+    calls.labels('info').inc()
+    calls.labels('info').inc(2)
+    calls.labels('state').inc(0.5)
+    registry._register(Gauge, 'domains', "Domains").set(7)
+
+    assert registry.render().splitlines() == [
+        '# HELP calls_total Calls \\"made\\"\\nso far',
+        '# TYPE calls_total counter',
+        'calls_total{call="info"} 3',
+        'calls_total{call="state"} 0.5',
+        '# HELP domains Domains',
+        '# TYPE domains gauge',
+        'domains 7',
+    ]
+
+
+def test_render_histogram_buckets_are_cumulative():
+    registry = Registry(enabled=True)
+    seconds = registry._register(Histogram, 'start_seconds', "Starts", buckets=(1, 0.1))
+    for value in (0.05, 0.5, 0.5, 3):
+        seconds.observe(value)
+
+    assert registry.render().splitlines()[2:] == [
+        'start_seconds_bucket{le="0.1"} 1',
+        'start_seconds_bucket{le="1"} 3',
+        'start_seconds_bucket{le="+Inf"} 4',
+        'start_seconds_sum 4.05',
+        'start_seconds_count 4',
+    ]
+
+
+def test_registering_twice_returns_the_same_metric():
+    registry = Registry(enabled=True)
+    first = registry._register(Counter, 'calls_total', "Calls")
+    assert registry._register(Counter, 'calls_total', "Calls") is first
+
+
+def test_label_count_is_checked():
+    registry = Registry(enabled=True)
+    calls = registry._register(Counter, 'calls_total', "Calls", ['call'])
+    with pytest.raises(ValueError):
+        calls.labels()
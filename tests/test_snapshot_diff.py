@@ -0,0 +1,37 @@
+"""Diffing model snapshots"""
+
+from dataclasses import replace
+
+from models.snapshot import diff
+from models.vm_model import VMModel
+
+
+def vm(uuid: str, state: int = 5, host: str = "") -> VMModel:
+    return VMModel(
+        name=f"vm-{uuid}", uuid=uuid, state=state, state_name="", is_active=state == 1,
+        is_persistent=True, max_memory_mb=4096, current_memory_mb=4096, vcpus=2,
+        autostart=False, host=host
+    )
+
+
+def test_identical_snapshots_have_no_diff():
+    assert not diff([vm("a"), vm("b")], [vm("a"), vm("b")])
+
+
+def test_added_removed_and_changed():
+    old = [vm("a"), vm("b"), vm("c")]
+    new = [vm("d"), replace(old[1], state=1), vm("a")]
+    result = diff(old, new)
+    assert [m.uuid for m in result.added] == ["d"]
+    assert [m.uuid for m in result.removed] == ["c"]
+    assert [(o.state, n.state) for o, n in result.changed] == [(5, 1)]
+
+
+def test_same_uuid_on_two_hosts_are_different_models():
+    result = diff([vm("a", host="local")], [vm("a", host="local"), vm("a", host="rig2")])
+    assert [m.key for m in result.added] == ["rig2/a"]
+
+
+def test_accepts_dicts_keyed_by_model_key():
+    old = {m.key: m for m in [vm("a")]}
+    assert diff(old, [vm("a", state=1)]).changed